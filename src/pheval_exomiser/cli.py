@@ -1,5 +1,6 @@
 import click
 
+from .post_process.benchmark import benchmark_disease_prioritisation
 from .post_process.post_process_results_format import post_process_exomiser_results
 from .prepare.create_batch_commands import prepare_exomiser_batch
 
@@ -11,6 +12,7 @@ def main():
 
 main.add_command(prepare_exomiser_batch)
 main.add_command(post_process_exomiser_results)
+main.add_command(benchmark_disease_prioritisation)
 
 if __name__ == "__main__":
     main()
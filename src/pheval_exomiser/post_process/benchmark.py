@@ -0,0 +1,228 @@
+#!/usr/bin/python
+import itertools
+from pathlib import Path
+from typing import Iterator, List
+
+import click
+import numpy as np
+import pandas as pd
+from pheval.utils.file_utils import all_files
+from pheval.utils.phenopacket_utils import PhenopacketUtil, phenopacket_reader
+
+from pheval_exomiser.post_process.pheval_result_dataset import (
+    dataset_path,
+    read_pheval_result_dataset,
+)
+
+"""
+    Disease prioritisation benchmark for PhEval disease results, producing the same -disease_summary.tsv and
+    -disease_rank_comparison.tsv tables as the PhEval benchmark. The diagnoses are read once; every result
+    directory is then reduced to one rank vector aligned with the diagnoses, so only a
+    (diagnoses x directories) rank matrix is held in memory, and all statistics are computed on that matrix.
+"""
+
+DISEASE_RESULTS_DIR = "pheval_disease_results"
+RESULT_FILE_SUFFIXES = ["-pheval_disease_result.tsv", "_disease_results-pheval_disease_result.tsv"]
+SUMMARY_FILE_SUFFIX = "-disease_summary.tsv"
+RANK_COMPARISON_FILE_SUFFIX = "-disease_rank_comparison.tsv"
+TOP_K = [1, 3, 5, 10]
+
+
+def read_diagnoses(phenopacket_dir: Path) -> pd.DataFrame:
+    """
+    Read the diagnosed diseases of every phenopacket.
+
+    :param phenopacket_dir: Directory of phenopackets.
+    :return: DataFrame with one row per diagnosis and the columns phenopacket, sample, disease_identifier and
+        disease_name.
+    """
+    rows = []
+    for phenopacket_path in all_files(phenopacket_dir):
+        diagnoses = PhenopacketUtil(phenopacket_reader(phenopacket_path)).diagnoses()
+        for disease in sorted(diagnoses, key=lambda diagnosis: diagnosis.disease_identifier):
+            rows.append(
+                (phenopacket_path.name, phenopacket_path.stem, disease.disease_identifier, disease.disease_name)
+            )
+    return pd.DataFrame(rows, columns=["phenopacket", "sample", "disease_identifier", "disease_name"])
+
+
+def _find_result_file(results_dir: Path, sample: str) -> Path:
+    for suffix in RESULT_FILE_SUFFIXES:
+        result_file = results_dir.joinpath(DISEASE_RESULTS_DIR, sample + suffix)
+        if result_file.exists():
+            return result_file
+    return None
+
+
+def read_disease_results(results_dir: Path, samples: List[str]) -> pd.DataFrame:
+    """
+    Read the ranked disease results of the given samples from a results directory, from its Parquet dataset if
+    it has one and otherwise from the per-sample PhEval TSVs. Samples without results are left out.
+
+    :param results_dir: Results directory holding pheval_disease_results or a Parquet result dataset.
+    :param samples: Sample names, the phenopacket file stems.
+    :return: DataFrame with the columns sample, rank, disease_identifier and disease_name.
+    """
+    if dataset_path(results_dir).exists():
+        disease_results = read_pheval_result_dataset(results_dir, entity="disease", samples=samples)
+        return disease_results.rename(columns={"identifier": "disease_identifier", "name": "disease_name"})[
+            ["sample", "rank", "disease_identifier", "disease_name"]
+        ]
+    frames = []
+    for sample in samples:
+        result_file = _find_result_file(results_dir, sample)
+        if result_file is None:
+            continue
+        frame = pd.read_csv(
+            result_file,
+            sep="\t",
+            usecols=["rank", "disease_identifier", "disease_name"],
+            dtype={"disease_identifier": str, "disease_name": str},
+        )
+        frame.insert(0, "sample", sample)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["sample", "rank", "disease_identifier", "disease_name"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def rank_diagnoses(diagnoses: pd.DataFrame, disease_results: pd.DataFrame) -> np.ndarray:
+    """
+    Find the rank of every diagnosis in the disease results of its sample. As in the PhEval benchmark a result
+    matches on the disease identifier or the disease name, and the best ranked match counts.
+
+    :return: Integer rank per diagnosis, 0 where the diagnosed disease was not found.
+    """
+    keyed_diagnoses = diagnoses.reset_index()[["index", "sample", "disease_identifier", "disease_name"]]
+    matches = []
+    for key in ["disease_identifier", "disease_name"]:
+        matched = keyed_diagnoses[["index", "sample", key]].dropna().merge(
+            disease_results[["sample", key, "rank"]].dropna(), on=["sample", key], how="inner"
+        )
+        matches.append(matched[["index", "rank"]])
+    best_rank = pd.concat(matches).groupby("index")["rank"].min()
+    ranks = np.zeros(len(diagnoses), dtype=np.int64)
+    ranks[best_rank.index.to_numpy()] = best_rank.to_numpy().astype(np.int64)
+    return ranks
+
+
+def iter_rank_vectors(diagnoses: pd.DataFrame, results_dirs: List[Path]) -> Iterator[np.ndarray]:
+    """Stream over the results directories, yielding the diagnosis ranks of one directory at a time."""
+    samples = diagnoses["sample"].unique().tolist()
+    for results_dir in results_dirs:
+        yield rank_diagnoses(diagnoses, read_disease_results(results_dir, samples))
+
+
+def summarise_ranks(ranks: np.ndarray, results_dirs: List[Path]) -> pd.DataFrame:
+    """
+    Compute the PhEval disease summary for every results directory at once.
+
+    :param ranks: Rank matrix of shape (number of diagnoses, number of directories), 0 for not found.
+    :param results_dirs: Results directories, one per column of ranks.
+    :return: Summary with top, top3, top5, top10, found, total, mean reciprocal rank and their percentages.
+    """
+    found = ranks > 0
+    total = ranks.shape[0]
+    summary = pd.DataFrame({"results_directory_path": [str(results_dir) for results_dir in results_dirs]})
+    for k in TOP_K:
+        summary["top" if k == 1 else f"top{k}"] = (found & (ranks <= k)).sum(axis=0)
+    summary["found"] = found.sum(axis=0)
+    summary["total"] = total
+    reciprocal_ranks = np.divide(1.0, ranks, out=np.zeros(ranks.shape), where=found)
+    summary["mean_reciprocal_rank"] = reciprocal_ranks.mean(axis=0) if total else 0.0
+    for column in ["top", "top3", "top5", "top10", "found"]:
+        summary[f"percentage_{column}"] = 100 * summary[column] / total if total else 0.0
+    return summary
+
+
+def compare_ranks(
+    diagnoses: pd.DataFrame, ranks: np.ndarray, results_dirs: List[Path], baseline: int, other: int
+) -> pd.DataFrame:
+    """Rank comparison of two results directories; rank_decrease is the rank in other minus the baseline rank."""
+    comparison = pd.DataFrame(
+        {
+            "Phenopacket": diagnoses["phenopacket"].to_numpy(),
+            "Disease": diagnoses["disease_identifier"].to_numpy(),
+            str(results_dirs[baseline].joinpath(DISEASE_RESULTS_DIR)): ranks[:, baseline],
+            str(results_dirs[other].joinpath(DISEASE_RESULTS_DIR)): ranks[:, other],
+            "rank_decrease": ranks[:, other] - ranks[:, baseline],
+        },
+        index=pd.RangeIndex(1, len(diagnoses) + 1),
+    )
+    return comparison
+
+
+def comparison_prefix(baseline_dir: Path, other_dir: Path) -> str:
+    baseline_dir, other_dir = baseline_dir.resolve(), other_dir.resolve()
+    return f"{baseline_dir.parent.name}_{baseline_dir.name}_vs_{other_dir.parent.name}_{other_dir.name}"
+
+
+def benchmark_disease_results(
+    phenopacket_dir: Path, results_dirs: List[Path], output_dir: Path, output_prefix: str
+) -> pd.DataFrame:
+    """
+    Benchmark disease prioritisation of several results directories against the phenopacket diagnoses, writing
+    one summary and one rank comparison per pair of directories to output_dir.
+
+    :return: The disease summary.
+    """
+    diagnoses = read_diagnoses(phenopacket_dir)
+    ranks = np.zeros((len(diagnoses), len(results_dirs)), dtype=np.int64)
+    for column, rank_vector in enumerate(iter_rank_vectors(diagnoses, results_dirs)):
+        ranks[:, column] = rank_vector
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    summary = summarise_ranks(ranks, results_dirs)
+    summary.to_csv(output_dir.joinpath(output_prefix + SUMMARY_FILE_SUFFIX), sep="\t", index=False)
+    for baseline, other in itertools.combinations(range(len(results_dirs)), 2):
+        compare_ranks(diagnoses, ranks, results_dirs, baseline, other).to_csv(
+            output_dir.joinpath(
+                comparison_prefix(results_dirs[baseline], results_dirs[other]) + RANK_COMPARISON_FILE_SUFFIX
+            ),
+            sep="\t",
+        )
+    return summary
+
+
+@click.command()
+@click.option(
+    "--phenopacket-dir",
+    "-p",
+    required=True,
+    metavar="DIRECTORY",
+    help="Full path to directory containing the phenopackets of the benchmarked corpus.",
+    type=Path,
+)
+@click.option(
+    "--directory",
+    "-d",
+    "results_dirs",
+    required=True,
+    multiple=True,
+    metavar="DIRECTORY",
+    help="Results directory containing pheval_disease_results or a Parquet result dataset. "
+    "Repeat for every configuration, the first one is the baseline of the rank comparisons.",
+    type=Path,
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    metavar="PATH",
+    help="Output directory for the summary and rank comparison tables.",
+    type=Path,
+    default=Path("."),
+    show_default=True,
+)
+@click.option(
+    "--output-prefix",
+    "-op",
+    help="Prefix of the disease summary file.",
+    default="ELDER",
+    show_default=True,
+)
+def benchmark_disease_prioritisation(
+    phenopacket_dir: Path, results_dirs: List[Path], output_dir: Path, output_prefix: str
+):
+    """Benchmark PhEval disease results of several runs against the phenopacket diagnoses."""
+    summary = benchmark_disease_results(phenopacket_dir, list(results_dirs), output_dir, output_prefix)
+    print(summary.to_string(index=False))
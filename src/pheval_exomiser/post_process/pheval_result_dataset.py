@@ -0,0 +1,179 @@
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+"""
+    Columnar output for standardised PhEval results: one Parquet dataset per output directory, partitioned
+    hive style by entity (gene, variant or disease), with a single part file per entity holding one row group per
+    sample. Samples are first staged as separate files in a directory that dataset readers ignore, and compacted
+    into the part file once the run finishes. Aggregations read the whole dataset at once and can filter on entity
+    and sample without opening a file per sample.
+"""
+
+DATASET_NAME = "pheval_results.parquet"
+STAGING_DIR_NAME = "_staging"
+PART_FILE_NAME = "part-0.parquet"
+OUTPUT_FORMATS = ["tsv", "parquet"]
+ENTITY_COLUMNS = {
+    "gene": ("gene_identifier", "gene_symbol"),
+    "disease": ("disease_identifier", "disease_name"),
+}
+
+
+def check_parquet_support() -> None:
+    """Raise an ImportError with an install hint if pyarrow is unavailable."""
+    if pyarrow is None:
+        raise ImportError("Parquet output requires pyarrow, install it with `pip install pyarrow`")
+
+
+def dataset_path(output_dir: Path) -> Path:
+    return Path(output_dir).joinpath(DATASET_NAME)
+
+
+def to_dataset_frame(ranked_pheval_result: pd.DataFrame, entity: str, sample: str) -> pd.DataFrame:
+    """
+    Convert a ranked gene, variant or disease result to the dataset columns sample, identifier, name, score
+    and rank. Variants are identified as chromosome-start-ref-alt.
+    """
+    if entity == "variant":
+        identifier = (
+            ranked_pheval_result["chromosome"].astype(str)
+            + "-"
+            + ranked_pheval_result["start"].astype(str)
+            + "-"
+            + ranked_pheval_result["ref"].astype(str)
+            + "-"
+            + ranked_pheval_result["alt"].astype(str)
+        )
+        name = identifier
+    elif entity in ENTITY_COLUMNS:
+        identifier_column, name_column = ENTITY_COLUMNS[entity]
+        identifier = ranked_pheval_result[identifier_column].astype(str)
+        name = ranked_pheval_result[name_column].astype(str)
+    else:
+        raise ValueError(f"Unknown entity {entity}, expected one of gene, variant or disease")
+    return pd.DataFrame(
+        {
+            "sample": sample,
+            "identifier": identifier.to_numpy(),
+            "name": name.to_numpy(),
+            "score": ranked_pheval_result["score"].astype("float64").to_numpy(),
+            "rank": ranked_pheval_result["rank"].astype("int64").to_numpy(),
+        }
+    )
+
+
+def _dataset_schema() -> "pyarrow.Schema":
+    return pyarrow.schema(
+        [
+            ("sample", pyarrow.string()),
+            ("identifier", pyarrow.string()),
+            ("name", pyarrow.string()),
+            ("score", pyarrow.float64()),
+            ("rank", pyarrow.int64()),
+        ]
+    )
+
+
+def write_pheval_result_partition(
+    ranked_pheval_result: pd.DataFrame, output_dir: Path, entity: str, sample: str
+) -> Path:
+    """
+    Stage the ranked result of one sample in the entity partition of the output dataset. Staged files are not
+    read as part of the dataset until compact_pheval_result_dataset merges them into the part file of the
+    partition. Safe to call from several processes, as every sample is staged in a file of its own.
+
+    :param ranked_pheval_result: Ranked PhEval result with a rank column.
+    :param output_dir: Output directory holding the dataset.
+    :param entity: gene, variant or disease.
+    :param sample: Sample name, the stem of the tool result file.
+    :return: Path of the staged file.
+    """
+    check_parquet_support()
+    staging_dir = dataset_path(output_dir).joinpath(f"entity={entity}", STAGING_DIR_NAME)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    staged_path = staging_dir.joinpath(f"{sample}.parquet")
+    tmp_path = staging_dir.joinpath(f".{sample}.parquet.tmp")
+    table = pyarrow.Table.from_pandas(
+        to_dataset_frame(ranked_pheval_result, entity, sample), schema=_dataset_schema(), preserve_index=False
+    )
+    pyarrow.parquet.write_table(table, tmp_path)
+    tmp_path.replace(staged_path)
+    return staged_path
+
+
+def compact_pheval_result_partition(partition: Path) -> Path:
+    """
+    Merge the staged samples of an entity partition into its part file, one row group per sample. Rows of
+    samples staged again replace the rows already in the part file. The part file is rewritten under a
+    dot-prefixed temporary name and moved into place before the staged files are removed.
+
+    :param partition: Entity partition directory of the dataset.
+    :return: Path of the part file.
+    """
+    check_parquet_support()
+    part_path = partition.joinpath(PART_FILE_NAME)
+    staging_dir = partition.joinpath(STAGING_DIR_NAME)
+    staged_paths = sorted(staging_dir.glob("*.parquet")) if staging_dir.exists() else []
+    if not staged_paths:
+        return part_path
+    schema = _dataset_schema()
+    staged_samples = pyarrow.array([staged_path.stem for staged_path in staged_paths], pyarrow.string())
+    tmp_path = partition.joinpath(f".{PART_FILE_NAME}.tmp")
+    with pyarrow.parquet.ParquetWriter(tmp_path, schema) as writer:
+        if part_path.exists():
+            part_file = pyarrow.parquet.ParquetFile(part_path)
+            for row_group in range(part_file.num_row_groups):
+                table = part_file.read_row_group(row_group, columns=schema.names)
+                kept = table.filter(pyarrow.compute.invert(pyarrow.compute.is_in(table["sample"], staged_samples)))
+                if kept.num_rows:
+                    writer.write_table(kept.cast(schema))
+        for staged_path in staged_paths:
+            writer.write_table(pyarrow.parquet.read_table(staged_path).cast(schema))
+    tmp_path.replace(part_path)
+    for staged_path in staged_paths:
+        staged_path.unlink()
+    return part_path
+
+
+def dataset_samples(output_dir: Path, entity: str) -> set:
+    """Samples with a result in the entity partition of the output dataset, compacted or still staged."""
+    partition = dataset_path(output_dir).joinpath(f"entity={entity}")
+    samples = {staged_path.stem for staged_path in partition.joinpath(STAGING_DIR_NAME).glob("*.parquet")}
+    part_path = partition.joinpath(PART_FILE_NAME)
+    if part_path.exists():
+        check_parquet_support()
+        samples.update(pyarrow.parquet.read_table(part_path, columns=["sample"])["sample"].unique().to_pylist())
+    return samples
+
+
+def compact_pheval_result_dataset(output_dir: Path) -> [Path]:
+    """Compact the staged samples of every entity partition of the output dataset."""
+    if not dataset_path(output_dir).exists():
+        return []
+    return [
+        compact_pheval_result_partition(partition)
+        for partition in sorted(dataset_path(output_dir).glob("entity=*"))
+        if partition.is_dir()
+    ]
+
+
+def read_pheval_result_dataset(output_dir: Path, entity: str = None, samples: [str] = None) -> pd.DataFrame:
+    """
+    Read the output dataset, optionally restricted to one entity and a set of samples. The filters are pushed
+    down to the Parquet reader, so only matching partitions and row groups are read.
+    """
+    check_parquet_support()
+    filters = []
+    if entity is not None:
+        filters.append(("entity", "==", entity))
+    if samples is not None:
+        filters.append(("sample", "in", list(samples)))
+    return pd.read_parquet(dataset_path(output_dir), engine="pyarrow", filters=filters or None)
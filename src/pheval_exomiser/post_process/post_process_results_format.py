@@ -1,8 +1,11 @@
 #!/usr/bin/python
 import json
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import Dict, Iterable, Iterator
 
 import click
+import pandas as pd
 from pheval.post_processing.post_processing import (
     PhEvalDiseaseResult,
     PhEvalGeneResult,
@@ -11,6 +14,18 @@ from pheval.post_processing.post_processing import (
 )
 from pheval.utils.file_utils import files_with_suffix
 
+from pheval_exomiser.post_process.pheval_result_dataset import (
+    OUTPUT_FORMATS,
+    check_parquet_support,
+    compact_pheval_result_dataset,
+    dataset_samples,
+    write_pheval_result_partition,
+)
+
+
+VARIANT_COLUMNS = ["chromosome", "start", "end", "ref", "alt", "score"]
+ENTITIES = ["gene", "variant", "disease"]
+
 
 def read_exomiser_json_result(exomiser_result_path: Path) -> dict:
     """Load Exomiser json result."""
@@ -20,6 +35,53 @@ def read_exomiser_json_result(exomiser_result_path: Path) -> dict:
     return exomiser_result
 
 
+def iter_exomiser_json_result(exomiser_result_path: Path, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Incrementally parse an Exomiser json result, yielding the entries of the top-level gene array one at a time.
+    Only the current entry and one read chunk are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(exomiser_result_path) as exomiser_json_result:
+        buffer, position, eof = "", 0, False
+
+        def read_more() -> bool:
+            nonlocal buffer, position, eof
+            # grow the read size with the buffer so an entry larger than chunk_size is not re-decoded too often
+            chunk = exomiser_json_result.read(max(chunk_size, len(buffer) - position))
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            return not eof
+
+        def next_token(skip: str = "") -> str:
+            nonlocal position
+            while True:
+                while position < len(buffer) and (buffer[position].isspace() or buffer[position] in skip):
+                    position += 1
+                if position < len(buffer) or not read_more():
+                    return buffer[position] if position < len(buffer) else ""
+
+        if next_token() != "[":
+            raise ValueError(f"Expected a json array of results in {exomiser_result_path}")
+        position += 1
+        while True:
+            token = next_token(skip=",")
+            if token == "]":
+                return
+            if not token:
+                raise ValueError(f"Unterminated json array in {exomiser_result_path}")
+            try:
+                entry, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof or not read_more():
+                    raise
+                continue
+            if end == len(buffer) and not eof and read_more():
+                # the entry may continue in the next chunk
+                continue
+            position = end
+            yield entry
+
+
 def trim_exomiser_result_filename(exomiser_result_path: Path) -> Path:
     """Trim suffix appended to Exomiser JSON result path."""
     return Path(str(exomiser_result_path.name).replace("-exomiser", ""))
@@ -44,19 +106,23 @@ class PhEvalGeneResultFromExomiserJsonCreator:
         """Return score from Exomiser result entry."""
         return round(result_entry[self.score_name], 4)
 
+    def extract_entry_requirements(self, result_entry: dict) -> [PhEvalGeneResult]:
+        """Extract data required to produce PhEval gene output from a single Exomiser result entry."""
+        if self.score_name not in result_entry:
+            return []
+        return [
+            PhEvalGeneResult(
+                gene_symbol=self._find_gene_symbol(result_entry),
+                gene_identifier=self._find_gene_identifier(result_entry),
+                score=self._find_relevant_score(result_entry),
+            )
+        ]
+
     def extract_pheval_gene_requirements(self) -> [PhEvalGeneResult]:
         """Extract data required to produce PhEval gene output."""
         simplified_exomiser_result = []
         for result_entry in self.exomiser_json_result:
-            if self.score_name in result_entry:
-                simplified_exomiser_result.append(
-                    PhEvalGeneResult(
-                        gene_symbol=self._find_gene_symbol(result_entry),
-                        gene_identifier=self._find_gene_identifier(result_entry),
-                        score=self._find_relevant_score(result_entry),
-                    )
-                )
-
+            simplified_exomiser_result.extend(self.extract_entry_requirements(result_entry))
         return simplified_exomiser_result
 
 
@@ -97,27 +163,64 @@ class PhEvalVariantResultFromExomiserJsonCreator:
         """Return score from Exomiser result entry."""
         return round(result_entry[self.score_name], 4)
 
+    def extract_entry_requirements(self, result_entry: dict) -> [PhEvalVariantResult]:
+        """Extract data required to produce PhEval variant output from a single Exomiser result entry."""
+        simplified_exomiser_result = []
+        for gene_hit in result_entry["geneScores"]:
+            if self.score_name in result_entry:
+                if "contributingVariants" in gene_hit:
+                    score = self._find_relevant_score(result_entry)
+                    for cv in gene_hit["contributingVariants"]:
+                        simplified_exomiser_result.append(
+                            PhEvalVariantResult(
+                                chromosome=self._find_chromosome(cv),
+                                start=self._find_start_pos(cv),
+                                end=self._find_end_pos(cv),
+                                ref=self._find_ref(cv),
+                                alt=self._find_alt(cv),
+                                score=score,
+                            )
+                        )
+        return simplified_exomiser_result
+
     def extract_pheval_variant_requirements(self) -> [PhEvalVariantResult]:
         """Extract data required to produce PhEval variant output."""
         simplified_exomiser_result = []
         for result_entry in self.exomiser_json_result:
-            for gene_hit in result_entry["geneScores"]:
-                if self.score_name in result_entry:
-                    if "contributingVariants" in gene_hit:
-                        score = self._find_relevant_score(result_entry)
-                        for cv in gene_hit["contributingVariants"]:
-                            simplified_exomiser_result.append(
-                                PhEvalVariantResult(
-                                    chromosome=self._find_chromosome(cv),
-                                    start=self._find_start_pos(cv),
-                                    end=self._find_end_pos(cv),
-                                    ref=self._find_ref(cv),
-                                    alt=self._find_alt(cv),
-                                    score=score,
-                                )
-                            )
+            simplified_exomiser_result.extend(self.extract_entry_requirements(result_entry))
         return simplified_exomiser_result
 
+    def extract_entry_columns(self, result_entry: dict, columns: Dict[str, list]) -> None:
+        """
+        Append the contributing variants of a single Exomiser result entry to the PhEval variant columns,
+        without building a PhEvalVariantResult per variant.
+        """
+        if self.score_name not in result_entry:
+            return
+        score = self._find_relevant_score(result_entry)
+        for gene_hit in result_entry["geneScores"]:
+            for cv in gene_hit.get("contributingVariants", ()):
+                columns["chromosome"].append(cv["contigName"])
+                columns["start"].append(cv["start"])
+                columns["end"].append(cv["end"])
+                columns["ref"].append(cv["ref"])
+                columns["alt"].append(cv.get("alt"))
+                columns["score"].append(score)
+
+    @staticmethod
+    def variant_columns_to_frame(columns: Dict[str, list]) -> pd.DataFrame:
+        """Convert PhEval variant columns to a DataFrame, stripping symbolic allele brackets from alt in one go."""
+        variant_frame = pd.DataFrame(columns, columns=VARIANT_COLUMNS)
+        variant_frame["alt"] = variant_frame["alt"].fillna("").astype(str).str.strip(">").str.strip("<")
+        return variant_frame
+
+    def extract_pheval_variant_frame(self) -> pd.DataFrame:
+        """Extract data required to produce PhEval variant output as a columnar DataFrame."""
+        columns = {column: [] for column in VARIANT_COLUMNS}
+        for result_entry in self.exomiser_json_result:
+            self.extract_entry_columns(result_entry, columns)
+        return self.variant_columns_to_frame(columns)
+
 
 class PhEvalDiseaseResultFromExomiserJsonCreator:
     def __init__(self, exomiser_json_result: [dict]):
@@ -138,26 +241,246 @@ class PhEvalDiseaseResultFromExomiserJsonCreator:
         """Return score from Exomiser result entry."""
         return round(result_entry["score"], 4)
 
+    def extract_entry_requirements(self, result_entry: dict) -> [PhEvalDiseaseResult]:
+        """Extract data required to produce PhEval disease output from a single Exomiser result entry."""
+        simplified_exomiser_result = []
+        try:
+            for disease in result_entry["priorityResults"]["HIPHIVE_PRIORITY"]["diseaseMatches"]:
+                simplified_exomiser_result.append(
+                    PhEvalDiseaseResult(
+                        disease_name=self._find_disease_name(disease["model"]),
+                        disease_identifier=self._find_disease_identifier(disease["model"]),
+                        score=self._find_relevant_score(disease),
+                    )
+                )
+        except KeyError:
+            pass
+        return simplified_exomiser_result
+
     def extract_pheval_disease_requirements(self) -> [PhEvalDiseaseResult]:
         """Extract data required to produce PhEval disease output."""
         simplified_exomiser_result = []
         for result_entry in self.exomiser_json_result:
-            try:
-                for disease in result_entry["priorityResults"]["HIPHIVE_PRIORITY"][
-                    "diseaseMatches"
-                ]:
-                    simplified_exomiser_result.append(
-                        PhEvalDiseaseResult(
-                            disease_name=self._find_disease_name(disease["model"]),
-                            disease_identifier=self._find_disease_identifier(disease["model"]),
-                            score=self._find_relevant_score(disease),
-                        )
-                    )
-            except KeyError:
-                pass
+            simplified_exomiser_result.extend(self.extract_entry_requirements(result_entry))
         return simplified_exomiser_result
 
 
+def extract_pheval_requirements(
+    exomiser_result: Iterable[dict],
+    score_name: str,
+    variant_analysis: bool,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    variant_columns: bool = False,
+) -> ([PhEvalGeneResult], [PhEvalVariantResult], [PhEvalDiseaseResult]):
+    """
+    Extract gene, variant and disease results with a single pass over the Exomiser result entries,
+    so the entries may come from a streaming reader. With variant_columns the variant results are
+    gathered column-wise and returned as a DataFrame instead of a list of PhEvalVariantResult.
+    """
+    creators = {
+        "gene": PhEvalGeneResultFromExomiserJsonCreator([], score_name) if gene_analysis else None,
+        "variant": PhEvalVariantResultFromExomiserJsonCreator([], score_name) if variant_analysis else None,
+        "disease": PhEvalDiseaseResultFromExomiserJsonCreator([]) if disease_analysis else None,
+    }
+    requirements = {analysis: [] for analysis in creators}
+    variant_creator = creators["variant"]
+    if variant_columns and variant_creator is not None:
+        del creators["variant"]
+        columns = {column: [] for column in VARIANT_COLUMNS}
+    for result_entry in exomiser_result:
+        for analysis, creator in creators.items():
+            if creator is not None:
+                requirements[analysis].extend(creator.extract_entry_requirements(result_entry))
+        if variant_columns and variant_creator is not None:
+            variant_creator.extract_entry_columns(result_entry, columns)
+    if variant_columns and variant_creator is not None:
+        requirements["variant"] = variant_creator.variant_columns_to_frame(columns)
+    return requirements["gene"], requirements["variant"], requirements["disease"]
+
+
+def rank_pheval_result_frame(pheval_result: pd.DataFrame, sort_order: str) -> pd.DataFrame:
+    """
+    Sort and rank a columnar PhEval result the way generate_pheval_result does: a stable sort by score
+    and tied scores sharing the maximum rank.
+    """
+    if sort_order.lower() not in ("ascending", "descending"):
+        raise ValueError("Incompatible ordering method specified.")
+    ascending = sort_order.lower() == "ascending"
+    ranked_pheval_result = pheval_result.sort_values(
+        "score", ascending=ascending, kind="stable", ignore_index=True
+    )
+    ranked_pheval_result["rank"] = ranked_pheval_result["score"].rank(method="max", ascending=ascending)
+    return ranked_pheval_result
+
+
+def write_pheval_variant_frame(
+    variant_frame: pd.DataFrame, sort_order: str, output_dir: Path, tool_result_path: Path
+) -> None:
+    """Rank and write a columnar PhEval variant result in the format of generate_pheval_result."""
+    if variant_frame.empty:
+        print(f"No results found for {tool_result_path.name}")
+        return
+    ranked_pheval_result = rank_pheval_result_frame(variant_frame, sort_order)
+    ranked_pheval_result.loc[:, ["rank", "score", "chromosome", "start", "end", "ref", "alt"]].to_csv(
+        output_dir.joinpath(
+            "pheval_variant_results/" + tool_result_path.stem + "-pheval_variant_result.tsv"
+        ),
+        sep="\t",
+        index=False,
+    )
+
+
+def write_standardised_result(
+    pheval_result,
+    entity: str,
+    sort_order: str,
+    output_dir: Path,
+    tool_result_path: Path,
+    output_format: str = "tsv",
+) -> None:
+    """
+    Write a gene, variant or disease result either as a PhEval TSV or into the entity partition
+    of the Parquet result dataset in output_dir.
+    """
+    if output_format == "parquet":
+        pheval_result_frame = (
+            pheval_result
+            if isinstance(pheval_result, pd.DataFrame)
+            else pd.DataFrame([result.__dict__ for result in pheval_result])
+        )
+        if pheval_result_frame.empty:
+            print(f"No results found for {tool_result_path.name}")
+            return
+        write_pheval_result_partition(
+            rank_pheval_result_frame(pheval_result_frame, sort_order),
+            output_dir,
+            entity,
+            tool_result_path.stem,
+        )
+    elif isinstance(pheval_result, pd.DataFrame):
+        write_pheval_variant_frame(pheval_result, sort_order, output_dir, tool_result_path)
+    else:
+        generate_pheval_result(
+            pheval_result=pheval_result,
+            sort_order_str=sort_order,
+            output_dir=output_dir,
+            tool_result_path=tool_result_path,
+        )
+
+
+def standardise_exomiser_result(
+    exomiser_json_result: Path,
+    output_dir: Path,
+    score_name: str,
+    sort_order: str,
+    variant_analysis: bool,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    streaming: bool = False,
+    output_format: str = "tsv",
+) -> Dict[str, int]:
+    """
+    Write standardised gene/variant/disease results for a single Exomiser json result.
+    Returns the number of rows of every analysed entity; an entity with no rows is not written.
+    """
+    exomiser_result = (
+        iter_exomiser_json_result(exomiser_json_result)
+        if streaming
+        else read_exomiser_json_result(exomiser_json_result)
+    )
+    gene_requirements, variant_frame, disease_requirements = extract_pheval_requirements(
+        exomiser_result,
+        score_name,
+        variant_analysis,
+        gene_analysis,
+        disease_analysis,
+        variant_columns=True,
+    )
+    tool_result_path = trim_exomiser_result_filename(exomiser_json_result)
+    row_counts = {}
+    for analysis, entity, pheval_result in (
+        (gene_analysis, "gene", gene_requirements),
+        (variant_analysis, "variant", variant_frame),
+        (disease_analysis, "disease", disease_requirements),
+    ):
+        if analysis:
+            write_standardised_result(
+                pheval_result, entity, sort_order, output_dir, tool_result_path, output_format
+            )
+            row_counts[entity] = len(pheval_result)
+    return row_counts
+
+
+class StandardisedResultsManifest:
+    """
+    Record of the Exomiser json results already standardised into an output directory, stored as json
+    in the output directory. A result is up to date if its size, modification time and the
+    standardisation parameters are unchanged since it was last processed, and every standardised
+    output it should have, a TSV or a sample in the Parquet dataset per analysed entity, exists.
+    Entities recorded with no rows have no output and need none.
+    """
+
+    FILE_NAME = "pheval_exomiser_manifest.json"
+
+    def __init__(self, output_dir: Path, params: dict):
+        self.output_dir = output_dir
+        self.path = output_dir.joinpath(self.FILE_NAME)
+        self.params = params
+        self.entries = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self._dataset_samples = {}
+
+    @staticmethod
+    def _key(exomiser_json_result: Path) -> str:
+        return str(Path(exomiser_json_result).resolve())
+
+    def _signature(self, exomiser_json_result: Path) -> dict:
+        stat = Path(exomiser_json_result).stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "params": self.params}
+
+    def is_up_to_date(self, exomiser_json_result: Path) -> bool:
+        entry = dict(self.entries.get(self._key(exomiser_json_result), {}))
+        row_counts = entry.pop("rows", {})
+        if entry != self._signature(exomiser_json_result):
+            return False
+        return self.outputs_exist(exomiser_json_result, row_counts)
+
+    def outputs_exist(self, exomiser_json_result: Path, row_counts: Dict[str, int] = None) -> bool:
+        """
+        Check that the standardised output of every analysed entity of a result exists.
+        Entities with a row count of 0 in row_counts are not written and are not checked.
+        """
+        row_counts = row_counts or {}
+        sample = trim_exomiser_result_filename(Path(exomiser_json_result)).stem
+        entities = [
+            entity
+            for entity in ENTITIES
+            if self.params.get(f"{entity}_analysis") and row_counts.get(entity) != 0
+        ]
+        if self.params.get("output_format") == "parquet":
+            for entity in entities:
+                if entity not in self._dataset_samples:
+                    self._dataset_samples[entity] = dataset_samples(self.output_dir, entity)
+            return all(sample in self._dataset_samples[entity] for entity in entities)
+        return all(
+            self.output_dir.joinpath(f"pheval_{entity}_results", f"{sample}-pheval_{entity}_result.tsv").exists()
+            for entity in entities
+        )
+
+    def record(self, exomiser_json_result: Path, row_counts: Dict[str, int] = None) -> None:
+        """Record a standardised result with the number of rows written for each analysed entity."""
+        entry = self._signature(exomiser_json_result)
+        if row_counts is not None:
+            entry["rows"] = row_counts
+        self.entries[self._key(exomiser_json_result)] = entry
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+        tmp_path.replace(self.path)
+
+
 def create_standardised_results(
     results_dir: Path,
     output_dir: Path,
@@ -166,40 +489,108 @@ def create_standardised_results(
     variant_analysis: bool,
     gene_analysis: bool,
     disease_analysis: bool,
+    streaming: bool = False,
+    workers: int = 1,
+    force: bool = False,
+    output_format: str = "tsv",
 ) -> None:
-    """Write standardised gene/variant/disease results from default Exomiser json output."""
-    for exomiser_json_result in files_with_suffix(results_dir, ".json"):
-        exomiser_result = read_exomiser_json_result(exomiser_json_result)
-        if gene_analysis:
-            pheval_gene_requirements = PhEvalGeneResultFromExomiserJsonCreator(
-                exomiser_result, score_name
-            ).extract_pheval_gene_requirements()
-            generate_pheval_result(
-                pheval_result=pheval_gene_requirements,
-                sort_order_str=sort_order,
-                output_dir=output_dir,
-                tool_result_path=trim_exomiser_result_filename(exomiser_json_result),
-            )
-        if variant_analysis:
-            pheval_variant_requirements = PhEvalVariantResultFromExomiserJsonCreator(
-                exomiser_result, score_name
-            ).extract_pheval_variant_requirements()
-            generate_pheval_result(
-                pheval_result=pheval_variant_requirements,
-                sort_order_str=sort_order,
-                output_dir=output_dir,
-                tool_result_path=trim_exomiser_result_filename(exomiser_json_result),
-            )
-        if disease_analysis:
-            pheval_disease_requirements = PhEvalDiseaseResultFromExomiserJsonCreator(
-                exomiser_result
-            ).extract_pheval_disease_requirements()
-            generate_pheval_result(
-                pheval_result=pheval_disease_requirements,
-                sort_order_str=sort_order,
-                output_dir=output_dir,
-                tool_result_path=trim_exomiser_result_filename(exomiser_json_result),
-            )
+    """
+    Write standardised gene/variant/disease results from default Exomiser json output, as PhEval TSVs
+    or as one Parquet dataset.
+    Results that are unchanged since the last run with the same parameters are skipped unless force is set.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {OUTPUT_FORMATS}")
+    if output_format == "parquet":
+        check_parquet_support()
+    options = dict(
+        output_dir=output_dir,
+        score_name=score_name,
+        sort_order=sort_order,
+        variant_analysis=variant_analysis,
+        gene_analysis=gene_analysis,
+        disease_analysis=disease_analysis,
+        streaming=streaming,
+        output_format=output_format,
+    )
+    manifest = StandardisedResultsManifest(
+        output_dir,
+        params=dict(
+            score_name=score_name,
+            sort_order=sort_order,
+            variant_analysis=variant_analysis,
+            gene_analysis=gene_analysis,
+            disease_analysis=disease_analysis,
+            output_format=output_format,
+        ),
+    )
+    exomiser_json_results = files_with_suffix(results_dir, ".json")
+    outdated = [
+        exomiser_json_result
+        for exomiser_json_result in exomiser_json_results
+        if force or not manifest.is_up_to_date(exomiser_json_result)
+    ]
+    if len(outdated) < len(exomiser_json_results):
+        print(f"Skipping {len(exomiser_json_results) - len(outdated)} unchanged Exomiser results")
+    try:
+        if workers > 1:
+            create_standardised_results_parallel(outdated, workers, manifest=manifest, **options)
+            return
+        for exomiser_json_result in outdated:
+            manifest.record(exomiser_json_result, standardise_exomiser_result(exomiser_json_result, **options))
+    finally:
+        if output_format == "parquet":
+            compact_pheval_result_dataset(output_dir)
+        manifest.save()
+
+
+def create_standardised_results_parallel(
+    exomiser_json_results: [Path],
+    workers: int,
+    max_in_flight: int = None,
+    manifest: StandardisedResultsManifest = None,
+    **options,
+) -> None:
+    """
+    Standardise Exomiser json results with a pool of worker processes. At most max_in_flight files
+    (4 per worker by default) are queued at a time. A failing file does not stop the others;
+    all failures are reported once every file has been processed.
+    """
+    max_in_flight = max_in_flight or 4 * workers
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        for exomiser_json_result in exomiser_json_results:
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                failures.extend(_collect_failures(done, in_flight, manifest))
+            future = executor.submit(standardise_exomiser_result, exomiser_json_result, **options)
+            in_flight[future] = exomiser_json_result
+        failures.extend(_collect_failures(list(in_flight), in_flight, manifest))
+    if failures:
+        for exomiser_json_result, error in failures:
+            print(f"Failed to standardise {exomiser_json_result}: {error!r}")
+        raise RuntimeError(
+            f"Failed to standardise {len(failures)} of {len(exomiser_json_results)} Exomiser results"
+        )
+
+
+def _collect_failures(
+    done, in_flight: dict, manifest: StandardisedResultsManifest = None
+) -> [(Path, BaseException)]:
+    """
+    Remove finished futures from in_flight, recording successfully standardised files in the manifest,
+    and return the files whose standardisation raised.
+    """
+    failures = []
+    for future in done:
+        exomiser_json_result = in_flight.pop(future)
+        error = future.exception()
+        if error is not None:
+            failures.append((exomiser_json_result, error))
+        elif manifest is not None:
+            manifest.record(exomiser_json_result, future.result())
+    return failures
 
 
 @click.command()
@@ -255,6 +646,34 @@ def create_standardised_results(
     default=False,
     help="Specify whether to create PhEval disease results.",
 )
+@click.option(
+    "--streaming/--no-streaming",
+    type=bool,
+    default=False,
+    help="Parse Exomiser json results entry by entry instead of loading whole files into memory.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    help="Number of worker processes standardising result files in parallel.",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--force/--no-force",
+    type=bool,
+    default=False,
+    help="Standardise all results, including those unchanged since the last run.",
+)
+@click.option(
+    "--output-format",
+    "-f",
+    help="Write PhEval TSVs per sample or a single Parquet dataset partitioned by entity (requires pyarrow).",
+    type=click.Choice(OUTPUT_FORMATS),
+    default="tsv",
+    show_default=True,
+)
 def post_process_exomiser_results(
     output_dir: Path,
     results_dir: Path,
@@ -263,17 +682,22 @@ def post_process_exomiser_results(
     gene_analysis: bool,
     variant_analysis: bool,
     disease_analysis: bool,
+    streaming: bool,
+    workers: int,
+    force: bool,
+    output_format: str,
 ):
     """Post-process Exomiser json results into PhEval gene and variant outputs."""
+    tsv_output = output_format == "tsv"
     output_dir.joinpath("pheval_gene_results").mkdir(
         parents=True, exist_ok=True
-    ) if gene_analysis else None
+    ) if gene_analysis and tsv_output else None
     output_dir.joinpath("pheval_variant_results").mkdir(
         parents=True, exist_ok=True
-    ) if variant_analysis else None
+    ) if variant_analysis and tsv_output else None
     output_dir.joinpath("pheval_disease_results").mkdir(
         parents=True, exist_ok=True
-    ) if disease_analysis else None
+    ) if disease_analysis and tsv_output else None
     create_standardised_results(
         results_dir,
         output_dir,
@@ -282,4 +706,8 @@ def post_process_exomiser_results(
         variant_analysis,
         gene_analysis,
         disease_analysis,
+        streaming=streaming,
+        workers=workers,
+        force=force,
+        output_format=output_format,
     )
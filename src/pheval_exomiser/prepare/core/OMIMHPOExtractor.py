@@ -1,3 +1,17 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.ontology_cache import file_digest
+
+HPOA_QUALIFIER_COLUMN = 2
+HPOA_HPO_ID_COLUMN = 3
+HPOA_ASPECT_COLUMN = 10
+
+
 class OMIMHPOExtractor:
     @staticmethod
     def extract_omim_hpo_mappings(data):
@@ -45,4 +59,108 @@ class OMIMHPOExtractor:
         """
         with open(file_path, 'r') as file:
             data = file.read()
-        return data
\ No newline at end of file
+        return data
+
+    @staticmethod
+    def iter_annotations(
+        file_path,
+        database_prefixes: Optional[Sequence[str]] = None,
+        aspects: Optional[Sequence[str]] = None,
+        exclude_not: bool = False,
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Streams (disease ID, HPO ID) annotations from a phenotype.hpoa file line by line.
+
+        :param file_path: Path to the phenotype.hpoa file.
+        :param database_prefixes: Keep only diseases from these databases, e.g. ["OMIM", "ORPHA"]. Keeps all if None.
+        :param aspects: Keep only annotations of these aspects, e.g. ["P"]. Keeps all if None.
+        :param exclude_not: Drop annotations with the NOT qualifier.
+        :return: Iterator of (disease ID, HPO ID) tuples.
+        """
+        prefixes = tuple(f"{prefix}:" for prefix in database_prefixes) if database_prefixes else None
+        aspects = set(aspects) if aspects else None
+        header_skipped = False
+        with open(file_path, "r") as file:
+            for line in file:
+                line = line.rstrip("\n")
+                if not line or line.startswith("#"):
+                    continue
+
+                if not header_skipped:
+                    header_skipped = True
+                    continue
+
+                parts = line.split("\t")
+                if len(parts) <= HPOA_HPO_ID_COLUMN:
+                    continue
+                if prefixes and not parts[0].startswith(prefixes):
+                    continue
+                if exclude_not and parts[HPOA_QUALIFIER_COLUMN] == "NOT":
+                    continue
+                if aspects and (len(parts) <= HPOA_ASPECT_COLUMN or parts[HPOA_ASPECT_COLUMN] not in aspects):
+                    continue
+                yield parts[0], parts[HPOA_HPO_ID_COLUMN]
+
+    @staticmethod
+    def extract_omim_hpo_mappings_from_file(file_path, **filters) -> Dict[str, List[str]]:
+        """
+        Streams a phenotype.hpoa file into a dictionary of disease IDs to their distinct HPO IDs, in file order.
+
+        :param file_path: Path to the phenotype.hpoa file.
+        :param filters: database_prefixes, aspects and exclude_not, see iter_annotations.
+        :return: Dictionary with disease IDs as keys and lists of HPO IDs as values.
+        """
+        disease_hpo_dict = {}
+        for disease_id, hpo_id in OMIMHPOExtractor.iter_annotations(file_path, **filters):
+            disease_hpo_dict.setdefault(disease_id, {})[hpo_id] = None
+        return {disease_id: list(hpo_ids) for disease_id, hpo_ids in disease_hpo_dict.items()}
+
+    @staticmethod
+    def load_omim_hpo_mappings(file_path, cache_dir: Optional[str] = None, **filters) -> Dict[str, List[str]]:
+        """
+        Returns the disease to HPO mapping of a phenotype.hpoa file, cached in cache_dir as a compact .npz keyed by
+        the file hash and the filters, so an unchanged file is only parsed once.
+
+        :param file_path: Path to the phenotype.hpoa file.
+        :param cache_dir: Directory of the parsed annotation cache. Parses on every call if None.
+        :param filters: database_prefixes, aspects and exclude_not, see iter_annotations.
+        :return: Dictionary with disease IDs as keys and lists of HPO IDs as values.
+        """
+        if cache_dir is None:
+            return OMIMHPOExtractor.extract_omim_hpo_mappings_from_file(file_path, **filters)
+        key = f"{file_digest(file_path)}|{json.dumps(filters, sort_keys=True)}"
+        cache_path = os.path.join(cache_dir, f"hpoa-{hashlib.sha256(key.encode()).hexdigest()[:16]}.npz")
+        if os.path.exists(cache_path):
+            return OMIMHPOExtractor._read_mappings_cache(cache_path)
+        disease_hpo_dict = OMIMHPOExtractor.extract_omim_hpo_mappings_from_file(file_path, **filters)
+        os.makedirs(cache_dir, exist_ok=True)
+        OMIMHPOExtractor._write_mappings_cache(cache_path, disease_hpo_dict)
+        return disease_hpo_dict
+
+    @staticmethod
+    def _write_mappings_cache(cache_path: str, disease_hpo_dict: Dict[str, List[str]]):
+        terms = sorted({hpo_id for hpo_ids in disease_hpo_dict.values() for hpo_id in hpo_ids})
+        term_index = {hpo_id: code for code, hpo_id in enumerate(terms)}
+        term_codes = [term_index[hpo_id] for hpo_ids in disease_hpo_dict.values() for hpo_id in hpo_ids]
+        indptr = np.cumsum([0] + [len(hpo_ids) for hpo_ids in disease_hpo_dict.values()])
+        with open(cache_path + ".tmp", "wb") as cache_file:
+            np.savez(
+                cache_file,
+                diseases=np.asarray(list(disease_hpo_dict), dtype=str),
+                terms=np.asarray(terms, dtype=str),
+                indptr=np.asarray(indptr, dtype=np.int64),
+                term_codes=np.asarray(term_codes, dtype=np.int32),
+            )
+        os.replace(cache_path + ".tmp", cache_path)
+
+    @staticmethod
+    def _read_mappings_cache(cache_path: str) -> Dict[str, List[str]]:
+        with np.load(cache_path) as cache:
+            diseases = cache["diseases"].tolist()
+            terms = cache["terms"].tolist()
+            indptr = cache["indptr"].tolist()
+            term_codes = cache["term_codes"].tolist()
+        return {
+            disease_id: [terms[code] for code in term_codes[indptr[row]:indptr[row + 1]]]
+            for row, disease_id in enumerate(diseases)
+        }
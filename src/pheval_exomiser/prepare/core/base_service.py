@@ -1,4 +1,6 @@
+import hashlib
 from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Tuple
 
 from chromadb.types import Collection
 
@@ -29,3 +31,38 @@ class BaseService(ABC):
     @abstractmethod
     def upsert_batch(self, batch):
         pass
+
+    @staticmethod
+    def terms_hash(hpo_terms: Iterable[str]) -> str:
+        """Order independent hash of the HPO terms of a disease, stored in the collection metadata."""
+        return hashlib.sha1("\n".join(sorted(set(hpo_terms))).encode()).hexdigest()
+
+    def disease_metadata(self, disease: str) -> Dict[str, str]:
+        return {"type": "disease", "terms_hash": self.terms_hash(self.disease_to_hps_from_omim.get(disease, []))}
+
+    def annotation_diff(self, collection: Collection, page_size: int = 10000) -> Tuple[List[str], List[str]]:
+        """
+        Compares the terms_hash stored with every disease of the collection against the current disease to HPO
+        annotations. Entries written before terms_hash was stored count as changed.
+
+        :param collection: Disease collection to compare against.
+        :param page_size: Number of entries read from the collection at a time.
+        :return: Tuple of the diseases that were added or changed and the stored diseases that were removed.
+        """
+        stored = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for disease, metadata in zip(page["ids"], page["metadatas"]):
+                stored[disease] = (metadata or {}).get("terms_hash")
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+
+        changed = [
+            disease
+            for disease, hpo_terms in self.disease_to_hps_from_omim.items()
+            if stored.get(disease) != self.terms_hash(hpo_terms)
+        ]
+        removed = [disease for disease in stored if disease not in self.disease_to_hps_from_omim]
+        return changed, removed
@@ -10,6 +10,7 @@ logger = logging.getLogger(__name__)
 class ChromaDBManager:
     def __init__(self, similarity: Optional[SimilarityMeasures] = SimilarityMeasures.COSINE):
         config = config_loader.load_config()
+        self.config = config
         path = config["chroma_db_path"] # change between stagedb and stagedb_new
         self.client = chromadb.PersistentClient(path=path)
         self.ont_hp = self.get_collection("ont_hp")
@@ -0,0 +1,92 @@
+from typing import List, Sequence
+
+import networkx as nx
+import numpy as np
+
+"""
+    Compact ancestor closure of the HPO: term IDs are integer coded and the ancestors of every term are stored
+    CSR style as one sorted int32 array, so ancestor queries are array slices instead of networkx traversals.
+"""
+
+
+class ClosureIndex:
+    def __init__(self, terms: Sequence[str], indptr: np.ndarray, indices: np.ndarray):
+        """
+        :param terms: Term IDs, the position of a term is its integer code.
+        :param indptr: Row pointer of length len(terms) + 1.
+        :param indices: Sorted ancestor codes of term i at indices[indptr[i]:indptr[i + 1]].
+        """
+        if len(indptr) != len(terms) + 1:
+            raise ValueError(f"Expected row pointer of length {len(terms) + 1}, got {len(indptr)}")
+        self.terms = np.asarray(terms, dtype=str)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.term_index = {term: code for code, term in enumerate(self.terms.tolist())}
+
+    @classmethod
+    def from_graph(cls, graph: nx.DiGraph, include_self: bool = False) -> "ClosureIndex":
+        """
+        Computes the ancestor closure of every node with a single pass in topological order: the ancestors of a
+        node are its parents together with their ancestors.
+
+        :param graph: Ontology graph with edges pointing from parent to child.
+        :param include_self: Count every term as its own ancestor.
+        :return: ClosureIndex over all nodes of the graph.
+        """
+        terms = sorted(graph.nodes())
+        term_index = {term: code for code, term in enumerate(terms)}
+        ancestors = [None] * len(terms)
+        for node in nx.topological_sort(graph):
+            node_ancestors = set()
+            for parent in graph.predecessors(node):
+                parent_code = term_index[parent]
+                node_ancestors.add(parent_code)
+                node_ancestors.update(ancestors[parent_code])
+            ancestors[term_index[node]] = node_ancestors
+
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        rows = []
+        for code, node_ancestors in enumerate(ancestors):
+            row = sorted(node_ancestors | {code}) if include_self else sorted(node_ancestors)
+            rows.append(np.asarray(row, dtype=np.int32))
+            indptr[code + 1] = indptr[code] + len(row)
+        indices = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        return cls(terms, indptr, indices)
+
+    def save(self, path):
+        np.savez(path, terms=self.terms, indptr=self.indptr, indices=self.indices)
+
+    @classmethod
+    def load(cls, path) -> "ClosureIndex":
+        with np.load(path) as closure:
+            return cls(closure["terms"], closure["indptr"], closure["indices"])
+
+    def __contains__(self, term) -> bool:
+        return term in self.term_index
+
+    def __len__(self) -> int:
+        """Number of (term, ancestor) pairs."""
+        return len(self.indices)
+
+    def ancestor_codes(self, term: str) -> np.ndarray:
+        """Sorted integer codes of the ancestors of a term; empty for unknown terms."""
+        code = self.term_index.get(term)
+        if code is None:
+            return self.indices[:0]
+        return self.indices[self.indptr[code]:self.indptr[code + 1]]
+
+    def ancestors(self, term: str) -> List[str]:
+        return self.terms[self.ancestor_codes(term)].tolist()
+
+    def is_descendant(self, term: str, ancestor: str) -> bool:
+        """Whether ancestor is in the closure of term."""
+        ancestor_code = self.term_index.get(ancestor)
+        if ancestor_code is None:
+            return False
+        codes = self.ancestor_codes(term)
+        position = np.searchsorted(codes, ancestor_code)
+        return bool(position < len(codes) and codes[position] == ancestor_code)
+
+    def common_ancestors(self, term_a: str, term_b: str) -> List[str]:
+        codes = np.intersect1d(self.ancestor_codes(term_a), self.ancestor_codes(term_b), assume_unique=True)
+        return self.terms[codes].tolist()
@@ -1,10 +1,11 @@
 import json
-from typing import Dict
+from typing import Dict, List, Mapping, Tuple
 
 import numpy as np
 from chromadb.types import Collection
 
 from pheval_exomiser.prepare.core.chromadb_manager import ChromaDBManager
+from pheval_exomiser.prepare.core.embedding_store import EmbeddingStore
 from pheval_exomiser.prepare.core.OMIMHPOExtractor import OMIMHPOExtractor
 
 """
@@ -20,13 +21,51 @@ class DataProcessor:
         self._hp_embeddings = None
         # self._disease_to_hps = None
         self._disease_to_hps_from_omim = None
+        self._hp_embedding_matrix = None
 
     @property
-    def hp_embeddings(self) -> Dict:
+    def hp_embeddings(self) -> Mapping:
         if self._hp_embeddings is None:
-            self._hp_embeddings = self.create_hpo_id_to_embedding(self.db_manager.ont_hp)
+            store_path = self.db_manager.config.get("embedding_store_path")
+            if store_path:
+                self._hp_embeddings = self.load_hp_embedding_store(store_path)
+            else:
+                self._hp_embeddings = self.create_hpo_id_to_embedding(self.db_manager.ont_hp)
         return self._hp_embeddings
 
+    @property
+    def hp_embedding_matrix(self) -> Tuple[Dict[str, int], np.ndarray]:
+        """
+        HPO embeddings as one float32 matrix together with the HPO ID to row index.
+        Served straight from the EmbeddingStore when one is configured.
+        """
+        if self._hp_embedding_matrix is None:
+            hp_embeddings = self.hp_embeddings
+            if isinstance(hp_embeddings, EmbeddingStore):
+                self._hp_embedding_matrix = (hp_embeddings.index, hp_embeddings.matrix)
+            else:
+                index = {hpo_id: row for row, hpo_id in enumerate(hp_embeddings)}
+                matrix = np.asarray([data["embeddings"] for data in hp_embeddings.values()], dtype=np.float32)
+                self._hp_embedding_matrix = (index, matrix)
+        return self._hp_embedding_matrix
+
+    def load_hp_embedding_store(self, store_path: str) -> EmbeddingStore:
+        """
+        Open the memory-mapped HPO embedding store, building it from the ont_hp collection on first use.
+
+        :param store_path: Directory holding the embedding store files.
+        :return: EmbeddingStore mapping HPO IDs to their embeddings.
+        """
+        if EmbeddingStore.exists(store_path, "ont_hp"):
+            return EmbeddingStore.load(store_path, "ont_hp")
+        hpo_id_to_data = self.create_hpo_id_to_embedding(self.db_manager.ont_hp)
+        return EmbeddingStore.build(
+            store_path,
+            "ont_hp",
+            ids=list(hpo_id_to_data),
+            embeddings=[data["embeddings"] for data in hpo_id_to_data.values()],
+        )
+
     # from hpoa but only 3233
     # @property
     # def disease_to_hps(self) -> Dict:
@@ -38,9 +77,16 @@ class DataProcessor:
     @property
     def disease_to_hps_from_omim(self) -> Dict:
         if self._disease_to_hps_from_omim is None:
-            file_path = "/Users/carlo/PycharmProjects/chroma_db_playground/phenotype.hpoa"
-            data = OMIMHPOExtractor.read_data_from_file(file_path)
-            self._disease_to_hps_from_omim = OMIMHPOExtractor.extract_omim_hpo_mappings(data)
+            config = self.db_manager.config
+            file_path = config.get("hpoa_path") or "/Users/carlo/PycharmProjects/chroma_db_playground/phenotype.hpoa"
+            self._disease_to_hps_from_omim = OMIMHPOExtractor.load_omim_hpo_mappings(
+                file_path,
+                cache_dir=config.get("hpoa_cache_dir"),
+                database_prefixes=config.get("hpoa_database_prefixes"),
+                aspects=config.get("hpoa_aspects"),
+                exclude_not=bool(config.get("hpoa_exclude_not", False)),
+            )
+            print(f"Loaded HPO annotations for {len(self._disease_to_hps_from_omim)} diseases from {file_path}")
         return self._disease_to_hps_from_omim
 
     @staticmethod
@@ -95,17 +141,39 @@ class DataProcessor:
         return disease_to_hps_dict
 
     @staticmethod
-    def calculate_average_embedding(hps: list, embeddings_dict: Dict) -> np.ndarray:
+    def calculate_average_embedding(hps: list, embeddings_dict: Mapping) -> np.ndarray:
         """
         Calculates the average embedding for a given set of HPO IDs.
 
         :param hps: List of HPO IDs.
-        :param embeddings_dict: Dictionary mapping HPO IDs to their embeddings.
+        :param embeddings_dict: Dictionary or EmbeddingStore mapping HPO IDs to their embeddings.
         :return: A numpy array representing the average embedding for the HPO IDs.
         """
+        if isinstance(embeddings_dict, EmbeddingStore):
+            rows = embeddings_dict.rows(hps)
+            return rows.mean(axis=0) if len(rows) else []
         embeddings = [embeddings_dict[hp_id]["embeddings"] for hp_id in hps if hp_id in embeddings_dict]
         return np.mean(embeddings, axis=0) if embeddings else []
 
+    @staticmethod
+    def calculate_average_embeddings(hps_list: List[list], embeddings_dict: Mapping) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the average embedding for each set of HPO IDs and stacks them into one patient matrix.
+
+        :param hps_list: List of HPO ID lists, one per patient.
+        :param embeddings_dict: Dictionary mapping HPO IDs to their embeddings.
+        :return: Tuple of the float32 matrix of average embeddings for every patient with at least one known
+            HPO ID, and the indices into hps_list of those patients.
+        """
+        rows, valid_indices = [], []
+        for index, hps in enumerate(hps_list):
+            average_embedding = DataProcessor.calculate_average_embedding(hps, embeddings_dict)
+            if len(average_embedding) > 0:
+                rows.append(average_embedding)
+                valid_indices.append(index)
+        matrix = np.asarray(rows, dtype=np.float32) if rows else np.empty((0, 0), dtype=np.float32)
+        return matrix, np.asarray(valid_indices, dtype=np.int64)
+
     # deprecated cause using hpoa collection instead of .hpoa file now
     @staticmethod
     def extract_and_use_omim_hpo_mappings(file_path):
@@ -1,10 +1,13 @@
 import time
+from typing import List, Optional, Tuple
 
 import numpy as np
 from chromadb.types import Collection
 
 from pheval_exomiser.prepare.core.base_service import BaseService
 from pheval_exomiser.prepare.core.data_processor import DataProcessor
+from pheval_exomiser.prepare.core.embedding_store import EmbeddingStore
+from pheval_exomiser.prepare.utils.vector_ops import build_incidence, segment_means
 
 
 class DiseaseAvgEmbeddingService(BaseService):
@@ -14,6 +17,8 @@ class DiseaseAvgEmbeddingService(BaseService):
     contains disease and the average embeddings of the correlating hp terms
     """
 
+    STORE_NAME = "disease_avg"
+
     def __init__(self, data_processor: DataProcessor):
         super().__init__(data_processor)
         self.precomputed_embeddings = {}
@@ -28,37 +33,104 @@ class DiseaseAvgEmbeddingService(BaseService):
             print("Disease Avg Embeddings collection early return, cause already initialized!")
             return self.disease_new_avg_embeddings_collection
 
-        batch_size = 25
-        batch = []
-        embedding_calc_time = 0
-        upsert_time = 0
-
-        for disease, hps in self.disease_to_hps_from_omim.items():
-            start = time.time()
-            average_embedding = self.data_processor.calculate_average_embedding(hps, self.hp_embeddings)
-            embedding_calc_time += time.time() - start
-            batch.append((disease, average_embedding.tolist()))
-
-            if len(batch) >= batch_size:
-                start = time.time()
-                self.upsert_batch(batch)
-                upsert_time += time.time() - start
-                batch = []
+        start = time.time()
+        diseases, embeddings = self.compute_disease_embeddings()
+        embedding_calc_time = time.time() - start
 
-        if batch:
-            start = time.time()
-            self.upsert_batch(batch)
-            upsert_time += time.time() - start
+        start = time.time()
+        self.write_embeddings(diseases, embeddings)
+        upsert_time = time.time() - start
 
         print(f"Total time for embedding calculations (avg): {embedding_calc_time}s")
         print(f"Total time for upsert operations (avg): {upsert_time}s")
 
         return self.disease_avg_embeddings_collection
 
+    def sync_data(self) -> Collection:
+        """
+        Incrementally brings the disease average collection in line with the current annotations: only diseases
+        whose HPO terms were added or changed since the last run are recomputed and upserted, and diseases no longer
+        annotated are deleted. The embedding store, if configured, is patched with the same changes.
+        """
+        if not self.disease_to_hps_from_omim:
+            raise ValueError("disease to hps data is not initialized")
+        if not self.disease_avg_embeddings_collection:
+            raise ValueError("disease_avg_embeddings collection is not initialized")
+
+        start = time.time()
+        changed, removed = self.annotation_diff(self.disease_avg_embeddings_collection)
+        diseases, embeddings = self.compute_disease_embeddings(changed)
+        # changed diseases left without any embedded HPO term are dropped as well
+        removed += sorted(set(changed) - set(diseases))
+        self.upsert_embeddings(diseases, embeddings)
+        if removed:
+            self.disease_avg_embeddings_collection.delete(ids=removed)
+        self.update_store(diseases, embeddings, removed)
+
+        print(
+            f"Synced disease avg embeddings in {time.time() - start}s: "
+            f"{len(diseases)} upserted, {len(removed)} deleted"
+        )
+        return self.disease_avg_embeddings_collection
+
+    def compute_disease_embeddings(self, diseases: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        Averages the HPO embeddings of every disease in one pass. The disease to HPO mapping is turned into a sparse
+        disease x term incidence structure and every disease average is taken from the HPO embedding matrix with
+        segment means. Diseases without any embedded HPO term are skipped.
+
+        :param diseases: Diseases to compute, all annotated diseases if None.
+        :return: Tuple of the disease IDs and the float32 matrix of their average embeddings.
+        """
+        hp_index, hp_matrix = self.data_processor.hp_embedding_matrix
+        if diseases is None:
+            diseases = list(self.disease_to_hps_from_omim)
+        indptr, indices = build_incidence((self.disease_to_hps_from_omim[disease] for disease in diseases), hp_index)
+        embeddings = segment_means(hp_matrix, indptr, indices)
+        has_terms = np.diff(indptr) > 0
+        if not has_terms.all():
+            print(f"Skipping {int((~has_terms).sum())} diseases without embedded HPO terms")
+        return [disease for disease, keep in zip(diseases, has_terms) if keep], embeddings[has_terms]
+
+    def write_embeddings(self, diseases: List[str], embeddings: np.ndarray):
+        """
+        Upserts the disease embeddings and, if configured, writes them to the embedding store the ranking engine
+        is loaded from.
+        """
+        self.upsert_embeddings(diseases, embeddings)
+        store_path = self.data_processor.db_manager.config.get("embedding_store_path")
+        if store_path:
+            EmbeddingStore.build(store_path, self.STORE_NAME, diseases, embeddings)
+
+    def upsert_embeddings(self, diseases: List[str], embeddings: np.ndarray):
+        batch_size = min(5000, self.data_processor.db_manager.client.max_batch_size)
+        for start in range(0, len(diseases), batch_size):
+            stop = start + batch_size
+            self.upsert_batch(list(zip(diseases[start:stop], embeddings[start:stop].tolist())))
+
+    def update_store(self, diseases: List[str], embeddings: np.ndarray, removed: List[str]):
+        """
+        Patches the disease embedding store with upserted and removed diseases. A missing store is rebuilt from
+        the whole collection.
+        """
+        store_path = self.data_processor.db_manager.config.get("embedding_store_path")
+        if not store_path:
+            return
+        if EmbeddingStore.exists(store_path, self.STORE_NAME):
+            store = EmbeddingStore.load(store_path, self.STORE_NAME)
+            replaced = set(diseases) | set(removed)
+            kept = [disease for disease in store.ids if disease not in replaced]
+            ids = kept + list(diseases)
+            matrix = np.concatenate([store.rows(kept), np.asarray(embeddings, dtype=np.float32)])
+        else:
+            collection = self.disease_avg_embeddings_collection.get(include=["embeddings"])
+            ids, matrix = collection["ids"], collection["embeddings"]
+        EmbeddingStore.build(store_path, self.STORE_NAME, ids, matrix)
+
     def upsert_batch(self, batch):
         ids = [item[0] for item in batch]
         embeddings = [item[1] for item in batch]
-        metadatas = [{"type": "disease"}] * len(batch)
+        metadatas = [self.disease_metadata(disease) for disease in ids]
         self.disease_avg_embeddings_collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
 
     # def compute_clustered_embeddings(self, hpo_terms, hpo_clustering):
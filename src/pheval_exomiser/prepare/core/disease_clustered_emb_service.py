@@ -1,11 +1,14 @@
 import time
-from typing import List
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import numpy as np
 from chromadb.types import Collection
 
 from pheval_exomiser.prepare.core.base_service import BaseService
 from pheval_exomiser.prepare.core.data_processor import DataProcessor
+from pheval_exomiser.prepare.core.organ_system_scorer import OrganSystemScorer
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+from pheval_exomiser.prepare.utils.vector_ops import build_incidence, segment_means
 
 
 class DiseaseClusteredEmbeddingService(BaseService):
@@ -14,6 +17,8 @@ class DiseaseClusteredEmbeddingService(BaseService):
     by clustering HPO terms associated with each disease and then concatenating the average embeddings of each cluster.
     """
 
+    TERMS_WITHOUT_CLUSTER_FILE = "terms_without_cluster.txt"
+
     def __init__(self, data_processor: DataProcessor, hpo_clustering):
         super().__init__(data_processor)
         self.hpo_clustering = hpo_clustering
@@ -29,37 +34,78 @@ class DiseaseClusteredEmbeddingService(BaseService):
             print("Clustered Embeddings collection early return, cause already initialized!")
             return self.clustered_new_embeddings_collection
 
+        embedding_calc_time, upsert_time = self.upsert_diseases(self.disease_to_hps_from_omim)
+
+        print(f"Total time for embedding calculations (clustered): {embedding_calc_time}s")
+        print(f"Total time for upsert operations (clustered): {upsert_time}s")
+
+        return self.clustered_new_embeddings_collection
+
+    def sync_data(self) -> Collection:
+        """
+        Incrementally brings the clustered collection in line with the current annotations: only diseases whose
+        HPO terms were added or changed since the last run are recomputed and upserted, and diseases no longer
+        annotated are deleted.
+        """
+        if not self.disease_to_hps_from_omim:
+            raise ValueError("Disease to HPO data is not initialized")
+        if not self.clustered_new_embeddings_collection:
+            raise ValueError("Clustered embeddings collection is not initialized")
+
+        start = time.time()
+        changed, removed = self.annotation_diff(self.clustered_new_embeddings_collection)
+        self.upsert_diseases(changed)
+        if removed:
+            self.clustered_new_embeddings_collection.delete(ids=removed)
+
+        print(
+            f"Synced clustered embeddings in {time.time() - start}s: "
+            f"{len(changed)} upserted, {len(removed)} deleted"
+        )
+        return self.clustered_new_embeddings_collection
+
+    def upsert_diseases(self, diseases: Iterable[str], block_size: int = 256) -> Tuple[float, float]:
+        """
+        Computes and upserts the clustered embeddings of the given diseases, block_size diseases at a time.
+        HPO terms without an organ system are gathered over all diseases and logged once at the end.
+
+        :return: Tuple of the time spent computing embeddings and the time spent upserting.
+        """
         batch_size = 25
-        batch = []
+        diseases = list(diseases)
+        terms_without_cluster = set()
         embedding_calc_time = 0
         upsert_time = 0
 
-        for disease, hpo_terms in self.disease_to_hps_from_omim.items():
+        for block_start in range(0, len(diseases), block_size):
+            block = diseases[block_start:block_start + block_size]
             start = time.time()
-            clustered_embedding = self.compute_organ_embeddings(hpo_terms)
+            embeddings, block_terms_without_cluster = self.compute_organ_embedding_matrix(
+                [self.disease_to_hps_from_omim[disease] for disease in block]
+            )
+            terms_without_cluster |= block_terms_without_cluster
             embedding_calc_time += time.time() - start
-            batch.append((disease, clustered_embedding.tolist()))
-
-            if len(batch) >= batch_size:
-                start = time.time()
-                self.upsert_batch(batch)
-                upsert_time += time.time() - start
-                batch = []
 
-        if batch:
             start = time.time()
-            self.upsert_batch(batch)
+            for batch_start in range(0, len(block), batch_size):
+                batch_stop = batch_start + batch_size
+                self.upsert_batch(
+                    list(zip(block[batch_start:batch_stop], embeddings[batch_start:batch_stop].tolist()))
+                )
             upsert_time += time.time() - start
 
-        print(f"Total time for embedding calculations (clustered): {embedding_calc_time}s")
-        print(f"Total time for upsert operations (clustered): {upsert_time}s")
-
-        return self.clustered_new_embeddings_collection
+        if terms_without_cluster:
+            self.log_terms_without_cluster(sorted(terms_without_cluster))
+            print(
+                f"{len(terms_without_cluster)} HPO terms without an organ system cluster, "
+                f"see {self.TERMS_WITHOUT_CLUSTER_FILE}"
+            )
+        return embedding_calc_time, upsert_time
 
     def upsert_batch(self, batch):
         ids = [item[0] for item in batch]
         embeddings = [item[1] for item in batch]
-        metadatas = [{"type": "disease"}] * len(batch)
+        metadatas = [self.disease_metadata(disease) for disease in ids]
         self.clustered_new_embeddings_collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
 
     def compute_clustered_embeddings_per_hp_term(self, hpo_terms):
@@ -94,59 +140,105 @@ class DiseaseClusteredEmbeddingService(BaseService):
         return np.concatenate([emb for emb in concatenated_embedding if isinstance(emb, np.ndarray)])
 
 
-    def compute_organ_embeddings(self, hpo_terms: List[str] = None):
-
-        if hpo_terms is not None:
-            hpo_terms_source = [('Patient', hpo_terms)]
-        else:
-            hpo_terms_source = self.disease_to_hps.items()
-
-        # if hpo_terms is None:
-        #     raise ValueError("No HPO terms provided")
-
-        all_organ_systems = sorted(self.hpo_clustering.all_clusters)
-        embedding_size = 1536
-        terms_without_cluster = []
-
-        for disease, hpo_terms_for_disease in hpo_terms_source:
-            organ_system_embeddings = {organ: [] for organ in all_organ_systems}
-
-            for hpo_term in hpo_terms_for_disease:
+    @property
+    def organ_systems(self) -> List[str]:
+        return sorted(self.hpo_clustering.all_clusters)
+
+    def organ_segments(self, hpo_term_lists: Sequence[List[str]]) -> Tuple[np.ndarray, np.ndarray, Set[str]]:
+        """
+        Assigns every term to its primary organ system through the precomputed term to organ system map, which
+        splits each list into one segment per organ system, in sorted organ system order.
+
+        :param hpo_term_lists: One list of HPO terms per disease or patient.
+        :return: Tuple of the CSR (indptr, indices) into the HPO embedding matrix with one segment per list and
+            organ system, and the set of terms without an organ system.
+        """
+        hp_index, _ = self.data_processor.hp_embedding_matrix
+        organ_index = {organ_system: i for i, organ_system in enumerate(self.organ_systems)}
+        segments = []
+        terms_without_cluster = set()
+        for hpo_terms in hpo_term_lists:
+            organ_terms = [[] for _ in organ_index]
+            for hpo_term in hpo_terms:
                 organ_system = self.hpo_clustering.get_organ_system(hpo_term)
                 if organ_system is None:
-                    terms_without_cluster.append(hpo_term)
+                    terms_without_cluster.add(hpo_term)
                     continue
-
-                embedding = self.hp_embeddings.get(hpo_term)
-                if isinstance(embedding, dict) and 'embeddings' in embedding:
-                    embedding = np.array(embedding['embeddings'])
-                organ_system_embeddings[organ_system].append(embedding)
-
-            # Log HPO terms without an organ system cluster
-            if terms_without_cluster:
-                self.log_terms_without_cluster(terms_without_cluster)
-
-            concatenated_embeddings = []
-            for organ_system in all_organ_systems:
-                # organ_embeddings = organ_system_embeddings[organ_system]
-                # print(f"Organ System: {organ_system}, Embeddings: {organ_embeddings}")  # Debugging print
-                if organ_system_embeddings[organ_system]:
-                    average_embedding = np.mean(organ_system_embeddings[organ_system], axis=0)
-                else:
-                    average_embedding = -1 * np.ones(embedding_size) # just pull from organ system like HP:000707 and * -1
-                concatenated_embeddings.append(average_embedding)
-
-            final_embedding = np.concatenate(concatenated_embeddings)
-
-            expected_size = len(all_organ_systems) * embedding_size
-            if final_embedding.size != expected_size:
-                raise ValueError(
-                    f"The final embedding size is incorrect: {final_embedding.size}, expected: {expected_size}")
-
-            return final_embedding
+                organ_terms[organ_index[organ_system]].append(hpo_term)
+            segments.extend(organ_terms)
+        indptr, indices = build_incidence(segments, hp_index)
+        return indptr, indices, terms_without_cluster
+
+    def compute_organ_embedding_matrix(self, hpo_term_lists: Sequence[List[str]]) -> Tuple[np.ndarray, Set[str]]:
+        """
+        Computes the organ system embeddings of many HPO term lists in one pass: the lists are split into organ
+        system segments and all segment means are taken from the HPO embedding matrix at once. Organ systems
+        without an embedded term are filled with -1.
+
+        :param hpo_term_lists: One list of HPO terms per disease or patient.
+        :return: Tuple of the float32 matrix of shape (number of lists, number of organ systems x embedding size),
+            organ systems in sorted order, and the set of terms without an organ system.
+        """
+        _, hp_matrix = self.data_processor.hp_embedding_matrix
+        indptr, indices, terms_without_cluster = self.organ_segments(hpo_term_lists)
+        embeddings = segment_means(hp_matrix, indptr, indices, fill_value=-1.0)
+        return embeddings.reshape(len(hpo_term_lists), -1), terms_without_cluster
+
+    def compute_organ_means(self, hpo_term_lists: Sequence[List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the mean embedding of every organ system of many HPO term lists, without any filler.
+
+        :return: Tuple of the float32 means of shape (number of lists, number of organ systems, embedding size),
+            NaN for absent organ systems, and the boolean presence mask of shape (number of lists, organ systems).
+        """
+        _, hp_matrix = self.data_processor.hp_embedding_matrix
+        indptr, indices, _ = self.organ_segments(hpo_term_lists)
+        means = segment_means(hp_matrix, indptr, indices)
+        shape = (len(hpo_term_lists), len(self.organ_systems))
+        return means.reshape(*shape, -1), (np.diff(indptr) > 0).reshape(shape)
+
+    def patient_organ_embeddings(self, hpo_terms: List[str]) -> Dict[str, np.ndarray]:
+        """Mean embedding of a patient per organ system its HPO terms fall into."""
+        means, present = self.compute_organ_means([hpo_terms])
+        return {
+            organ_system: means[0, organ]
+            for organ, organ_system in enumerate(self.organ_systems)
+            if present[0, organ]
+        }
+
+    def build_organ_system_scorer(
+        self,
+        similarity_measure: SimilarityMeasures = SimilarityMeasures.COSINE,
+        weights: Optional[Dict[str, float]] = None,
+        block_size: int = 256,
+    ) -> OrganSystemScorer:
+        """
+        Builds the per organ system scorer of all annotated diseases, computing the organ system means block_size
+        diseases at a time and keeping only the organ systems each disease has.
+        """
+        diseases = sorted(self.disease_to_hps_from_omim)
+        blocks = (
+            self.compute_organ_means(
+                [self.disease_to_hps_from_omim[disease] for disease in diseases[start:start + block_size]]
+            )
+            for start in range(0, len(diseases), block_size)
+        )
+        scorer = OrganSystemScorer.from_blocks(diseases, self.organ_systems, blocks, similarity_measure, weights)
+        print(
+            f"Organ system scorer holds {scorer.stored_vectors} organ vectors for {len(scorer)} diseases "
+            f"instead of {len(scorer) * len(self.organ_systems)}"
+        )
+        return scorer
+
+    def compute_organ_embeddings(self, hpo_terms: List[str] = None) -> np.ndarray:
+        """Computes the organ system embedding of a single HPO term list, e.g. of a patient."""
+        if hpo_terms is None:
+            raise ValueError("No HPO terms provided")
+        embeddings, _ = self.compute_organ_embedding_matrix([hpo_terms])
+        return embeddings[0]
 
     def log_terms_without_cluster(self, terms):
-        with open('terms_without_cluster.txt', 'w') as log_file:
+        with open(self.TERMS_WITHOUT_CLUSTER_FILE, 'w') as log_file:
             for term in terms:
                 log_file.write(f"{term}\n")
 
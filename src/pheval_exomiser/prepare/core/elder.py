@@ -1,23 +1,46 @@
 # pheval_exomiser.py
 
+from typing import Iterator, List
+
 from pheval_exomiser.prepare.core.chromadb_manager import ChromaDBManager
 from pheval_exomiser.prepare.core.data_processor import DataProcessor
 from pheval_exomiser.prepare.core.disease_avg_embedding_service import DiseaseAvgEmbeddingService
 from pheval_exomiser.prepare.core.disease_clustered_emb_service import DiseaseClusteredEmbeddingService
+from pheval_exomiser.prepare.core.embedding_store import EmbeddingStore
 from pheval_exomiser.prepare.core.hp_embedding_service import HPEmbeddingService
-from pheval_exomiser.prepare.core.hpo_clustering import HPOClustering
+from pheval_exomiser.prepare.core.hpo_clustering import DEFAULT_HPO_URL, HPOClustering
+from pheval_exomiser.prepare.core.organ_system_scorer import OrganSystemScorer
+from pheval_exomiser.prepare.core.patient_query_cache import PatientQueryCache
 from pheval_exomiser.prepare.core.query_service import QueryService
+from pheval_exomiser.prepare.core.ranking_engine import RankingEngine
 from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
 
 
 class ElderRunner:
-    def __init__(self, similarity_measure=SimilarityMeasures.COSINE):
+    def __init__(
+        self,
+        similarity_measure=SimilarityMeasures.COSINE,
+        use_ranking_engine: bool = True,
+        use_organ_system_scorer: bool = False,
+    ):
+        self.similarity_measure = similarity_measure
+        self.use_ranking_engine = use_ranking_engine
+        self.use_organ_system_scorer = use_organ_system_scorer
+        self._ranking_engine = None
+        self._organ_system_scorer = None
         self.db_manager = ChromaDBManager(similarity=similarity_measure)
         self.data_processor = DataProcessor(self.db_manager)
         self.hp_service = HPEmbeddingService(self.data_processor)
         self.disease_service = DiseaseAvgEmbeddingService(self.data_processor)
-        self.hpo_clustering = HPOClustering()
+        config = self.db_manager.config
+        self.hpo_clustering = HPOClustering(
+            url=config.get("hpo_ontology_url") or DEFAULT_HPO_URL,
+            cache_dir=config.get("ontology_cache_dir"),
+            local_path=config.get("hpo_ontology_path"),
+        )
         self.disease_organ_service = DiseaseClusteredEmbeddingService(self.data_processor, hpo_clustering=self.hpo_clustering)
+        query_cache_size = config.get("query_cache_size")
+        self.query_cache = PatientQueryCache(64 if query_cache_size is None else query_cache_size)
 
     def initialize_data(self):
         _ = self.data_processor.hp_embeddings
@@ -29,11 +52,113 @@ class ElderRunner:
         self.disease_service.process_data()
         self.disease_organ_service.process_data()
 
-    def run_analysis(self, input_hpos):  # sim strategy can be going in later
-        query_service = QueryService(
+    def sync_collections(self):
+        """Incrementally update the disease collections after the phenotype.hpoa annotations changed."""
+        self.disease_service.sync_data()
+        self.disease_organ_service.sync_data()
+        self._ranking_engine = None
+        self._organ_system_scorer = None
+        self.query_cache.clear()
+
+    @property
+    def ranking_engine(self) -> RankingEngine:
+        if self._ranking_engine is None:
+            config = self.db_manager.config
+            store_path = config.get("embedding_store_path")
+            quantization = config.get("ranking_quantization")
+            rerank_k = config.get("ranking_rerank_k") or 100
+            store_exists = store_path and EmbeddingStore.exists(store_path, DiseaseAvgEmbeddingService.STORE_NAME)
+            if store_path and quantization and not store_exists:
+                # a quantized engine re-ranks from the memory-mapped store, so write it from the collection once
+                self.disease_service.update_store([], [], [])
+                store_exists = True
+            if store_exists:
+                store = EmbeddingStore.load(store_path, DiseaseAvgEmbeddingService.STORE_NAME)
+                self._ranking_engine = RankingEngine(
+                    store.ids, store.matrix, self.similarity_measure, quantization, rerank_k
+                )
+            else:
+                self._ranking_engine = RankingEngine.from_collection(
+                    self.disease_service.disease_avg_embeddings_collection,
+                    self.similarity_measure,
+                    quantization,
+                    rerank_k,
+                )
+        return self._ranking_engine
+
+    @property
+    def organ_system_scorer(self) -> OrganSystemScorer:
+        if self._organ_system_scorer is None:
+            self._organ_system_scorer = self.disease_organ_service.build_organ_system_scorer(
+                self.similarity_measure, weights=self.db_manager.config.get("organ_system_weights")
+            )
+        return self._organ_system_scorer
+
+    def _query_service(self) -> QueryService:
+        return QueryService(
             data_processor=self.data_processor,
             db_manager=self.db_manager,
             disease_service=self.disease_service,
-            disease_organ_service=self.disease_organ_service
+            disease_organ_service=self.disease_organ_service,
+            ranking_engine=self.ranking_engine if self.use_ranking_engine else None,
+            organ_system_scorer=self.organ_system_scorer if self.use_organ_system_scorer else None,
+        )
+
+    def run_analysis(self, input_hpos):  # sim strategy can be going in later
+        """
+        Ranks all diseases against the average embedding of the HPO terms, answering repeated term sets from the
+        cache.
+        """
+        key = self.query_cache.key(input_hpos, "average", self.similarity_measure)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached.ranking
+        query_service = self._query_service()
+        embedding = query_service.patient_average_embedding(self.query_cache.canonical_terms(input_hpos))
+        return self.query_cache.put(key, embedding, query_service.rank_average_embedding(embedding)).ranking
+
+    def run_analysis_batch(self, list_of_hpo_lists: List[List[str]], block_size: int = 256) -> Iterator[list]:
+        """
+        Ranks all diseases for every HPO term list, yielding one ranking per list in input order.
+        Term sets already in the query cache are not scored again, nor are repeats within the batch; the others are
+        scored block-wise by the ranking engine. Falls back to one Chroma query per list when the ranking engine is
+        disabled.
+        """
+        if not self.use_ranking_engine:
+            return (self.run_analysis(input_hpos) for input_hpos in list_of_hpo_lists)
+        return self._run_analysis_batch(list_of_hpo_lists, block_size)
+
+    def _run_analysis_batch(self, list_of_hpo_lists: List[List[str]], block_size: int) -> Iterator[list]:
+        term_sets = [self.query_cache.canonical_terms(input_hpos) for input_hpos in list_of_hpo_lists]
+        keys = [self.query_cache.key(terms, "average", self.similarity_measure) for terms in term_sets]
+        # first occurrence of every term set that is not cached yet, scored together in one pass
+        first_occurrences = {}
+        for index, key in enumerate(keys):
+            if key not in self.query_cache and key not in first_occurrences:
+                first_occurrences[key] = index
+        query_service = self._query_service()
+        patient_matrix, valid_indices = self.data_processor.calculate_average_embeddings(
+            [term_sets[index] for index in first_occurrences.values()], self.data_processor.hp_embeddings
+        )
+        embeddings = dict(zip(valid_indices.tolist(), patient_matrix))
+        unembedded = {key for position, key in enumerate(first_occurrences) if position not in embeddings}
+        rankings = query_service.rank_average_embeddings_batch(
+            patient_matrix, valid_indices, len(first_occurrences), block_size=block_size
         )
-        return query_service.query_diseases_by_hpo_terms_using_inbuild_distance_functions(input_hpos)
+        position = 0
+        for index, key in enumerate(keys):
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                yield cached.ranking
+            elif first_occurrences.get(key) == index:
+                ranking = next(rankings)
+                if position in embeddings:
+                    self.query_cache.put(key, embeddings[position], ranking)
+                position += 1
+                yield ranking
+            elif key in unembedded:
+                yield []
+            else:
+                # evicted since it was scored earlier in this batch
+                embedding = query_service.patient_average_embedding(term_sets[index])
+                yield self.query_cache.put(key, embedding, query_service.rank_average_embedding(embedding)).ranking
@@ -0,0 +1,120 @@
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+"""
+    On-disk embedding store: a float32 .npy matrix plus a newline separated ID file giving the row of every ID.
+    The matrix is memory-mapped on load, so opening a store is cheap and rows are read zero-copy.
+"""
+
+
+class EmbeddingStore(Mapping):
+    """
+    Read-only mapping from IDs to embedding rows backed by a memory-mapped matrix. Items are returned as
+    {"embeddings": row} so the store is a drop-in replacement for the dict built by
+    DataProcessor.create_hpo_id_to_embedding.
+    """
+
+    MATRIX_SUFFIX = ".npy"
+    IDS_SUFFIX = ".ids.txt"
+
+    def __init__(self, ids: Sequence[str], matrix: np.ndarray):
+        if len(ids) != len(matrix):
+            raise ValueError(f"Got {len(ids)} IDs for {len(matrix)} embeddings")
+        self.ids = list(ids)
+        self.matrix = matrix
+        self._index = None
+
+    @classmethod
+    def paths(cls, directory: str, name: str) -> (str, str):
+        return (
+            os.path.join(directory, name + cls.MATRIX_SUFFIX),
+            os.path.join(directory, name + cls.IDS_SUFFIX),
+        )
+
+    @classmethod
+    def exists(cls, directory: str, name: str) -> bool:
+        return all(os.path.exists(path) for path in cls.paths(directory, name))
+
+    @classmethod
+    def build(cls, directory: str, name: str, ids: Sequence[str], embeddings) -> "EmbeddingStore":
+        """
+        Write IDs and embeddings to disk and return the memory-mapped store.
+        Files are written under a temporary name and moved into place, so a store is never seen half-written.
+
+        :param directory: Directory holding the store files.
+        :param name: Store name, used as file stem.
+        :param ids: One ID per embedding row.
+        :param embeddings: Array-like of shape (len(ids), dimension).
+        :return: The freshly written EmbeddingStore.
+        """
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError(f"Expected {len(ids)} embedding rows, got matrix of shape {matrix.shape}")
+        if any("\n" in item for item in ids):
+            raise ValueError("IDs must not contain newlines")
+        os.makedirs(directory, exist_ok=True)
+        matrix_path, ids_path = cls.paths(directory, name)
+        with open(matrix_path + ".tmp", "wb") as matrix_file:
+            np.save(matrix_file, matrix)
+        with open(ids_path + ".tmp", "w") as ids_file:
+            ids_file.write("\n".join(ids))
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(ids_path + ".tmp", ids_path)
+        return cls.load(directory, name)
+
+    @classmethod
+    def load(cls, directory: str, name: str, mmap: bool = True) -> "EmbeddingStore":
+        """
+        Open a store written by EmbeddingStore.build.
+
+        :param directory: Directory holding the store files.
+        :param name: Store name, used as file stem.
+        :param mmap: Memory-map the matrix read-only instead of reading it into memory.
+        :return: EmbeddingStore
+        """
+        matrix_path, ids_path = cls.paths(directory, name)
+        with open(ids_path) as ids_file:
+            content = ids_file.read()
+        ids = content.split("\n") if content else []
+        return cls(ids, np.load(matrix_path, mmap_mode="r" if mmap else None))
+
+    @property
+    def index(self) -> Dict[str, int]:
+        if self._index is None:
+            self._index = {item: row for row, item in enumerate(self.ids)}
+        return self._index
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    def vector(self, key: str) -> np.ndarray:
+        return self.matrix[self.index[key]]
+
+    def rows(self, keys: Sequence[str]) -> np.ndarray:
+        """
+        Gather the embeddings of all known keys into one matrix, skipping unknown ones.
+
+        :param keys: IDs to look up.
+        :return: float32 array of shape (n_known_keys, dimension).
+        """
+        return self.matrix[self.row_indices(keys)]
+
+    def row_indices(self, keys: Sequence[str]) -> List[int]:
+        index = self.index
+        return [index[key] for key in keys if key in index]
+
+    def __getitem__(self, key: str) -> Dict[str, np.ndarray]:
+        return {"embeddings": self.vector(key)}
+
+    def __contains__(self, key) -> bool:
+        return key in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
@@ -1,62 +1,179 @@
-import networkx
-from tqdm import tqdm
 import pandas as pd
 import tarfile
 import tempfile
 import networkx as nx
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import wget
 import os
 import requests
 import logging
 
+from pheval_exomiser.prepare.core.closure_index import ClosureIndex
+from pheval_exomiser.prepare.core.ontology_cache import OntologyCache
+
 # Set up logging to file
 logging.basicConfig(filename='missing_hpo_terms.log', level=logging.INFO,
                     format='%(asctime)s %(levelname)s:%(message)s')
 
 
+DEFAULT_HPO_URL = "https://kg-hub.berkeleybop.io/kg-obo/hp/2023-04-05/hp_kgx_tsv.tar.gz"
+
+
 class HPOClustering:
-    def __init__(self):
-        self.closures, self.graph = self.make_hpo_closures_and_graph()
+    def __init__(self, url: str = DEFAULT_HPO_URL, cache_dir: Optional[str] = None, local_path: Optional[str] = None):
+        """
+        :param url: kg-hub URL of the HPO KGX tsv archive.
+        :param cache_dir: Directory of the local ontology cache. Without it the ontology is downloaded and parsed
+            on every construction.
+        :param local_path: Local KGX tsv archive or edges file to use instead of downloading from url.
+        """
+        self.url = url
+        self.cache_dir = cache_dir
+        self.local_path = local_path
+        self.cache = None
+        self.closures, self.graph = self.make_hpo_closures_and_graph(url=url)
         self.phenotypic_abnormality_id = 'HP:0000118'
         self.all_clusters = self.get_organ_systems(self.graph, root_node='HP:0000118')
-
-    def get_organ_system(self, term_id):
-        try:
-            return self._find_highest_parent(self.graph, term_id)
-        except networkx.exception.NetworkXError:
-            # logging.info(f"The node {term_id} is not in the digraph.")
-            return None
+        self.organ_system_map = self.load_organ_system_map()
+
+    def get_organ_system(self, term_id) -> Optional[str]:
+        """
+        Returns the primary organ system of an HPO term, i.e. the top-level phenotypic abnormality it descends from.
+        For terms under several organ systems this is the one with the fewest ancestors, ties broken by ID.
+        """
+        organ_systems = self.organ_system_map.get(term_id)
+        return organ_systems[0] if organ_systems else None
+
+    def get_term_organ_systems(self, term_id) -> Tuple[str, ...]:
+        """Returns every organ system an HPO term descends from, primary organ system first."""
+        return self.organ_system_map.get(term_id, ())
+
+    def load_organ_system_map(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        Loads the term to organ system map from the ontology cache, computing and caching it if missing.
+        Without a cache the map is computed in memory only.
+        """
+        organ_system_map = self.cache.load_organ_systems() if self.cache is not None else None
+        if organ_system_map is None:
+            organ_system_map = self.compute_organ_system_map(self.graph, self.phenotypic_abnormality_id)
+            if self.cache is not None:
+                self.cache.save_organ_systems(organ_system_map)
+        return organ_system_map
+
+    @staticmethod
+    def compute_organ_system_map(graph: nx.DiGraph, root_node: str) -> Dict[str, Tuple[str, ...]]:
+        """
+        Maps every descendant of root_node to the organ systems (direct children of root_node) it descends from,
+        with a single pass over the subgraph in topological order: a term inherits the organ systems of all its
+        parents, and passes itself on to its children if it is an organ system. As in the former
+        _find_highest_parent, an organ system has no organ system of its own unless it descends from another one,
+        so organ systems, root_node and terms outside root_node are left out of the map.
+
+        :param graph: HPO graph with edges pointing from parent to child.
+        :param root_node: Phenotypic abnormality term whose children are the organ systems.
+        :return: Dictionary of term ID to tuple of organ systems, primary organ system first.
+        """
+        organ_systems = set(graph.successors(root_node))
+        subgraph = graph.subgraph(nx.descendants(graph, root_node) | {root_node})
+        term_organ_systems = {}
+        passed_on = {root_node: frozenset()}
+        for node in nx.topological_sort(subgraph):
+            if node == root_node:
+                continue
+            inherited = set()
+            for parent in subgraph.predecessors(node):
+                inherited.update(passed_on[parent])
+            if inherited:
+                term_organ_systems[node] = inherited
+            passed_on[node] = frozenset(inherited | {node}) if node in organ_systems else frozenset(inherited)
+
+        depth = {organ: len(nx.ancestors(graph, organ)) for organ in organ_systems}
+        return {
+            term: tuple(sorted(organs, key=lambda organ: (depth[organ], organ)))
+            for term, organs in term_organ_systems.items()
+        }
 
     def make_hpo_closures_and_graph(
             self,
-            url="https://kg-hub.berkeleybop.io/kg-obo/hp/2023-04-05/hp_kgx_tsv.tar.gz",
+            url=DEFAULT_HPO_URL,
             pred_col="predicate",
             subject_prefixes=["HP:"],
             object_prefixes=["HP:"],
             predicates=["biolink:subclass_of"],
-            root_node_to_use="HP:0000118",
             include_self_in_closure=False,
-    ) -> (List[Tuple], nx.DiGraph):
-        tmpdir = tempfile.TemporaryDirectory()
-        tmpfile = tempfile.NamedTemporaryFile().file.name
-        wget.download(url, tmpfile)
+    ) -> (ClosureIndex, nx.DiGraph):
+        if self.cache_dir is not None:
+            options = {
+                "pred_col": pred_col,
+                "subject_prefixes": subject_prefixes,
+                "object_prefixes": object_prefixes,
+                "predicates": predicates,
+                "include_self_in_closure": include_self_in_closure,
+            }
+            self.cache = OntologyCache(self.cache_dir, url=url, local_path=self.local_path, options=options)
+
+        if self.cache is not None and self.cache.has_graph():
+            edges = self.cache.load_graph()
+        else:
+            edges = self.read_hpo_edges(
+                url, pred_col, subject_prefixes, object_prefixes, predicates, local_path=self.local_path
+            )
+            if self.cache is not None:
+                self.cache.save_graph(edges)
+
+        # Create a directed graph using NetworkX
+        graph = nx.DiGraph(edges)
 
-        this_tar = tarfile.open(tmpfile, "r:gz")
-        this_tar.extractall(path=tmpdir.name)
+        if self.cache is not None and self.cache.has_closures():
+            return self.cache.load_closures(), graph
 
-        edge_files = [f for f in os.listdir(tmpdir.name) if "edges" in f]
-        if len(edge_files) != 1:
-            raise RuntimeError(
-                "Didn't find exactly one edge file in {}".format(tmpdir.name)
-            )
-        edge_file = edge_files[0]
+        closures = ClosureIndex.from_graph(graph, include_self=include_self_in_closure)
+
+        if self.cache is not None:
+            self.cache.save_closures(closures)
+
+        return closures, graph
 
-        edges_df = pd.read_csv(os.path.join(tmpdir.name, edge_file), sep="\t")
+    @staticmethod
+    def read_hpo_edges(
+            url,
+            pred_col,
+            subject_prefixes,
+            object_prefixes,
+            predicates,
+            local_path: Optional[str] = None,
+    ) -> List[Tuple[str, str]]:
+        """
+        Reads the subclass edges of the HPO from a KGX tsv archive, downloaded from url unless a local archive or
+        edges file is given.
+
+        :return: List of (parent, child) tuples.
+        """
+        tmpdir = tempfile.TemporaryDirectory()
+        if local_path is not None and not tarfile.is_tarfile(local_path):
+            edge_path = local_path
+        else:
+            if local_path is None:
+                archive = tempfile.NamedTemporaryFile().file.name
+                wget.download(url, archive)
+            else:
+                archive = local_path
+
+            this_tar = tarfile.open(archive, "r:gz")
+            this_tar.extractall(path=tmpdir.name)
+
+            edge_files = [f for f in os.listdir(tmpdir.name) if "edges" in f]
+            if len(edge_files) != 1:
+                raise RuntimeError(
+                    "Didn't find exactly one edge file in {}".format(tmpdir.name)
+                )
+            edge_path = os.path.join(tmpdir.name, edge_files[0])
+
+        edges_df = pd.read_csv(edge_path, sep="\t")
         if pred_col not in edges_df.columns:
             raise RuntimeError(
                 "Didn't find predicate column {} in {} cols: {}".format(
-                    pred_col, edge_file, "\n".join(edges_df.columns)
+                    pred_col, edge_path, "\n".join(edges_df.columns)
                 )
             )
 
@@ -69,62 +186,7 @@ class HPOClustering:
         # make into list of tuples
         # note that we are swapping order of edges (object -> subject) so that descendants are leaf terms
         # and ancestors are root nodes (assuming edges are subclass_of edges)
-        edges = list(edges_df[["object", "subject"]].itertuples(index=False, name=None))
-
-        # Create a directed graph using NetworkX
-        graph = nx.DiGraph(edges)
-
-        # Create a subgraph from the descendants of phenotypic_abnormality
-        descendants = nx.descendants(graph, root_node_to_use)
-        pa_subgraph = graph.subgraph(descendants)
-
-        def compute_closure(node):
-            return set(nx.ancestors(graph, node))
-
-        closures = []
-
-        for node in tqdm(pa_subgraph.nodes(), desc="Computing closures"):
-            if include_self_in_closure:
-                closures.append((node, "dummy_predicate", node))
-            for anc in compute_closure(node):
-                closures.append((node, "dummy_predicate", anc))
-
-        return closures, graph
-
-    def _find_highest_parent(self, graph, term_id):
-        highest_term = None
-        ancestors = nx.ancestors(graph, term_id)
-        ancestors.discard(self.phenotypic_abnormality_id)
-
-        for ancestor in ancestors:
-            if self.phenotypic_abnormality_id in nx.ancestors(graph, ancestor):
-                if highest_term is None or len(nx.ancestors(graph, ancestor)) < len(nx.ancestors(graph, highest_term)):
-                    highest_term = ancestor
-
-        return highest_term
-
-        #   PA
-        #  /  \
-        # A    B
-        # |    |
-        # C    D
-        # |
-        # E
-        #
-
-    # PA represents "Phenotypic abnormality"
-    # A, B, C, D, and E are other terms in the graph.
-    # Now, let's apply _find_highest_parent to the term E.
-    #
-    # Ancestors of E: We get {C, A, PA} as the ancestors of E.
-    # Discard PA: Now the set becomes {C, A}.
-    # Iterate Over Ancestors: We check C and A. Both have PA in their ancestors.
-    # Ancestors of C are {A, PA}, and ancestors of A are {PA}.
-    # Find Closest: A is closer to PA as it has fewer ancestors. So, A is returned as the highest parent of E.
-
-    # In this method, the initial removal of PA from the set of ancestors is to avoid directly returning PA as
-    # the highest parent (as it's presumably a generic or root term).
-    # The subsequent checks ensure that we only consider ancestors that eventually lead to PA.
+        return list(edges_df[["object", "subject"]].itertuples(index=False, name=None))
 
     def get_organ_systems(self, graph, root_node):
         organ_systems = list(graph.successors(root_node))
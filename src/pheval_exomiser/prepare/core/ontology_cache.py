@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.closure_index import ClosureIndex
+
+"""
+    Content-addressed local cache for the parsed HPO ontology.
+    Every ontology source (a download URL or the content of a local file) gets its own directory holding the
+    integer coded edge list of the graph, the ancestor closures and the organ system map, so a second start
+    neither touches the network nor recomputes closures.
+"""
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class OntologyCache:
+    TERMS_FILE = "terms.txt"
+    EDGES_FILE = "edges.npy"
+    CLOSURES_FILE = "closure_index.npz"
+    ORGAN_SYSTEMS_FILE = "organ_systems_v2.json"
+    SOURCE_FILE = "source.json"
+
+    def __init__(
+        self, cache_dir: str, url: Optional[str] = None, local_path: Optional[str] = None, options: Dict = None
+    ):
+        """
+        :param cache_dir: Root directory of the cache.
+        :param url: URL the ontology is downloaded from.
+        :param local_path: Local ontology file, used instead of the URL if given.
+        :param options: Parsing options that change the cached content, made part of the cache key.
+        """
+        if url is None and local_path is None:
+            raise ValueError("Either an ontology URL or a local ontology file is required")
+        self.url = url
+        self.local_path = local_path
+        source = f"file:{file_digest(local_path)}" if local_path else f"url:{url}"
+        options = json.dumps(options or {}, sort_keys=True)
+        self.key = hashlib.sha256(f"{source}|{options}".encode()).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, self.key)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _replace(self, name: str, write):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._file(name) + ".tmp"
+        with open(tmp_path, "wb") as file:
+            write(file)
+        os.replace(tmp_path, self._file(name))
+
+    def has_graph(self) -> bool:
+        return os.path.exists(self._file(self.TERMS_FILE)) and os.path.exists(self._file(self.EDGES_FILE))
+
+    def save_graph(self, edges: List[Tuple[str, str]]):
+        """
+        Save the parent -> child edge list with integer coded term IDs.
+
+        :param edges: List of (parent, child) term ID tuples.
+        """
+        terms = sorted({term for edge in edges for term in edge})
+        index = {term: i for i, term in enumerate(terms)}
+        coded = np.asarray([(index[parent], index[child]) for parent, child in edges], dtype=np.int32)
+        self._replace(self.EDGES_FILE, lambda file: np.save(file, coded.reshape(-1, 2)))
+        self._replace(self.TERMS_FILE, lambda file: file.write("\n".join(terms).encode()))
+        self._replace(
+            self.SOURCE_FILE,
+            lambda file: file.write(json.dumps({"url": self.url, "local_path": self.local_path}).encode()),
+        )
+
+    def load_terms(self) -> List[str]:
+        with open(self._file(self.TERMS_FILE)) as terms_file:
+            return terms_file.read().split("\n")
+
+    def load_graph(self) -> List[Tuple[str, str]]:
+        """Load the parent -> child edge list saved by save_graph."""
+        terms = self.load_terms()
+        return [(terms[parent], terms[child]) for parent, child in np.load(self._file(self.EDGES_FILE)).tolist()]
+
+    def has_closures(self) -> bool:
+        return os.path.exists(self._file(self.CLOSURES_FILE))
+
+    def save_closures(self, closures: ClosureIndex):
+        self._replace(self.CLOSURES_FILE, closures.save)
+
+    def load_closures(self) -> ClosureIndex:
+        return ClosureIndex.load(self._file(self.CLOSURES_FILE))
+
+    def load_organ_systems(self) -> Optional[Dict[str, Tuple[str, ...]]]:
+        if not os.path.exists(self._file(self.ORGAN_SYSTEMS_FILE)):
+            return None
+        with open(self._file(self.ORGAN_SYSTEMS_FILE)) as map_file:
+            return {term: tuple(organs) for term, organs in json.load(map_file).items()}
+
+    def save_organ_systems(self, organ_system_map: Dict[str, Tuple[str, ...]]):
+        self._replace(self.ORGAN_SYSTEMS_FILE, lambda file: file.write(json.dumps(organ_system_map).encode()))
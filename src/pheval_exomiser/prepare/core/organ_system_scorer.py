@@ -0,0 +1,151 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.ranking_engine import rank_distances
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+"""
+    Per organ system scoring of diseases. Instead of one concatenated vector with a -1 filler for every absent
+    organ system, a disease keeps one mean HPO embedding per organ system it actually has. A patient is compared
+    organ system by organ system, only on the organ systems its own HPO terms fall into, and the per organ
+    distances are combined as a weighted mean.
+"""
+
+
+class OrganSystemScorer:
+    """
+    Ranks diseases by the weighted mean over the patient's organ systems of the per organ distance, with the
+    distance conventions of RankingEngine. An organ system a disease does not have counts as a zero vector:
+        cosine -> 1
+        l2     -> squared norm of the patient organ embedding
+        ip     -> 1
+    Weights default to 1 for every organ system. Disease IDs are sorted on construction so ties are deterministic.
+    """
+
+    def __init__(
+        self,
+        disease_ids: Sequence[str],
+        organ_tables: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        similarity_measure: SimilarityMeasures = SimilarityMeasures.COSINE,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        """
+        :param disease_ids: Disease IDs, the rows of the organ tables index into this sequence.
+        :param organ_tables: Organ system to (disease rows, float32 matrix of their mean embeddings in that
+            organ system). Only diseases with the organ system are listed.
+        :param similarity_measure: Distance function used per organ system.
+        :param weights: Optional weight per organ system.
+        """
+        if len(disease_ids) == 0:
+            raise ValueError("Cannot build an organ system scorer without diseases")
+        ids = np.asarray(disease_ids, dtype=str)
+        order = np.argsort(ids, kind="stable")
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        self.disease_ids = ids[order]
+        self.similarity_measure = similarity_measure
+        self.weights = weights or {}
+        self.organ_tables = {}
+        self._squared_norms = {}
+        for organ_system, (rows, matrix) in organ_tables.items():
+            # a copy, so normalising never touches the caller's array
+            matrix = np.array(matrix, dtype=np.float32, order="C", copy=True)
+            if similarity_measure == SimilarityMeasures.COSINE:
+                matrix /= self._safe_norms(matrix)[:, None]
+            elif similarity_measure == SimilarityMeasures.L2:
+                self._squared_norms[organ_system] = np.einsum("ij,ij->i", matrix, matrix)
+            self.organ_tables[organ_system] = (position[np.asarray(rows, dtype=np.int64)], matrix)
+
+    @classmethod
+    def from_blocks(
+        cls,
+        disease_ids: Sequence[str],
+        organ_systems: Sequence[str],
+        blocks: Iterable[Tuple[np.ndarray, np.ndarray]],
+        similarity_measure: SimilarityMeasures = SimilarityMeasures.COSINE,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> "OrganSystemScorer":
+        """
+        Build a scorer from blocks of organ system means, keeping only the organ systems present per disease.
+
+        :param disease_ids: Disease IDs, in the order the blocks cover them.
+        :param organ_systems: Organ systems, the second axis of every block.
+        :param blocks: Tuples of the means of shape (block diseases, organ systems, dimension) and the boolean
+            presence mask of shape (block diseases, organ systems).
+        """
+        rows = {organ_system: [] for organ_system in organ_systems}
+        matrices = {organ_system: [] for organ_system in organ_systems}
+        offset = 0
+        for means, present in blocks:
+            for organ, organ_system in enumerate(organ_systems):
+                block_rows = np.flatnonzero(present[:, organ])
+                rows[organ_system].append(block_rows + offset)
+                matrices[organ_system].append(means[block_rows, organ])
+            offset += len(present)
+        organ_tables = {
+            organ_system: (np.concatenate(rows[organ_system]), np.concatenate(matrices[organ_system]))
+            for organ_system in organ_systems
+            if sum(len(block_rows) for block_rows in rows[organ_system])
+        }
+        return cls(disease_ids, organ_tables, similarity_measure, weights)
+
+    def __len__(self) -> int:
+        return len(self.disease_ids)
+
+    @property
+    def stored_vectors(self) -> int:
+        """Number of stored (disease, organ system) vectors."""
+        return sum(len(rows) for rows, _ in self.organ_tables.values())
+
+    @staticmethod
+    def _safe_norms(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1)
+        return np.where(norms == 0, 1, norms).astype(np.float32)
+
+    def _absent_distance(self, query: np.ndarray) -> float:
+        return float(query @ query) if self.similarity_measure == SimilarityMeasures.L2 else 1.0
+
+    def _organ_distances(self, organ_system: str, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the diseases with the organ system and their distances to the patient organ embedding."""
+        rows, matrix = self.organ_tables[organ_system]
+        scores = matrix @ query
+        if self.similarity_measure == SimilarityMeasures.COSINE:
+            return rows, 1 - scores / self._safe_norms(query)
+        if self.similarity_measure == SimilarityMeasures.L2:
+            return rows, np.maximum(self._squared_norms[organ_system] + float(query @ query) - 2 * scores, 0)
+        return rows, 1 - scores
+
+    def distances(self, organ_embeddings: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Calculates the distance of a patient to every disease. Only the organ systems of the patient are scored.
+
+        :param organ_embeddings: Mean embedding of the patient per organ system it has.
+        :return: float32 array of distances, aligned with self.disease_ids.
+        """
+        if not organ_embeddings:
+            raise ValueError("No HPO terms with an organ system and an embedding provided")
+        distances = np.zeros(len(self.disease_ids), dtype=np.float32)
+        total_weight = 0.0
+        for organ_system, embedding in organ_embeddings.items():
+            weight = self.weights.get(organ_system, 1.0)
+            total_weight += weight
+            query = np.asarray(embedding, dtype=np.float32)
+            absent_distance = self._absent_distance(query)
+            distances += weight * absent_distance
+            if organ_system in self.organ_tables:
+                rows, organ_distances = self._organ_distances(organ_system, query)
+                distances[rows] += weight * (organ_distances - absent_distance)
+        if total_weight == 0:
+            raise ValueError("The patient's organ systems all have weight 0")
+        return distances / total_weight
+
+    def rank(self, organ_embeddings: Dict[str, np.ndarray], n_results: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Ranks diseases by ascending weighted organ system distance to the patient.
+
+        :param organ_embeddings: Mean embedding of the patient per organ system it has.
+        :param n_results: Optional number of results to return. Returns all diseases if None.
+        :return: List of (disease_id, distance) tuples, closest first.
+        """
+        return rank_distances(self.disease_ids, self.distances(organ_embeddings), n_results)
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+"""
+    Bounded least recently used cache of patient queries. Benchmark corpora and noise-injection experiments query
+    the same phenotype sets over and over; a repeated query is answered from the cache without computing the patient
+    embedding or scoring any disease.
+"""
+
+
+@dataclass
+class CachedQuery:
+    """Patient embedding and full disease ranking of one query."""
+
+    embedding: Any
+    ranking: List[Tuple[str, float]]
+
+
+class PatientQueryCache:
+    """
+    Caches queries by their canonical HPO term set, i.e. sorted and deduplicated, together with the query strategy
+    and the similarity measure. Once max_size queries are held, the least recently used one is evicted. Every entry
+    holds a ranking of all diseases, about 1 MB for the OMIM collection, so max_size stays small.
+    """
+
+    def __init__(self, max_size: int = 64):
+        if max_size < 0:
+            raise ValueError(f"max_size must not be negative, got {max_size}")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CachedQuery]" = OrderedDict()
+
+    @staticmethod
+    def canonical_terms(hpo_terms: Iterable[str]) -> List[str]:
+        """Sorted, deduplicated HPO terms: the terms a cached query is computed from."""
+        return sorted(set(hpo_terms))
+
+    @staticmethod
+    def key(hpo_terms: Iterable[str], strategy: str, similarity_measure: SimilarityMeasures) -> Hashable:
+        return tuple(PatientQueryCache.canonical_terms(hpo_terms)), strategy, similarity_measure.value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedQuery]:
+        """Return the cached query and mark it as most recently used, or None, counting a hit or a miss."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, embedding, ranking: List[Tuple[str, float]]) -> CachedQuery:
+        entry = CachedQuery(embedding, ranking)
+        if self.max_size == 0:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drop all cached queries, e.g. after the disease collections changed. Counters are kept."""
+        self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, Iterator, List, Optional
 from chromadb.types import Collection
 
 from pheval_exomiser.prepare.core import hpo_clustering
@@ -6,6 +6,8 @@ from pheval_exomiser.prepare.core.chromadb_manager import ChromaDBManager
 from pheval_exomiser.prepare.core.data_processor import DataProcessor
 from pheval_exomiser.prepare.core.disease_avg_embedding_service import DiseaseAvgEmbeddingService
 from pheval_exomiser.prepare.core.disease_clustered_emb_service import DiseaseClusteredEmbeddingService
+from pheval_exomiser.prepare.core.organ_system_scorer import OrganSystemScorer
+from pheval_exomiser.prepare.core.ranking_engine import RankingEngine
 
 
 class QueryService:
@@ -16,6 +18,8 @@ class QueryService:
             disease_service: DiseaseAvgEmbeddingService,
             disease_organ_service: DiseaseClusteredEmbeddingService,
             similarity_strategy=None,
+            ranking_engine: Optional[RankingEngine] = None,
+            organ_system_scorer: Optional[OrganSystemScorer] = None,
     ):
         self.db_manager = db_manager
         self.data_processor = data_processor
@@ -24,16 +28,34 @@ class QueryService:
         self.disease_service = disease_service
         self.hpo_clustering = hpo_clustering
         self.disease_organ_service = disease_organ_service
+        self.ranking_engine = ranking_engine
+        self.organ_system_scorer = organ_system_scorer
 
     def query_diseases_using_organ_syst_embeddings(self, hpo_ids: List[str], n_results: int = None) -> list[Any]:
         """
         Queries the 'DiseaseClusteredEmbeddings' collection for diseases closest to the clustered embeddings of given HPO terms.
+        If an organ system scorer is set, diseases are instead scored per organ system on the patient's organ
+        systems only.
 
         :param hpo_ids: List of HPO term IDs.
         :param n_results: Optional number of results to return. Returns all if None.
         :return: List of diseases sorted by closeness to the clustered HPO embeddings.
         """
-        patient_embedding = self.disease_organ_service.compute_organ_embeddings(hpo_terms=hpo_ids)
+        return self.rank_organ_system_embedding(self.patient_organ_system_embedding(hpo_ids), n_results=n_results)
+
+    def patient_organ_system_embedding(self, hpo_ids: List[str]):
+        """
+        Organ system embedding of a patient: the mean embedding per organ system if an organ system scorer is set,
+        otherwise the concatenated organ system embedding.
+        """
+        if self.organ_system_scorer is not None:
+            return self.disease_organ_service.patient_organ_embeddings(hpo_ids)
+        return self.disease_organ_service.compute_organ_embeddings(hpo_terms=hpo_ids)
+
+    def rank_organ_system_embedding(self, patient_embedding, n_results: int = None) -> list[Any]:
+        """Ranks diseases against a patient embedding from patient_organ_system_embedding."""
+        if self.organ_system_scorer is not None:
+            return self.organ_system_scorer.rank(patient_embedding, n_results=n_results)
         # len(self.disease_organ_service.clustered_embeddings_collection.get(
         #                  include=['embeddings']))
         query_params = {
@@ -54,14 +76,25 @@ class QueryService:
             list[Any]:
         """
         Queries the 'DiseaseAvgEmbeddings' collection for diseases closest to the average embeddings of given HPO terms.
+        If a ranking engine is set, every disease is scored exactly in-process instead of querying Chroma.
 
         :param hpo_ids: List of HPO term IDs.
         :param n_results: Optional number of results to return. Returns all if None.
         :return: List of diseases sorted by closeness to the average HPO embeddings.
         """
+        return self.rank_average_embedding(self.patient_average_embedding(hpo_ids), n_results=n_results)
+
+    def patient_average_embedding(self, hpo_ids: List[str]):
+        """Average embedding of the HPO terms of a patient."""
         avg_embedding = self.data_processor.calculate_average_embedding(hpo_ids, self.hp_embeddings)
-        if avg_embedding is None:
+        if len(avg_embedding) == 0:
             raise ValueError("No valid embeddings found for provided HPO terms.")
+        return avg_embedding
+
+    def rank_average_embedding(self, avg_embedding, n_results: int = None) -> list[Any]:
+        """Ranks diseases against the average embedding of a patient."""
+        if self.ranking_engine is not None:
+            return self.ranking_engine.rank(avg_embedding, n_results=n_results)
 
         query_params = {
             "query_embeddings": [avg_embedding.tolist()],
@@ -78,6 +111,40 @@ class QueryService:
         sorted_results = self.process_query_results(query_results=query_results)
         return sorted_results
 
+    def query_diseases_by_hpo_terms_batch(
+            self, hpo_ids_list: List[List[str]], n_results: int = None, block_size: int = 256
+    ) -> Iterator[list[Any]]:
+        """
+        Ranks the diseases for many patients at once. The average embeddings of all patients are stacked into one
+        matrix and scored block-wise by the ranking engine.
+
+        :param hpo_ids_list: List of HPO term ID lists, one per patient.
+        :param n_results: Optional number of results to return per patient. Returns all if None.
+        :param block_size: Number of patients scored per matrix multiply.
+        :return: Iterator of sorted (disease, distance) lists in input order; patients without any known HPO term
+            yield an empty list.
+        """
+        if self.ranking_engine is None:
+            raise ValueError("Batch queries require a ranking engine")
+        patient_matrix, valid_indices = self.data_processor.calculate_average_embeddings(
+            hpo_ids_list, self.hp_embeddings
+        )
+        return self.rank_average_embeddings_batch(
+            patient_matrix, valid_indices, len(hpo_ids_list), n_results=n_results, block_size=block_size
+        )
+
+    def rank_average_embeddings_batch(
+            self, patient_matrix, valid_indices, n_patients: int, n_results: int = None, block_size: int = 256
+    ) -> Iterator[list[Any]]:
+        """
+        Ranks the diseases for a stacked matrix of patient average embeddings, as returned by
+        DataProcessor.calculate_average_embeddings, yielding an empty list for patients without an embedding.
+        """
+        rankings = self.ranking_engine.rank_batch(patient_matrix, n_results=n_results, block_size=block_size)
+        valid = set(valid_indices.tolist())
+        for index in range(n_patients):
+            yield next(rankings) if index in valid else []
+
     def max_results(self, query_params, n_results, col: Collection, estimated_total_query_results):
         if n_results is None:
             estimated_length = len(estimated_total_query_results["embeddings"])
@@ -132,3 +199,15 @@ class QueryService:
             return self.similarity_strategy.calculate_similarity(data1, data2)
         else:
             raise ValueError("No similarity strategy provided")
+
+    def score_many_with_custom_similarity_function(self, query_matrix):
+        """
+        Scores every query against the disease matrix the similarity strategy was fitted on, see SimilarityService.
+
+        :param query_matrix: Array of shape (n_queries, dimension).
+        :return: Array of shape (n_queries, n_diseases).
+        """
+        if self.similarity_strategy:
+            return self.similarity_strategy.score_many(query_matrix)
+        else:
+            raise ValueError("No similarity strategy provided")
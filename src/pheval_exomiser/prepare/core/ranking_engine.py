@@ -0,0 +1,277 @@
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.similarity_service import similarity_service
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+"""
+    Exact in-process ranking of every disease against a patient embedding.
+    All disease vectors live in one contiguous float32 matrix, so scoring a patient is a single
+    matrix-vector product instead of an HNSW lookup against a Chroma collection.
+    Optionally the scanned matrix is quantized to float16 or to int8 with one scale per vector, and only the
+    best candidates of the approximate scan are re-ranked exactly against the float32 embeddings. Both cut the
+    memory of the matrix; int8 also scans about as fast as float32, and faster for small query blocks, while
+    fp16 scans slower because NumPy converts half precision in software.
+"""
+
+QUANTIZATIONS = ("fp16", "int8")
+# size of the float32 buffer a quantized scan dequantizes into, small enough to stay in the CPU cache
+SCAN_BLOCK_BYTES = 1 << 19
+
+
+class RankingEngine:
+    """
+    Ranks all diseases for a query embedding. Distances follow the Chroma conventions of the given space so the
+    output is interchangeable with QueryService.process_query_results:
+        cosine -> 1 - cosine similarity
+        l2     -> squared euclidean distance
+        ip     -> 1 - inner product
+    Disease IDs are sorted on construction and ties are broken by that order, so rankings are deterministic.
+    """
+
+    def __init__(
+        self,
+        disease_ids: Sequence[str],
+        embeddings,
+        similarity_measure: SimilarityMeasures = SimilarityMeasures.COSINE,
+        quantization: Optional[str] = None,
+        rerank_k: int = 100,
+        block_size: int = 4096,
+    ):
+        """
+        :param disease_ids: Disease IDs, one per embedding.
+        :param embeddings: Disease embeddings. With quantization they must be an array, which is kept to re-rank
+            from and not copied; pass a memory-mapped one, e.g. of an EmbeddingStore, so the float32 embeddings stay
+            on disk and only the re-ranked rows are read.
+        :param similarity_measure: Distance function used for ranking.
+        :param quantization: None for an exact float32 matrix, "fp16" or "int8" for a quantized matrix.
+        :param rerank_k: Number of best approximate candidates re-ranked exactly per query.
+        :param block_size: Number of disease rows quantized per step.
+        """
+        if len(disease_ids) == 0:
+            raise ValueError("Cannot build a ranking engine without disease embeddings")
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization}, expected one of {', '.join(QUANTIZATIONS)}")
+        if rerank_k < 1:
+            raise ValueError(f"rerank_k must be at least 1, got {rerank_k}")
+        ids = np.asarray(disease_ids, dtype=str)
+        order = np.argsort(ids, kind="stable")
+        self.disease_ids = ids[order]
+        self.similarity_measure = similarity_measure
+        self.quantization = quantization
+        self.rerank_k = rerank_k
+        self.block_size = block_size
+        self._squared_norms = None
+        if quantization is None:
+            # indexing by order already copies, so the service takes that copy over
+            self._similarity = similarity_service(similarity_measure).fit(
+                np.asarray(embeddings, dtype=np.float32)[order], copy=False
+            )
+            self.matrix = self._similarity.disease_matrix
+            self._check_shape(self.matrix)
+        else:
+            if not isinstance(embeddings, np.ndarray):
+                raise ValueError(
+                    "A quantized ranking engine re-ranks from the float32 embeddings and needs them as an array, "
+                    "e.g. the memory-mapped matrix of an EmbeddingStore"
+                )
+            self._embeddings = embeddings
+            self._check_shape(self._embeddings)
+            self._order = order
+            self._quantize()
+
+    def _check_shape(self, matrix: np.ndarray):
+        if matrix.ndim != 2 or matrix.shape[0] != len(self.disease_ids):
+            raise ValueError(f"Expected one embedding per disease, got matrix of shape {matrix.shape}")
+
+    def _exact_rows(self, rows: np.ndarray) -> np.ndarray:
+        """float32 embeddings of the given rows, normalised for cosine, read from the unquantized embeddings."""
+        matrix = np.asarray(self._embeddings[self._order[rows]], dtype=np.float32)
+        if self.similarity_measure == SimilarityMeasures.COSINE:
+            matrix /= self._safe_norms(matrix)[:, None]
+        return matrix
+
+    def _quantize(self):
+        """Quantizes the embeddings block_size rows at a time, keeping exact squared norms for l2."""
+        n_diseases, dimension = self._embeddings.shape
+        self.matrix = np.empty((n_diseases, dimension), dtype=np.float16 if self.quantization == "fp16" else np.int8)
+        self._scales = np.ones(n_diseases, dtype=np.float32) if self.quantization == "int8" else None
+        if self.similarity_measure == SimilarityMeasures.L2:
+            self._squared_norms = np.empty(n_diseases, dtype=np.float32)
+        for start in range(0, n_diseases, self.block_size):
+            stop = min(start + self.block_size, n_diseases)
+            block = self._exact_rows(np.arange(start, stop))
+            if self._squared_norms is not None:
+                self._squared_norms[start:stop] = np.einsum("ij,ij->i", block, block)
+            if self.quantization == "fp16":
+                self.matrix[start:stop] = block
+            else:
+                scales = np.abs(block).max(axis=1) / 127
+                scales[scales == 0] = 1
+                self._scales[start:stop] = scales
+                self.matrix[start:stop] = np.rint(block / scales[:, None])
+
+    @classmethod
+    def from_collection(
+        cls,
+        collection,
+        similarity_measure: SimilarityMeasures = SimilarityMeasures.COSINE,
+        quantization: Optional[str] = None,
+        rerank_k: int = 100,
+    ):
+        """
+        Build a ranking engine from every embedding stored in a Chroma collection.
+
+        :param collection: Chroma collection holding one embedding per disease.
+        :param similarity_measure: Distance function used for ranking.
+        :param quantization: None, "fp16" or "int8", see RankingEngine.
+        :param rerank_k: Number of approximate candidates re-ranked exactly when quantized.
+        :return: RankingEngine over all diseases of the collection.
+        """
+        results = collection.get(include=["embeddings"])
+        return cls(results["ids"], results["embeddings"], similarity_measure, quantization, rerank_k)
+
+    def __len__(self) -> int:
+        return len(self.disease_ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    @staticmethod
+    def _safe_norms(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1)
+        return np.where(norms == 0, 1, norms).astype(np.float32)
+
+    def distances(self, embedding) -> np.ndarray:
+        """
+        Calculates the distance of a single query embedding to every disease.
+
+        :param embedding: Query vector with the same dimension as the disease vectors.
+        :return: float32 array of distances, aligned with self.disease_ids.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query embedding has shape {query.shape}, expected ({self.dimension},)")
+        return self.distances_batch(query[None, :])[0]
+
+    def distances_batch(self, query_matrix) -> np.ndarray:
+        """
+        Calculates the distance of every query embedding to every disease with one matrix multiply.
+        With a quantized matrix the distances are approximate.
+
+        :param query_matrix: Array of shape (n_queries, dimension).
+        :return: float32 array of shape (n_queries, n_diseases).
+        """
+        queries = np.asarray(query_matrix, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.dimension:
+            raise ValueError(f"Query matrix has shape {queries.shape}, expected (n, {self.dimension})")
+        if self.quantization is None:
+            return self._similarity.distances_many(queries)
+        return self._to_distances(queries, self._approximate_scores(queries), self._squared_norms)
+
+    def _approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Inner products with the quantized matrix. Rows are dequantized into one reused float32 buffer of
+        SCAN_BLOCK_BYTES, which is still in cache when it is multiplied with the queries. The buffer holds at least
+        as many rows as there are queries, so the multiply stays efficient for large query blocks.
+        """
+        n_diseases, dimension = self.matrix.shape
+        buffer_rows = max(1, SCAN_BLOCK_BYTES // (4 * dimension), len(queries))
+        buffer = np.empty((min(buffer_rows, n_diseases), dimension), dtype=np.float32)
+        # disease-major, so every block writes contiguous rows
+        scores = np.empty((n_diseases, len(queries)), dtype=np.float32)
+        for start in range(0, n_diseases, len(buffer)):
+            stop = min(start + len(buffer), n_diseases)
+            block = buffer[:stop - start]
+            np.copyto(block, self.matrix[start:stop])
+            np.matmul(block, queries.T, out=scores[start:stop])
+        if self._scales is not None:
+            scores *= self._scales[:, None]
+        return scores.T
+
+    def _to_distances(self, queries: np.ndarray, scores: np.ndarray, squared_norms: Optional[np.ndarray]) -> np.ndarray:
+        if self.similarity_measure == SimilarityMeasures.COSINE:
+            return 1 - scores / self._safe_norms(queries)[:, None]
+        if self.similarity_measure == SimilarityMeasures.L2:
+            query_norms = np.einsum("ij,ij->i", queries, queries)
+            return np.maximum(squared_norms[None, :] + query_norms[:, None] - 2 * scores, 0)
+        return 1 - scores
+
+    def rank(self, embedding, n_results: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Ranks diseases by ascending distance to the query embedding.
+
+        :param embedding: Query vector.
+        :param n_results: Optional number of results to return. Returns all diseases if None.
+        :return: List of (disease_id, distance) tuples, closest first.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        return self._ranked(self.distances(query), n_results, query)
+
+    def rank_batch(
+        self, query_matrix, n_results: Optional[int] = None, block_size: int = 256
+    ) -> Iterator[List[Tuple[str, float]]]:
+        """
+        Ranks diseases for many query embeddings, scoring block_size queries per matrix multiply.
+        Rankings are yielded one query at a time in input order, so only one block of distances is held in memory.
+
+        :param query_matrix: Array of shape (n_queries, dimension).
+        :param n_results: Optional number of results per query. Returns all diseases if None.
+        :param block_size: Number of queries scored per matrix multiply.
+        :return: Iterator of (disease_id, distance) lists, one per query row.
+        """
+        queries = np.asarray(query_matrix, dtype=np.float32)
+        for start in range(0, len(queries), block_size):
+            block = queries[start:start + block_size]
+            for query, distances in zip(block, self.distances_batch(block)):
+                yield self._ranked(distances, n_results, query)
+
+    def _ranked(
+        self, distances: np.ndarray, n_results: Optional[int] = None, query: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        if self.quantization is None or query is None:
+            return rank_distances(self.disease_ids, distances, n_results)
+        return self._reranked(query, distances, n_results)
+
+    def _reranked(self, query: np.ndarray, distances: np.ndarray, n_results: Optional[int]) -> List[Tuple[str, float]]:
+        """
+        Re-ranks the best max(rerank_k, n_results) approximate candidates with exact float32 distances. They come
+        first; if more results are requested the remaining diseases follow by their approximate distance.
+        """
+        if n_results is not None and n_results <= 0:
+            return []
+        k = min(len(distances), max(self.rerank_k, n_results or 0))
+        candidates = np.sort(np.argpartition(distances, k - 1)[:k])
+        rows = self._exact_rows(candidates)
+        squared_norms = np.einsum("ij,ij->i", rows, rows) if self.similarity_measure == SimilarityMeasures.L2 else None
+        exact = self._to_distances(query[None, :], query[None, :] @ rows.T, squared_norms)[0]
+        ranking = rank_distances(self.disease_ids[candidates], exact, n_results)
+        if n_results is None or n_results > k:
+            rest = np.setdiff1d(np.arange(len(distances)), candidates, assume_unique=True)
+            ranking += rank_distances(
+                self.disease_ids[rest], distances[rest], None if n_results is None else n_results - k
+            )
+        return ranking
+
+
+def rank_distances(
+    disease_ids: np.ndarray, distances: np.ndarray, n_results: Optional[int] = None
+) -> List[Tuple[str, float]]:
+    """
+    Sorts diseases by ascending distance, ties broken by position in disease_ids.
+
+    :param disease_ids: Disease IDs aligned with distances.
+    :param distances: Distance of every disease.
+    :param n_results: Optional number of results to return. Returns all diseases if None.
+    :return: List of (disease_id, distance) tuples, closest first.
+    """
+    if n_results is not None and n_results <= 0:
+        return []
+    if n_results is None or n_results >= len(distances):
+        order = np.argsort(distances, kind="stable")
+    else:
+        top = np.argpartition(distances, n_results - 1)[:n_results]
+        order = top[np.lexsort((top, distances[top]))]
+    return list(zip(disease_ids[order].tolist(), distances[order].tolist()))
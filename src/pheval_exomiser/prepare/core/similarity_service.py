@@ -1,14 +1,90 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+"""
+    Similarity functions between a query and every disease vector. A service fitted on the disease matrix prepares
+    it once when the collection is built: cosine keeps L2-normalised rows and l2 keeps the squared row norms, so
+    scoring a query against all diseases costs one dot product per disease, or one matrix multiply per block of
+    queries with score_many.
+"""
+
 
 class SimilarityService(ABC):
+    def __init__(self, disease_matrix=None):
+        """
+        :param disease_matrix: Optional disease vectors of shape (n_diseases, dimension), fitted right away.
+        """
+        self.disease_matrix: Optional[np.ndarray] = None
+        if disease_matrix is not None:
+            self.fit(disease_matrix)
+
     @abstractmethod
     def calculate_similarity(self, vector_a: List[float], vector_b: List[float]) -> float:
         pass
 
+    def fit(self, disease_matrix, copy: bool = True) -> "SimilarityService":
+        """
+        Stores a contiguous float32 copy of the disease vectors and precomputes what scoring needs. The copy leaves
+        the caller's array, which may be a read-only memory map, untouched.
+
+        :param disease_matrix: Disease vectors of shape (n_diseases, dimension).
+        :param copy: False takes over a writable contiguous float32 matrix the caller no longer uses, e.g. a freshly
+            reordered one, and prepares it in place instead of copying it.
+        """
+        if copy:
+            matrix = np.array(disease_matrix, dtype=np.float32, order="C", copy=True)
+        else:
+            matrix = np.ascontiguousarray(disease_matrix, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a disease matrix of shape (n_diseases, dimension), got {matrix.shape}")
+        self.disease_matrix = self._prepare(matrix)
+        return self
+
+    def _prepare(self, matrix: np.ndarray) -> np.ndarray:
+        return matrix
+
+    def _queries(self, query_matrix) -> np.ndarray:
+        if self.disease_matrix is None:
+            raise ValueError("No disease matrix fitted")
+        queries = np.asarray(query_matrix, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.disease_matrix.shape[1]:
+            raise ValueError(f"Query matrix has shape {queries.shape}, expected (n, {self.disease_matrix.shape[1]})")
+        return queries
+
+    @abstractmethod
+    def score_many(self, query_matrix) -> np.ndarray:
+        """
+        Scores every query against every fitted disease vector.
+
+        :param query_matrix: Array of shape (n_queries, dimension).
+        :return: float32 array of shape (n_queries, n_diseases).
+        """
+
+    def score(self, query) -> np.ndarray:
+        """Scores a single query vector against every fitted disease vector."""
+        return self.score_many(np.asarray(query, dtype=np.float32)[None, :])[0]
+
+    @abstractmethod
+    def distances_many(self, query_matrix) -> np.ndarray:
+        """
+        Distances of every query to every fitted disease vector, following the Chroma conventions of the space:
+            cosine -> 1 - cosine similarity
+            l2     -> squared euclidean distance
+            ip     -> 1 - inner product
+
+        :param query_matrix: Array of shape (n_queries, dimension).
+        :return: float32 array of shape (n_queries, n_diseases).
+        """
+
+    @staticmethod
+    def _safe_norms(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1)
+        return np.where(norms == 0, 1, norms).astype(np.float32)
+
 
 class CosineSimilarity(SimilarityService):
     def calculate_similarity(self, vector_a: List[float], vector_b: List[float]) -> float:
@@ -17,8 +93,69 @@ class CosineSimilarity(SimilarityService):
         norm_b = np.linalg.norm(vector_b)
         return dot_product / (norm_a * norm_b)
 
+    def _prepare(self, matrix: np.ndarray) -> np.ndarray:
+        matrix /= self._safe_norms(matrix)[:, None]
+        return matrix
+
+    def score_many(self, query_matrix) -> np.ndarray:
+        """Cosine similarities; a zero vector has similarity 0 to everything."""
+        queries = self._queries(query_matrix)
+        return (queries @ self.disease_matrix.T) / self._safe_norms(queries)[:, None]
+
+    def distances_many(self, query_matrix) -> np.ndarray:
+        return 1 - self.score_many(query_matrix)
+
 
 class L2Distance(SimilarityService):
+    """Squared euclidean distance, as in the Chroma l2 space."""
+
+    def __init__(self, disease_matrix=None):
+        self.squared_norms: Optional[np.ndarray] = None
+        super().__init__(disease_matrix)
+
+    def calculate_similarity(self, vector_a: List[float], vector_b: List[float]) -> float:
+        difference = np.subtract(vector_a, vector_b)
+        return float(np.dot(difference, difference))
+
+    def _prepare(self, matrix: np.ndarray) -> np.ndarray:
+        self.squared_norms = np.einsum("ij,ij->i", matrix, matrix)
+        return matrix
+
+    def score_many(self, query_matrix) -> np.ndarray:
+        """Squared distances from ||a||^2 + ||b||^2 - 2 a.b, clipped at 0 against rounding."""
+        queries = self._queries(query_matrix)
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        scores = queries @ self.disease_matrix.T
+        return np.maximum(self.squared_norms[None, :] + query_norms[:, None] - 2 * scores, 0)
+
+    def distances_many(self, query_matrix) -> np.ndarray:
+        return self.score_many(query_matrix)
+
+
+class InnerProduct(SimilarityService):
     def calculate_similarity(self, vector_a: List[float], vector_b: List[float]) -> float:
-        # Implement L2 distance calculation
-        raise NotImplementedError
+        return float(np.dot(vector_a, vector_b))
+
+    def score_many(self, query_matrix) -> np.ndarray:
+        return self._queries(query_matrix) @ self.disease_matrix.T
+
+    def distances_many(self, query_matrix) -> np.ndarray:
+        return 1 - self.score_many(query_matrix)
+
+
+SIMILARITY_SERVICES = {
+    SimilarityMeasures.COSINE: CosineSimilarity,
+    SimilarityMeasures.L2: L2Distance,
+    SimilarityMeasures.IP: InnerProduct,
+}
+
+
+def similarity_service(similarity_measure: SimilarityMeasures, disease_matrix=None) -> SimilarityService:
+    """
+    Similarity service of a similarity measure.
+
+    :param similarity_measure: Similarity measure of the disease collection.
+    :param disease_matrix: Optional disease vectors to fit.
+    :return: The matching SimilarityService, fitted if disease_matrix is given.
+    """
+    return SIMILARITY_SERVICES[similarity_measure](disease_matrix)
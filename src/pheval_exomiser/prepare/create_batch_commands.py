@@ -1,8 +1,11 @@
 #!/usr/bin/python
-import tempfile
+import heapq
+import itertools
 from dataclasses import dataclass
+from functools import partial
+from multiprocessing import Pool
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 import click
 from phenopackets import Family, Phenopacket
@@ -17,6 +20,10 @@ from pheval_exomiser.constants import (
     RAW_RESULTS_TARGET_DIRECTORY_DOCKER,
     VCF_TARGET_DIRECTORY_DOCKER,
 )
+from pheval_exomiser.run.batch_scheduler import read_sample_costs
+
+SAMPLE_BASE_COST = 1.0
+VCF_COST_PER_MIB = 1.0
 
 
 @dataclass
@@ -128,6 +135,69 @@ class CommandCreator:
         )
 
 
+def create_phenopacket_command_arguments(
+    phenopacket_path: Path,
+    environment: str,
+    phenotype_only: bool,
+    vcf_dir: Path,
+    results_dir: Path or None,
+    output_option_dir_files: list[Path] or None,
+    output_options_file: Path or None,
+    analysis_yaml: Path or None,
+) -> ExomiserCommandLineArguments:
+    """Read a phenopacket and return its Exomiser command line arguments."""
+    return CommandCreator(
+        environment,
+        phenopacket_path,
+        phenopacket_reader(phenopacket_path),
+        phenotype_only,
+        output_option_dir_files,
+        output_options_file,
+        results_dir,
+        analysis_yaml,
+    ).add_command_line_arguments(vcf_dir)
+
+
+def iter_command_arguments(
+    environment: str,
+    phenopacket_dir: Path,
+    phenotype_only: bool,
+    vcf_dir: Path,
+    results_dir: Path or None,
+    output_options_dir: Path or None = None,
+    output_options_file: Path or None = None,
+    analysis_yaml: Path or None = None,
+    n_workers: int = 1,
+    chunksize: int = 64,
+) -> Iterator[ExomiserCommandLineArguments]:
+    """
+    Yield the Exomiser command line arguments for a directory of phenopackets, in file name order.
+    With n_workers > 1 the phenopackets are read by a pool of worker processes. Paths are handed to the pool in
+    windows of a few chunks per worker, so only a window of parsed commands is ever held in memory, however
+    large the directory.
+    """
+    phenopacket_paths = files_with_suffix(phenopacket_dir, ".json")
+    create_arguments = partial(
+        create_phenopacket_command_arguments,
+        environment=environment,
+        phenotype_only=phenotype_only,
+        vcf_dir=vcf_dir,
+        results_dir=results_dir,
+        output_option_dir_files=get_all_files_from_output_opt_directory(output_options_dir),
+        output_options_file=output_options_file,
+        analysis_yaml=analysis_yaml,
+    )
+    if n_workers == 1:
+        yield from map(create_arguments, phenopacket_paths)
+        return
+    window = n_workers * chunksize * 4
+    with Pool(n_workers) as pool:
+        for start in range(0, len(phenopacket_paths), window):
+            yield from pool.imap(
+                create_arguments, phenopacket_paths[start : start + window], chunksize=chunksize
+            )
+
+
 def create_command_arguments(
     environment: str,
     phenopacket_dir: Path,
@@ -137,26 +207,22 @@ def create_command_arguments(
     output_options_dir: Path or None = None,
     output_options_file: Path or None = None,
     analysis_yaml: Path or None = None,
+    n_workers: int = 1,
 ) -> list[ExomiserCommandLineArguments]:
     """Return a list of Exomiser command line arguments for a directory of phenopackets."""
-    phenopacket_paths = files_with_suffix(phenopacket_dir, ".json")
-    commands = []
-    output_option_dir_files = get_all_files_from_output_opt_directory(output_options_dir)
-    for phenopacket_path in phenopacket_paths:
-        phenopacket = phenopacket_reader(phenopacket_path)
-        commands.append(
-            CommandCreator(
-                environment,
-                phenopacket_path,
-                phenopacket,
-                phenotype_only,
-                output_option_dir_files,
-                output_options_file,
-                results_dir,
-                analysis_yaml,
-            ).add_command_line_arguments(vcf_dir)
+    return list(
+        iter_command_arguments(
+            environment,
+            phenopacket_dir,
+            phenotype_only,
+            vcf_dir,
+            results_dir,
+            output_options_dir,
+            output_options_file,
+            analysis_yaml,
+            n_workers=n_workers,
         )
-    return commands
+    )
 
 
 class CommandsWriter:
@@ -247,15 +313,19 @@ class BatchFileWriter:
 
     def __init__(
         self,
-        command_arguments_list: list[ExomiserCommandLineArguments],
+        command_arguments_list: Iterable[ExomiserCommandLineArguments],
         variant_analysis: bool,
         output_dir: Path,
         batch_prefix: str,
+        vcf_dir: Path = None,
+        sample_costs: dict[str, float] = None,
     ):
         self.command_arguments_list = command_arguments_list
         self.variant_analysis = variant_analysis
         self.output_dir = output_dir
         self.batch_prefix = batch_prefix
+        self.vcf_dir = vcf_dir
+        self.sample_costs = sample_costs or {}
 
     def write_commands(self, commands_writer: CommandsWriter) -> None:
         """Write command arguments to a file."""
@@ -263,13 +333,6 @@ class BatchFileWriter:
             commands_writer.write_local_commands(command_arguments)
         commands_writer.close()
 
-    def write_temp_file(self) -> str:
-        """Write commands out to a temporary file."""
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        commands_writer = CommandsWriter(Path(temp.name), self.variant_analysis)
-        self.write_commands(commands_writer)
-        return temp.name
-
     def write_all_commands(self) -> None:
         """Write all commands out to a single file."""
         commands_writer = CommandsWriter(
@@ -278,26 +341,88 @@ class BatchFileWriter:
         )
         self.write_commands(commands_writer)
 
+    def split_batch_file_path(self, batch_number: int) -> Path:
+        return Path(self.output_dir).joinpath(
+            self.batch_prefix + "-exomiser-batch-{}.txt".format(batch_number)
+        )
+
+    def write_batch(self, batch_number: int, command_arguments_list: list) -> None:
+        """Write a list of command arguments to a numbered batch file."""
+        commands_writer = CommandsWriter(
+            self.split_batch_file_path(batch_number), self.variant_analysis
+        )
+        for command_arguments in command_arguments_list:
+            commands_writer.write_local_commands(command_arguments)
+        commands_writer.close()
+
     def create_split_batch_files(self, max_jobs: int) -> None:
-        """Split temp file into separate batch files, dependent on the number of max jobs allocated to each file."""
-        temp_file_name = self.write_temp_file()
-        lines_per_file, f_name = max_jobs, 0
-        splitfile = None
-        with open(temp_file_name) as tmp_file:
-            for lineno, line in enumerate(tmp_file):
-                if lineno % lines_per_file == 0:
-                    f_name += 1
-                    if splitfile:
-                        splitfile.close()
-                    split_filename = Path(self.output_dir).joinpath(
-                        self.batch_prefix + "-exomiser-batch-{}.txt".format(f_name)
-                    )
-                    splitfile = open(split_filename, "w")
-                splitfile.write(line)
-            if splitfile:
-                splitfile.close()
-        tmp_file.close()
-        Path(temp_file_name).unlink()
+        """Split the commands into separate batch files, dependent on the number of max jobs allocated to each file."""
+        command_arguments = iter(self.command_arguments_list)
+        for f_name in itertools.count(start=1):
+            batch = list(itertools.islice(command_arguments, max_jobs))
+            if not batch:
+                break
+            self.write_batch(f_name, batch)
+
+    def heuristic_cost(self, command_arguments: ExomiserCommandLineArguments) -> float:
+        """
+        Every sample costs SAMPLE_BASE_COST plus VCF_COST_PER_MIB for each MiB of its VCF.
+        Docker commands refer to the VCF inside the container, so it is looked up by name in vcf_dir.
+        """
+        if not self.variant_analysis or command_arguments.vcf_file is None:
+            return SAMPLE_BASE_COST
+        vcf_file = Path(command_arguments.vcf_file)
+        if not vcf_file.is_file() and self.vcf_dir is not None:
+            vcf_file = Path(self.vcf_dir).joinpath(vcf_file.name)
+        vcf_size = vcf_file.stat().st_size if vcf_file.is_file() else 0
+        return SAMPLE_BASE_COST + VCF_COST_PER_MIB * vcf_size / 2**20
+
+    def estimate_costs(self) -> list[float]:
+        """
+        Estimate the run time of every command. Past run times of known samples are in seconds, so the heuristic
+        costs of the other samples are scaled to seconds by the ratio of the known run times to their heuristic
+        costs.
+        """
+        heuristic_costs = [self.heuristic_cost(arguments) for arguments in self.command_arguments_list]
+        samples = [Path(arguments.sample).stem for arguments in self.command_arguments_list]
+        known = [index for index, sample in enumerate(samples) if sample in self.sample_costs]
+        known_heuristic_cost = sum(heuristic_costs[index] for index in known)
+        scale = (
+            sum(self.sample_costs[samples[index]] for index in known) / known_heuristic_cost
+            if known_heuristic_cost > 0
+            else 1.0
+        )
+        return [
+            self.sample_costs[sample] if sample in self.sample_costs else scale * heuristic_cost
+            for sample, heuristic_cost in zip(samples, heuristic_costs)
+        ]
+
+    def create_balanced_batch_files(self, n_batches: int) -> list[float]:
+        """
+        Pack the commands into n_batches batch files of about equal estimated cost, assigning the most expensive
+        command first to the batch with the lowest cost so far. Commands keep their input order within a batch.
+
+        :param n_batches: Number of batch files to write, fewer if there are fewer commands.
+        :return: Estimated cost of every written batch file.
+        """
+        if n_batches < 1:
+            raise ValueError(f"n_batches must be at least 1, got {n_batches}")
+        self.command_arguments_list = list(self.command_arguments_list)
+        costs = self.estimate_costs()
+        n_batches = min(n_batches, len(costs))
+        loads = [(0.0, batch) for batch in range(n_batches)]
+        batches = [[] for _ in range(n_batches)]
+        batch_costs = [0.0] * n_batches
+        for index in sorted(range(len(costs)), key=lambda i: costs[i], reverse=True):
+            load, batch = heapq.heappop(loads)
+            batches[batch].append(index)
+            batch_costs[batch] = load + costs[index]
+            heapq.heappush(loads, (batch_costs[batch], batch))
+        for batch, indices in enumerate(batches):
+            self.write_batch(
+                batch + 1, [self.command_arguments_list[index] for index in sorted(indices)]
+            )
+        return batch_costs
 
 
 def create_batch_file(
@@ -312,9 +437,16 @@ def create_batch_file(
     results_dir: Path,
     output_options_dir: Path = None,
     output_options_file: Path = None,
+    n_batches: int = 0,
+    n_workers: int = 1,
+    sample_costs_file: Path = None,
 ) -> None:
-    """Create Exomiser batch files."""
-    command_arguments = create_command_arguments(
+    """
+    Create Exomiser batch files, split by max_jobs or balanced by estimated cost into n_batches files.
+    Balancing uses the sample run times of sample_costs_file where known.
+    Commands are written as the phenopackets are read by n_workers processes.
+    """
+    command_arguments = iter_command_arguments(
         environment,
         phenopacket_dir,
         variant_analysis,
@@ -323,20 +455,22 @@ def create_batch_file(
         output_options_dir,
         output_options_file,
         analysis,
+        n_workers=n_workers,
     )
-    BatchFileWriter(
+    batch_file_writer = BatchFileWriter(
         command_arguments,
         variant_analysis,
         output_dir,
         batch_prefix,
-    ).write_all_commands() if max_jobs == 0 else BatchFileWriter(
-        command_arguments,
-        variant_analysis,
-        output_dir,
-        batch_prefix,
-    ).create_split_batch_files(
-        max_jobs
+        vcf_dir=vcf_dir,
+        sample_costs=read_sample_costs(sample_costs_file) if sample_costs_file is not None else None,
     )
+    if n_batches > 0:
+        batch_file_writer.create_balanced_batch_files(n_batches)
+    elif max_jobs == 0:
+        batch_file_writer.write_all_commands()
+    else:
+        batch_file_writer.create_split_batch_files(max_jobs)
 
 
 @click.command()
@@ -392,6 +526,39 @@ def create_batch_file(
     show_default=True,
     help="Number of jobs in each file.",
 )
+@click.option(
+    "--balanced-batches",
+    "-n",
+    "n_batches",
+    required=False,
+    metavar="<int>",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Number of batch files of about equal estimated run time to write, "
+    "estimated from VCF file sizes and --sample-costs. Takes precedence over --max-jobs.",
+)
+@click.option(
+    "--sample-costs",
+    "-c",
+    "sample_costs_file",
+    required=False,
+    metavar="FILE",
+    type=Path,
+    help="Sample run times of a previous run, the exomiser_logs/sample_costs.tsv of its output directory, "
+    "used by --balanced-batches.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    "n_workers",
+    required=False,
+    metavar="<int>",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes reading phenopackets.",
+)
 @click.option(
     "--phenotype-only",
     type=bool,
@@ -434,6 +601,9 @@ def prepare_exomiser_batch(
     output_dir: Path,
     batch_prefix: str,
     max_jobs: int,
+    n_batches: int,
+    n_workers: int,
+    sample_costs_file: Path,
     phenotype_only: bool,
     output_options_dir: Path = None,
     output_options_file: Path = None,
@@ -451,4 +621,7 @@ def prepare_exomiser_batch(
         phenotype_only,
         output_options_dir,
         output_options_file,
+        n_batches=n_batches,
+        n_workers=n_workers,
+        sample_costs_file=sample_costs_file,
     )
@@ -1,6 +1,10 @@
+import re
 from pathlib import Path
+from typing import Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
+
+JAVA_HEAP_PATTERN = r"[0-9]+[kKmMgG]?"
 
 
 class ApplicationProperties(BaseModel):
@@ -28,46 +32,69 @@ class ApplicationProperties(BaseModel):
     cache_caffeine_spec: int = Field(None)
 
 
-# class PostProcessing(BaseModel):
-#     """
-#     Class for defining the post-processing configurations.
-#     Args:
-#         score_name (str): Name of score to extract from results.
-#         sort_order (str): Order to sort results
-#     """
-#
-#     score_name: str = Field(...)
-#     sort_order: str = Field(...)
-
-
-# class ExomiserConfigurations(BaseModel):
-#     """
-#     Class for defining the Exomiser configurations in tool_specific_configurations field,
-#     within the input_dir config.yaml
-#     Args:
-#         environment (str): Environment to run Exomiser, i.e., local/docker
-#         exomiser_software_directory (Path): Directory name for Exomiser software directory
-#         analysis_configuration_file (Path): The file name of the analysis configuration file located in the input_dir
-#         max_jobs (int): Maximum number of jobs to run in a batch
-#         application_properties (ApplicationProperties): application.properties configurations
-#         post_process (PostProcessing): Post-processing configurations
-#     """
-#
-#     environment: str = Field(...)
-#     exomiser_software_directory: Path = Field(...)
-#     analysis_configuration_file: Path = Field(...)
-#     max_jobs: int = Field(...)
-#     application_properties: ApplicationProperties = Field(...)
-#     post_process: PostProcessing = Field(...)
-
-
 class PostProcessing(BaseModel):
     score_name: str = Field(...)
     sort_order: str = Field(...)
 
 
+class ExomiserConfigurations(BaseModel):
+    """
+    Class for defining the Exomiser configurations in tool_specific_configurations field,
+    within the input_dir config.yaml
+    Args:
+        environment (str): Environment to run Exomiser, i.e., local/docker
+        exomiser_software_directory (Path): Directory name for Exomiser software directory
+        analysis_configuration_file (Path): The file name of the analysis configuration file located in the input_dir
+        max_jobs (int): Maximum number of jobs to run in a batch
+        balanced_batches (int): Number of batches balanced by estimated run time, overrides max_jobs if set
+        sample_costs_file (Path): Sample run times of a previous run used to balance the batches, i.e., the
+            exomiser_logs/sample_costs.tsv of its output directory
+        prepare_workers (int): Number of processes reading phenopackets while preparing the batch files
+        max_concurrent_jobs (int): Number of batch files run by concurrent Exomiser processes
+        java_heap (str): Maximum heap size of every local Exomiser JVM, e.g., 4g
+        max_retries (int): Number of times a failed batch file is run again
+        docker_cpus (float): CPUs available to every Exomiser docker container, unlimited if unset
+        docker_memory (str): Memory limit of every Exomiser docker container, e.g., 8g, unlimited if unset
+        application_properties (ApplicationProperties): application.properties configurations
+        post_process (PostProcessing): Post-processing configurations
+    """
+
+    environment: str = Field(...)
+    exomiser_software_directory: Path = Field(...)
+    analysis_configuration_file: Path = Field(...)
+    max_jobs: int = Field(...)
+    balanced_batches: int = Field(0, ge=0)
+    sample_costs_file: Path = Field(None)
+    prepare_workers: int = Field(1, ge=1)
+    max_concurrent_jobs: int = Field(1, ge=1)
+    java_heap: str = Field("4g")
+    max_retries: int = Field(0, ge=0)
+    docker_cpus: float = Field(None, gt=0)
+    docker_memory: str = Field(None)
+    application_properties: ApplicationProperties = Field(...)
+    post_process: PostProcessing = Field(...)
+
+    @validator("java_heap")
+    def check_java_heap(cls, java_heap: str) -> str:
+        if not re.fullmatch(JAVA_HEAP_PATTERN, java_heap):
+            raise ValueError(f"java_heap must be a JVM heap size such as 512m or 4g, got {java_heap}")
+        return java_heap
+
+
 class ElderPostProcessingConfig(BaseModel):
+    """
+    Class for defining the Elder configurations in tool_specific_configurations field,
+    within the input_dir config.yaml
+
+    Args:
+        post_process (PostProcessing): Post-processing configurations
+        n_workers (int): Number of worker processes parsing phenopackets and threads writing results
+        output_format (str): Write PhEval TSVs per phenopacket ("tsv") or a single Parquet dataset ("parquet")
+    """
+
     post_process: PostProcessing = Field(...)
+    n_workers: int = Field(1, ge=1)
+    output_format: Literal["tsv", "parquet"] = Field("tsv")
 
 
 def load_config(config_file: Path) -> ElderPostProcessingConfig:
@@ -0,0 +1,53 @@
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+
+def build_incidence(rows: Iterable[Sequence[str]], column_index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build a CSR style incidence structure from lists of column IDs, keeping only IDs present in column_index.
+    Duplicate IDs within a row are counted once.
+
+    :param rows: One sequence of column IDs per row, e.g. the HPO terms of each disease.
+    :param column_index: Mapping from column ID to column number, e.g. HPO ID to embedding row.
+    :return: Tuple of (indptr, indices); the columns of row i are indices[indptr[i]:indptr[i + 1]].
+    """
+    indptr, indices = [0], []
+    for row in rows:
+        columns = sorted({column_index[item] for item in row if item in column_index})
+        indices.extend(columns)
+        indptr.append(len(indices))
+    return np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64)
+
+
+def segment_means(
+    matrix: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    fill_value: float = np.nan,
+    block_size: int = 1024,
+) -> np.ndarray:
+    """
+    Average the rows of matrix selected by each CSR segment, i.e. the row-normalised sparse-dense product
+    incidence @ matrix. Segments are processed block_size at a time so only one block of gathered rows is in memory.
+
+    :param matrix: Dense array of shape (n_columns, dimension).
+    :param indptr: CSR row pointer of length n_segments + 1.
+    :param indices: CSR column indices into matrix.
+    :param fill_value: Value of every element of an empty segment.
+    :param block_size: Number of segments averaged per step.
+    :return: float32 array of shape (n_segments, dimension).
+    """
+    n_segments = len(indptr) - 1
+    means = np.full((n_segments, matrix.shape[1]), fill_value, dtype=np.float32)
+    for start in range(0, n_segments, block_size):
+        stop = min(start + block_size, n_segments)
+        counts = np.diff(indptr[start:stop + 1])
+        non_empty = np.flatnonzero(counts)
+        if len(non_empty) == 0:
+            continue
+        gathered = np.asarray(matrix[indices[indptr[start]:indptr[stop]]], dtype=np.float32)
+        offsets = indptr[start:stop][non_empty] - indptr[start]
+        sums = np.add.reduceat(gathered, offsets, axis=0)
+        means[start + non_empty] = sums / counts[non_empty, None]
+    return means
@@ -0,0 +1,234 @@
+import csv
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+"""
+    Runs one Exomiser process, or docker container, per batch file with at most max_concurrent_jobs alive at once.
+    Every process writes stdout and stderr straight into the log file of its batch, so logs stream while the
+    process runs and the scheduler never buffers output. Failed batches are queued again up to max_retries times.
+"""
+
+LOG_DIR_NAME = "exomiser_logs"
+SAMPLE_COSTS_FILE_NAME = "sample_costs.tsv"
+
+
+@dataclass
+class BatchRun:
+    """Outcome of the last attempt at running one batch file."""
+
+    batch_file: Path
+    log_file: Path
+    return_code: int
+    attempts: int
+    wall_time: float
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.return_code == 0
+
+
+@dataclass
+class _RunningBatch:
+    batch_file: Path
+    attempt: int
+    start: float
+    log: object
+
+
+def batch_log_path(log_dir: Path, batch_file: Path) -> Path:
+    return Path(log_dir).joinpath(f"{Path(batch_file).stem}.log")
+
+
+def _launch(
+    batch_file: Path, command: List[str], attempt: int, log_dir: Path
+) -> (subprocess.Popen, _RunningBatch):
+    log = open(batch_log_path(log_dir, batch_file), "ab")
+    try:
+        log.write(f"### attempt {attempt}: {' '.join(str(arg) for arg in command)}\n".encode())
+        log.flush()
+        process = subprocess.Popen(
+            [str(arg) for arg in command], stdout=log, stderr=subprocess.STDOUT, shell=False
+        )
+    except BaseException:
+        log.close()
+        raise
+    return process, _RunningBatch(batch_file, attempt, time.perf_counter(), log)
+
+
+def run_batches(
+    commands: Dict[Path, List[str]],
+    log_dir: Path,
+    max_concurrent_jobs: int = 1,
+    max_retries: int = 0,
+    poll_interval: float = 1.0,
+) -> List[BatchRun]:
+    """
+    Run the command of every batch file as a separate process, keeping up to max_concurrent_jobs running.
+
+    :param commands: Command to run for every batch file, in submission order.
+    :param log_dir: Directory of the per-batch log files, created if missing. Logs of retries are appended.
+    :param max_concurrent_jobs: Maximum number of processes running at once.
+    :param max_retries: Number of times a batch whose process exits non-zero is run again.
+    :param poll_interval: Seconds to wait between checks of the running processes.
+    :return: The outcome of every batch, in submission order.
+    """
+    if max_concurrent_jobs < 1:
+        raise ValueError(f"max_concurrent_jobs must be at least 1, got {max_concurrent_jobs}")
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+    pending = deque((batch_file, 1) for batch_file in commands)
+    running: Dict[subprocess.Popen, _RunningBatch] = {}
+    outcomes: Dict[Path, BatchRun] = {}
+    while pending or running:
+        while pending and len(running) < max_concurrent_jobs:
+            batch_file, attempt = pending.popleft()
+            process, batch = _launch(batch_file, commands[batch_file], attempt, log_dir)
+            running[process] = batch
+        finished = [process for process in running if process.poll() is not None]
+        if not finished:
+            time.sleep(poll_interval)
+            continue
+        for process in finished:
+            batch = running.pop(process)
+            batch.log.close()
+            wall_time = time.perf_counter() - batch.start
+            outcomes[batch.batch_file] = BatchRun(
+                batch.batch_file,
+                batch_log_path(log_dir, batch.batch_file),
+                process.returncode,
+                batch.attempt,
+                wall_time,
+            )
+            print(
+                f"{batch.batch_file.name}: exit code {process.returncode} after {wall_time:.1f}s "
+                f"(attempt {batch.attempt})"
+            )
+            if process.returncode != 0 and batch.attempt <= max_retries:
+                pending.append((batch.batch_file, batch.attempt + 1))
+    return [outcomes[batch_file] for batch_file in commands]
+
+
+def report_failures(batch_runs: List[BatchRun]) -> List[BatchRun]:
+    """Print every batch that failed on its last attempt, returning them."""
+    failures = [batch_run for batch_run in batch_runs if not batch_run.succeeded]
+    for batch_run in failures:
+        reason = batch_run.error or f"exit code {batch_run.return_code}"
+        print(
+            f"{batch_run.batch_file.name} failed with {reason} after "
+            f"{batch_run.attempts} attempt(s), see {batch_run.log_file}"
+        )
+    return failures
+
+
+def batch_samples(batch_file: Path) -> List[str]:
+    """Sample names, the phenopacket file stems, of the commands in a batch file."""
+    samples = []
+    with open(batch_file) as batch:
+        for line in batch:
+            arguments = line.split()
+            if "--sample" in arguments[:-1]:
+                samples.append(Path(arguments[arguments.index("--sample") + 1]).stem)
+    return samples
+
+
+def read_sample_costs(sample_costs_file: Path) -> Dict[str, float]:
+    """Read the sample run times, in seconds, written by write_sample_costs."""
+    with open(sample_costs_file, newline="") as costs:
+        return {row["sample"]: float(row["seconds"]) for row in csv.DictReader(costs, delimiter="\t")}
+
+
+def write_sample_costs(batch_runs: List[BatchRun], sample_costs_file: Path) -> Dict[str, float]:
+    """
+    Record the run time of every sample of the successful batches, for balancing the batch files of a later run.
+    Exomiser does not time samples, so the wall time of a batch is split evenly over its samples. Run times of
+    samples not in batch_runs are kept from the existing file.
+
+    :param batch_runs: Outcomes of the batch files.
+    :param sample_costs_file: TSV with the columns sample and seconds, updated in place.
+    :return: Run time of every recorded sample.
+    """
+    sample_costs = read_sample_costs(sample_costs_file) if Path(sample_costs_file).exists() else {}
+    for batch_run in batch_runs:
+        if not batch_run.succeeded or not Path(batch_run.batch_file).is_file():
+            continue
+        samples = batch_samples(batch_run.batch_file)
+        for sample in samples:
+            sample_costs[sample] = batch_run.wall_time / len(samples)
+    Path(sample_costs_file).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(sample_costs_file).with_name(f".{Path(sample_costs_file).name}.tmp")
+    with open(tmp_path, "w", newline="") as costs:
+        writer = csv.writer(costs, delimiter="\t")
+        writer.writerow(["sample", "seconds"])
+        writer.writerows(sorted(sample_costs.items()))
+    tmp_path.replace(sample_costs_file)
+    return sample_costs
+
+
+def _run_container_attempt(
+    start_container: Callable[[Path], object], batch_file: Path, log_file: Path, attempt: int
+) -> (int, Optional[str]):
+    """Run one container for a batch file, returning its exit code, or -1 and the error if docker raised."""
+    with open(log_file, "ab") as log:
+        log.write(f"### attempt {attempt}: {Path(batch_file).name}\n".encode())
+        try:
+            container = start_container(batch_file)
+            for chunk in container.logs(stream=True, follow=True):
+                log.write(chunk)
+            return container.wait()["StatusCode"], None
+        except Exception as error:
+            log.write(f"\n### {error!r}\n".encode())
+            return -1, repr(error)
+
+
+def _run_container(
+    start_container: Callable[[Path], object], batch_file: Path, log_dir: Path, max_retries: int = 0
+) -> BatchRun:
+    log_file = batch_log_path(log_dir, batch_file)
+    attempt = 0
+    while True:
+        attempt += 1
+        start = time.perf_counter()
+        return_code, error = _run_container_attempt(start_container, batch_file, log_file, attempt)
+        wall_time = time.perf_counter() - start
+        print(
+            f"{Path(batch_file).name}: {error or f'exit code {return_code}'} after {wall_time:.1f}s "
+            f"(attempt {attempt})"
+        )
+        if return_code == 0 or attempt > max_retries:
+            return BatchRun(Path(batch_file), log_file, return_code, attempt, wall_time, error)
+
+
+def run_containers(
+    start_container: Callable[[Path], object],
+    batch_files: List[Path],
+    log_dir: Path,
+    max_concurrent_jobs: int = 1,
+    max_retries: int = 0,
+) -> List[BatchRun]:
+    """
+    Run one container per batch file, keeping up to max_concurrent_jobs running. Every container is followed by
+    its own thread, which copies the container logs into the batch log file and waits for the exit code, so a
+    chatty container never holds up the others. A batch whose container exits non-zero, or fails to start or to
+    report its exit code, is recorded as failed without affecting the other batches.
+
+    :param start_container: Starts the detached container of a batch file and returns it.
+    :param batch_files: Batch files, in submission order.
+    :param log_dir: Directory of the per-batch log files, created if missing. Logs of retries are appended.
+    :param max_concurrent_jobs: Maximum number of containers running at once.
+    :param max_retries: Number of times a failed batch is run again.
+    :return: The outcome of every batch, in submission order.
+    """
+    if max_concurrent_jobs < 1:
+        raise ValueError(f"max_concurrent_jobs must be at least 1, got {max_concurrent_jobs}")
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max_concurrent_jobs) as executor:
+        futures = [
+            executor.submit(_run_container, start_container, batch_file, log_dir, max_retries)
+            for batch_file in batch_files
+        ]
+        return [future.result() for future in futures]
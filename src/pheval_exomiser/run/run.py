@@ -1,5 +1,4 @@
 import os
-import subprocess
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -18,6 +17,14 @@ from pheval_exomiser.constants import (
 )
 from pheval_exomiser.prepare.create_batch_commands import create_batch_file
 from pheval_exomiser.prepare.tool_specific_configuration_options import ExomiserConfigurations
+from pheval_exomiser.run.batch_scheduler import (
+    LOG_DIR_NAME,
+    SAMPLE_COSTS_FILE_NAME,
+    report_failures,
+    run_batches,
+    run_containers,
+    write_sample_costs,
+)
 
 
 def prepare_batch_files(
@@ -43,6 +50,9 @@ def prepare_batch_files(
         output_options_dir=None,
         results_dir=raw_results_dir,
         variant_analysis=variant_analysis,
+        n_batches=config.balanced_batches,
+        n_workers=config.prepare_workers,
+        sample_costs_file=config.sample_costs_file,
     )
 
 
@@ -100,7 +110,7 @@ def run_exomiser_local(
     tool_input_commands_dir: Path,
     exomiser_version: str,
 ) -> None:
-    """Run Exomiser locally."""
+    """Run Exomiser locally, running up to max_concurrent_jobs batch files at once."""
     print("...running exomiser...")
     os.chdir(output_dir)
     batch_files = [
@@ -114,19 +124,27 @@ def run_exomiser_local(
         if filename.name.endswith(".jar")
     ][0]
     exomiser_jar_file_path = config.exomiser_software_directory.joinpath(exomiser_jar_file)
-    for file in batch_files:
-        subprocess.run(
-            [
-                "java",
-                "-Xmx4g",
-                "-jar",
-                exomiser_jar_file_path,
-                "--batch",
-                file,
-                f"--spring.config.location={Path(input_dir).joinpath('application.properties')}",
-            ],
-            shell=False,
-        )
+    commands = {
+        file: [
+            "java",
+            f"-Xmx{config.java_heap}",
+            "-jar",
+            exomiser_jar_file_path,
+            "--batch",
+            file,
+            f"--spring.config.location={Path(input_dir).joinpath('application.properties')}",
+        ]
+        for file in batch_files
+    }
+    log_dir = Path(output_dir).joinpath(LOG_DIR_NAME)
+    batch_runs = run_batches(
+        commands,
+        log_dir=log_dir,
+        max_concurrent_jobs=config.max_concurrent_jobs,
+        max_retries=config.max_retries,
+    )
+    report_failures(batch_runs)
+    write_sample_costs(batch_runs, log_dir.joinpath(SAMPLE_COSTS_FILE_NAME))
     if version.parse(exomiser_version) < version.parse("13.1.0"):
         os.rename(
             f"{output_dir}/results",
@@ -150,8 +168,13 @@ def run_exomiser_docker(
     raw_results_dir: Path,
     exomiser_version: str,
     variant_analysis: bool,
+    output_dir: Path = None,
+    max_concurrent_jobs: int = 1,
+    cpus: float = None,
+    mem_limit: str = None,
+    max_retries: int = 0,
 ):
-    """Run Exomiser with docker."""
+    """Run Exomiser with docker, running up to max_concurrent_jobs batch files in separate containers."""
     print("...running exomiser...")
     client = docker.from_env()
     batch_files = [
@@ -159,29 +182,43 @@ def run_exomiser_docker(
         for file in all_files(tool_input_commands_dir)
         if file.name.startswith(Path(testdata_dir).name)
     ]
-    for file in batch_files:
-        docker_command = create_docker_run_command(file)
-        docker_mounts = mount_docker(
-            input_dir, testdata_dir, tool_input_commands_dir, raw_results_dir, variant_analysis
-        )
-        vol = [
-            docker_mounts.vcf_test_data,
-            docker_mounts.phenopacket_test_data,
-            docker_mounts.exomiser_data_dir,
-            docker_mounts.exomiser_yaml,
-            docker_mounts.tool_input_commands_path,
-            docker_mounts.exomiser_application_properties,
-            docker_mounts.raw_results_dir,
-        ]
-        container = client.containers.run(
+    docker_mounts = mount_docker(
+        input_dir, testdata_dir, tool_input_commands_dir, raw_results_dir, variant_analysis
+    )
+    vol = [
+        docker_mounts.vcf_test_data,
+        docker_mounts.phenopacket_test_data,
+        docker_mounts.exomiser_data_dir,
+        docker_mounts.exomiser_yaml,
+        docker_mounts.tool_input_commands_path,
+        docker_mounts.exomiser_application_properties,
+        docker_mounts.raw_results_dir,
+    ]
+    limits = {}
+    if cpus is not None:
+        limits["nano_cpus"] = int(cpus * 1e9)
+    if mem_limit is not None:
+        limits["mem_limit"] = mem_limit
+
+    def start_container(batch_file: Path):
+        return client.containers.run(
             f"exomiser/exomiser-cli:{exomiser_version}",
-            " ".join(docker_command),
+            " ".join(create_docker_run_command(batch_file)),
             volumes=[x for x in vol if x is not None],
             detach=True,
+            **limits,
         )
-        for line in container.logs(stream=True):
-            print(line.strip())
-        break
+
+    log_dir = Path(output_dir or raw_results_dir).joinpath(LOG_DIR_NAME)
+    batch_runs = run_containers(
+        start_container,
+        batch_files,
+        log_dir=log_dir,
+        max_concurrent_jobs=max_concurrent_jobs,
+        max_retries=max_retries,
+    )
+    report_failures(batch_runs)
+    write_sample_costs(batch_runs, log_dir.joinpath(SAMPLE_COSTS_FILE_NAME))
 
 
 def run_exomiser(
@@ -204,4 +241,9 @@ def run_exomiser(
         raw_results_dir,
         exomiser_version,
         variant_analysis,
+        output_dir=output_dir,
+        max_concurrent_jobs=config.max_concurrent_jobs,
+        cpus=config.docker_cpus,
+        mem_limit=config.docker_memory,
+        max_retries=config.max_retries,
     )
@@ -1,12 +1,17 @@
 """Exomiser Runner"""
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
 from typing import List, Any
 
 from pheval.post_processing.post_processing import generate_pheval_result, PhEvalDiseaseResult
 from pheval.utils.file_utils import all_files
 
+from pheval_exomiser.post_process.pheval_result_dataset import compact_pheval_result_dataset, dataset_path
+from pheval_exomiser.post_process.post_process_results_format import write_standardised_result
 from pheval_exomiser.prepare.simple_service import SimpleService
 from pheval.runners.runner import PhEvalRunner
 from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
@@ -56,22 +61,58 @@ class ElderPhEvalRunner(PhEvalRunner):
         path = Path("/Users/carlo/Carlo/pheval/pheval/corpora/lirical/default/phenopackets")
         file_list = all_files(path)
         print(f"Processing {len(file_list)} files...")
-        for i, file_path in enumerate(file_list, start=1):
-            print(f"Processing file {i}: {file_path}")  # Print the file being processed
-            self.current_file_name = file_path.stem
-            print(f"self.current file name  = {self.current_file_name}")
-            phenopacket = phenopacket_reader(file_path)
-            phenopacket_util = PhenopacketUtil(phenopacket)
-            observed_phenotypes = phenopacket_util.observed_phenotypic_features()
-            observed_phenotypes_hpo_ids = [
-                observed_phenotype.type.id for observed_phenotype in observed_phenotypes
-            ]
-            if self.simple_runner is not None:
-                self.results = self.simple_runner.run_analysis(observed_phenotypes_hpo_ids)
+        if self.simple_runner is None:
+            print("Main system is not initialized")
+            return
+        file_names = [file_path.stem for file_path in file_list]
+        if self.config.n_workers == 1:
+            hpo_lists = []
+            for i, file_path in enumerate(file_list, start=1):
+                print(f"Reading file {i}: {file_path}")
+                hpo_lists.append(self.observed_phenotype_ids(file_path))
+            rankings = self.simple_runner.run_analysis_batch(hpo_lists)
+            for file_name, results in zip(file_names, rankings):
+                self.current_file_name = file_name
+                print(f"self.current file name  = {self.current_file_name}")
+                self.results = results
                 print("Running with custom pheval runner")
                 self.postpost_process()  # Call post_process here for each file
-            else:
-                print("Main system is not initialized")
+        else:
+            self.run_parallel(file_list, file_names)
+        if self.config.output_format == "parquet":
+            compact_pheval_result_dataset(self.output_dir)
+        print(f"Patient query cache: {self.simple_runner.query_cache.stats}")
+
+    def run_parallel(self, file_list: List[Path], file_names: List[str], block_size: int = 256):
+        """
+        Runs the phenopackets on n_workers cores: phenopackets are parsed by a process pool, ranked block_size at a
+        time by the shared read-only ranking engine in this process and written by a thread pool while the next
+        block is ranked. Ranking starts as soon as the first block is parsed, and results are consumed in input
+        order, so output is deterministic.
+        """
+        n_workers = self.config.n_workers
+        print(f"Reading {len(file_list)} phenopackets with {n_workers} workers")
+        chunksize = max(1, min(block_size, len(file_list)) // (n_workers * 4))
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=n_workers) as parser, ThreadPoolExecutor(max_workers=n_workers) as writer:
+            hpo_lists = parser.map(self.observed_phenotype_ids, file_list, chunksize=chunksize)
+            file_names = iter(file_names)
+            for block in iter(lambda: list(islice(hpo_lists, block_size)), []):
+                rankings = self.simple_runner.run_analysis_batch(block, block_size=block_size)
+                for file_name, results in zip(islice(file_names, len(block)), rankings):
+                    # bound the rankings held in memory by writes that have not finished yet
+                    if len(pending) >= 2 * n_workers:
+                        pending.popleft().result()
+                    pending.append(writer.submit(self.write_disease_results, file_name, results))
+            while pending:
+                pending.popleft().result()
+
+    @staticmethod
+    def observed_phenotype_ids(phenopacket_path: Path) -> List[str]:
+        phenopacket = phenopacket_reader(phenopacket_path)
+        phenopacket_util = PhenopacketUtil(phenopacket)
+        observed_phenotypes = phenopacket_util.observed_phenotypic_features()
+        return [observed_phenotype.type.id for observed_phenotype in observed_phenotypes]
 
     def post_process(self):
         print("i do i do u do")
@@ -79,9 +120,24 @@ class ElderPhEvalRunner(PhEvalRunner):
     def postpost_process(self):
         """post_process"""
         print("post processing")
-        if self.input_dir_config.disease_analysis and self.results:
-            disease_results = self.create_disease_results(self.results)
-            output_file_name = f"{self.current_file_name}_disease_results.tsv"
+        self.write_disease_results(self.current_file_name, self.results)
+
+    def write_disease_results(self, file_name: str, results: List[Any]):
+        """Writes the PhEval disease result of one phenopacket; safe to call from several threads."""
+        if self.input_dir_config.disease_analysis and results:
+            disease_results = self.create_disease_results(results)
+            if self.config.output_format == "parquet":
+                write_standardised_result(
+                    disease_results,
+                    "disease",
+                    self.config.post_process.sort_order,
+                    self.output_dir,
+                    Path(f"{file_name}.parquet"),
+                    output_format="parquet",
+                )
+                print(f"generated pheval results for {file_name} in {dataset_path(self.output_dir)}")
+                return
+            output_file_name = f"{file_name}_disease_results.tsv"
             generate_pheval_result(
                 pheval_result=disease_results,
                 sort_order_str=self.config.post_process.sort_order,
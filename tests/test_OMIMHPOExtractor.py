@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_exomiser.prepare.core.OMIMHPOExtractor import OMIMHPOExtractor
+
+hpoa = (
+    "#description: HPO annotations for rare diseases\n"
+    "#date: 2023-04-05\n"
+    "database_id\tdisease_name\tqualifier\thpo_id\treference\tevidence\tonset\tfrequency\tsex\tmodifier\taspect"
+    "\tbiocuration\n"
+    "OMIM:100050\tAarskog syndrome\t\tHP:0000175\tOMIM:100050\tIEA\t\t\t\t\tP\tHPO:iea[2009-02-17]\n"
+    "OMIM:100050\tAarskog syndrome\t\tHP:0000007\tOMIM:100050\tIEA\t\t\t\t\tI\tHPO:iea[2009-02-17]\n"
+    "OMIM:100050\tAarskog syndrome\tNOT\tHP:0001249\tOMIM:100050\tIEA\t\t\t\t\tP\tHPO:iea[2009-02-17]\n"
+    "OMIM:100050\tAarskog syndrome\t\tHP:0000175\tPMID:1234\tPCS\t\t\t\t\tP\tHPO:probinson[2012-04-24]\n"
+    "ORPHA:166024\tMulticentric osteolysis\t\tHP:0002652\tORPHA:166024\tTAS\t\t\t\t\tP\tORPHA:orphadata\n"
+)
+
+
+class TestOMIMHPOExtractor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.hpoa_path = Path(self.tmp_dir.name).joinpath("phenotype.hpoa")
+        self.hpoa_path.write_text(hpoa)
+        self.filters = dict(database_prefixes=["OMIM"], aspects=["P"], exclude_not=True)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_iter_annotations(self):
+        self.assertEqual(len(list(OMIMHPOExtractor.iter_annotations(self.hpoa_path))), 5)
+
+    def test_iter_annotations_filtered(self):
+        self.assertEqual(
+            list(OMIMHPOExtractor.iter_annotations(self.hpoa_path, **self.filters)),
+            [("OMIM:100050", "HP:0000175"), ("OMIM:100050", "HP:0000175")],
+        )
+
+    def test_extract_omim_hpo_mappings_from_file(self):
+        self.assertEqual(
+            OMIMHPOExtractor.extract_omim_hpo_mappings_from_file(self.hpoa_path),
+            {
+                "OMIM:100050": ["HP:0000175", "HP:0000007", "HP:0001249"],
+                "ORPHA:166024": ["HP:0002652"],
+            },
+        )
+
+    def test_matches_extract_omim_hpo_mappings(self):
+        streamed = OMIMHPOExtractor.extract_omim_hpo_mappings_from_file(self.hpoa_path)
+        parsed = OMIMHPOExtractor.extract_omim_hpo_mappings(hpoa)
+        self.assertEqual(
+            {disease: sorted(hpo_ids) for disease, hpo_ids in streamed.items()},
+            {disease: sorted(hpo_ids) for disease, hpo_ids in parsed.items()},
+        )
+
+    def test_load_omim_hpo_mappings_cached(self):
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        parsed = OMIMHPOExtractor.load_omim_hpo_mappings(self.hpoa_path, cache_dir=cache_dir, **self.filters)
+        self.assertEqual(parsed, {"OMIM:100050": ["HP:0000175"]})
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertEqual(
+            OMIMHPOExtractor.load_omim_hpo_mappings(self.hpoa_path, cache_dir=cache_dir, **self.filters), parsed
+        )
+        unfiltered = OMIMHPOExtractor.load_omim_hpo_mappings(self.hpoa_path, cache_dir=cache_dir)
+        self.assertEqual(len(unfiltered), 2)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
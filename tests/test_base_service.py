@@ -0,0 +1,54 @@
+import unittest
+
+from pheval_exomiser.prepare.core.base_service import BaseService
+
+
+class DummyCollection:
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+
+    def get(self, include, limit, offset):
+        ids = list(self.metadatas)[offset:offset + limit]
+        return {"ids": ids, "metadatas": [self.metadatas[disease] for disease in ids]}
+
+
+class DummyService(BaseService):
+    def __init__(self, disease_to_hps_from_omim):
+        self.disease_to_hps_from_omim = disease_to_hps_from_omim
+
+    def process_data(self):
+        pass
+
+    def upsert_batch(self, batch):
+        pass
+
+
+class TestBaseService(unittest.TestCase):
+    def setUp(self) -> None:
+        self.service = DummyService(
+            {
+                "OMIM:1": ["HP:0000001", "HP:0000002"],
+                "OMIM:2": ["HP:0000003"],
+                "OMIM:3": ["HP:0000004"],
+            }
+        )
+        self.collection = DummyCollection(
+            {
+                "OMIM:1": self.service.disease_metadata("OMIM:1"),
+                "OMIM:2": {"type": "disease", "terms_hash": BaseService.terms_hash(["HP:0000005"])},
+                "OMIM:4": self.service.disease_metadata("OMIM:1"),
+                "OMIM:5": None,
+            }
+        )
+
+    def test_terms_hash_ignores_order_and_duplicates(self):
+        self.assertEqual(
+            BaseService.terms_hash(["HP:0000002", "HP:0000001", "HP:0000001"]),
+            BaseService.terms_hash(["HP:0000001", "HP:0000002"]),
+        )
+        self.assertNotEqual(BaseService.terms_hash(["HP:0000001"]), BaseService.terms_hash(["HP:0000002"]))
+
+    def test_annotation_diff(self):
+        changed, removed = self.service.annotation_diff(self.collection, page_size=3)
+        self.assertEqual(changed, ["OMIM:2", "OMIM:3"])
+        self.assertEqual(removed, ["OMIM:4", "OMIM:5"])
@@ -0,0 +1,245 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from pheval_exomiser.run.batch_scheduler import (
+    BatchRun,
+    batch_log_path,
+    batch_samples,
+    read_sample_costs,
+    report_failures,
+    run_batches,
+    run_containers,
+    write_sample_costs,
+)
+
+
+class TestRunBatches(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_dir = Path(self.tmp_dir.name).joinpath("logs")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def python_command(self, code: str) -> [str]:
+        return [sys.executable, "-c", code]
+
+    def test_runs_all_batches_and_writes_logs(self):
+        commands = {
+            Path(f"batch_{i}.txt"): self.python_command(
+                f"import sys; print('out {i}'); print('err {i}', file=sys.stderr)"
+            )
+            for i in range(4)
+        }
+        batch_runs = run_batches(commands, self.log_dir, max_concurrent_jobs=2, poll_interval=0.01)
+        self.assertEqual([batch_run.batch_file for batch_run in batch_runs], list(commands))
+        self.assertTrue(
+            all(batch_run.succeeded and batch_run.attempts == 1 for batch_run in batch_runs)
+        )
+        log = batch_log_path(self.log_dir, Path("batch_2.txt")).read_text()
+        self.assertIn("out 2", log)
+        self.assertIn("err 2", log)
+
+    def test_runs_batches_concurrently(self):
+        marker_dir = Path(self.tmp_dir.name)
+        # each process waits until the other one has started, which only finishes if both run at once
+        code = (
+            "import pathlib, sys, time\n"
+            f"d = pathlib.Path({str(marker_dir)!r})\n"
+            "d.joinpath(sys.argv[1]).touch()\n"
+            "deadline = time.time() + 10\n"
+            "while len(list(d.glob('started_*'))) < 2 and time.time() < deadline:\n"
+            "    time.sleep(0.01)\n"
+            "sys.exit(0 if len(list(d.glob('started_*'))) == 2 else 1)\n"
+        )
+        commands = {
+            Path(f"batch_{i}.txt"): [sys.executable, "-c", code, f"started_{i}"] for i in range(2)
+        }
+        batch_runs = run_batches(commands, self.log_dir, max_concurrent_jobs=2, poll_interval=0.01)
+        self.assertTrue(all(batch_run.succeeded for batch_run in batch_runs))
+
+    def test_retries_failed_batches(self):
+        counter = Path(self.tmp_dir.name).joinpath("counter")
+        code = (
+            "import pathlib, sys\n"
+            f"p = pathlib.Path({str(counter)!r})\n"
+            "n = int(p.read_text()) if p.exists() else 0\n"
+            "p.write_text(str(n + 1))\n"
+            "sys.exit(0 if n >= 1 else 3)\n"
+        )
+        commands = {
+            Path("flaky.txt"): self.python_command(code),
+            Path("broken.txt"): self.python_command("raise SystemExit(2)"),
+        }
+        batch_runs = run_batches(
+            commands, self.log_dir, max_concurrent_jobs=1, max_retries=2, poll_interval=0.01
+        )
+        flaky, broken = batch_runs
+        self.assertTrue(flaky.succeeded)
+        self.assertEqual(flaky.attempts, 2)
+        self.assertEqual(broken.return_code, 2)
+        self.assertEqual(broken.attempts, 3)
+        self.assertEqual(broken.log_file.read_text().count("### attempt"), 3)
+        self.assertEqual(report_failures(batch_runs), [broken])
+
+    def test_closes_log_when_launch_fails(self):
+        opened = []
+
+        def tracking_open(*args, **kwargs):
+            opened.append(open(*args, **kwargs))
+            return opened[-1]
+
+        with patch("pheval_exomiser.run.batch_scheduler.open", tracking_open, create=True):
+            with self.assertRaises(OSError):
+                run_batches({Path("batch_0.txt"): [self.log_dir.joinpath("missing-executable")]}, self.log_dir)
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+    def test_rejects_no_concurrency(self):
+        with self.assertRaises(ValueError):
+            run_batches({}, self.log_dir, max_concurrent_jobs=0)
+
+
+class FakeContainer:
+    def __init__(self, chunks: [bytes], status_code: int, release: threading.Event = None):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.release = release
+
+    def logs(self, stream: bool, follow: bool):
+        for chunk in self.chunks:
+            yield chunk
+        if self.release is not None:
+            self.release.wait(10)
+
+    def wait(self):
+        return {"StatusCode": self.status_code}
+
+
+class TestRunContainers(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_dir = Path(self.tmp_dir.name).joinpath("logs")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_runs_every_batch_file(self):
+        status_codes = {"batch_0.txt": 0, "batch_1.txt": 1, "batch_2.txt": 0}
+        batch_runs = run_containers(
+            lambda batch_file: FakeContainer(
+                [b"running ", batch_file.name.encode()], status_codes[batch_file.name]
+            ),
+            [Path(name) for name in status_codes],
+            self.log_dir,
+            max_concurrent_jobs=2,
+        )
+        self.assertEqual([batch_run.return_code for batch_run in batch_runs], [0, 1, 0])
+        self.assertEqual(
+            batch_log_path(self.log_dir, Path("batch_1.txt")).read_text(),
+            "### attempt 1: batch_1.txt\nrunning batch_1.txt",
+        )
+        self.assertEqual(
+            [failure.batch_file for failure in report_failures(batch_runs)], [Path("batch_1.txt")]
+        )
+
+    def test_slow_container_does_not_block_others(self):
+        release = threading.Event()
+        started = []
+
+        def start_container(batch_file: Path):
+            started.append(batch_file)
+            if batch_file.name == "slow.txt":
+                return FakeContainer([b"slow"], 0, release)
+            if len(started) == 3:
+                release.set()
+            return FakeContainer([b"fast"], 0)
+
+        batch_runs = run_containers(
+            start_container,
+            [Path("slow.txt"), Path("fast_0.txt"), Path("fast_1.txt")],
+            self.log_dir,
+            max_concurrent_jobs=2,
+        )
+        self.assertTrue(release.is_set())
+        self.assertTrue(all(batch_run.succeeded for batch_run in batch_runs))
+
+    def test_docker_errors_are_recorded_per_batch(self):
+        class FailingContainer(FakeContainer):
+            def wait(self):
+                raise RuntimeError("connection reset")
+
+        def start_container(batch_file: Path):
+            if batch_file.name == "no_image.txt":
+                raise RuntimeError("image not found")
+            if batch_file.name == "lost.txt":
+                return FailingContainer([b"lost"], 0)
+            return FakeContainer([b"ok"], 0)
+
+        batch_runs = run_containers(
+            start_container,
+            [Path("no_image.txt"), Path("ok.txt"), Path("lost.txt")],
+            self.log_dir,
+            max_concurrent_jobs=2,
+        )
+        self.assertEqual([batch_run.return_code for batch_run in batch_runs], [-1, 0, -1])
+        self.assertIn("image not found", batch_runs[0].error)
+        self.assertIn("connection reset", batch_log_path(self.log_dir, Path("lost.txt")).read_text())
+        self.assertEqual(
+            [failure.batch_file for failure in report_failures(batch_runs)],
+            [Path("no_image.txt"), Path("lost.txt")],
+        )
+
+    def test_retries_failed_containers(self):
+        attempts = []
+
+        def start_container(batch_file: Path):
+            attempts.append(batch_file)
+            if len(attempts) == 1:
+                raise RuntimeError("daemon busy")
+            return FakeContainer([b"retry"], 1 if len(attempts) == 2 else 0)
+
+        [batch_run] = run_containers(start_container, [Path("batch_0.txt")], self.log_dir, max_retries=2)
+        self.assertTrue(batch_run.succeeded)
+        self.assertEqual(batch_run.attempts, 3)
+        self.assertEqual(batch_log_path(self.log_dir, Path("batch_0.txt")).read_text().count("### attempt"), 3)
+
+
+class TestSampleCosts(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.batch_files = []
+        for batch, samples in enumerate([["a", "b"], ["c"]], start=1):
+            batch_file = self.tmp_path.joinpath(f"RUN-exomiser-batch-{batch}.txt")
+            batch_file.write_text(
+                "".join(
+                    f"--sample /path/to/{sample}.json --output-directory /results --preset phenotype-only\n"
+                    for sample in samples
+                )
+            )
+            self.batch_files.append(batch_file)
+        self.sample_costs_file = self.tmp_path.joinpath("logs", "sample_costs.tsv")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_batch_samples(self):
+        self.assertEqual(batch_samples(self.batch_files[0]), ["a", "b"])
+
+    def test_write_sample_costs(self):
+        batch_runs = [
+            BatchRun(self.batch_files[0], Path("batch_1.log"), 0, 1, 10.0),
+            BatchRun(self.batch_files[1], Path("batch_2.log"), 1, 1, 3.0),
+        ]
+        self.assertEqual(write_sample_costs(batch_runs, self.sample_costs_file), {"a": 5.0, "b": 5.0})
+        self.assertEqual(read_sample_costs(self.sample_costs_file), {"a": 5.0, "b": 5.0})
+
+    def test_write_sample_costs_keeps_earlier_samples(self):
+        write_sample_costs([BatchRun(self.batch_files[0], Path("batch_1.log"), 0, 1, 10.0)], self.sample_costs_file)
+        write_sample_costs([BatchRun(self.batch_files[1], Path("batch_2.log"), 0, 1, 3.0)], self.sample_costs_file)
+        self.assertEqual(read_sample_costs(self.sample_costs_file), {"a": 5.0, "b": 5.0, "c": 3.0})
@@ -0,0 +1,63 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pheval_exomiser.post_process.benchmark import compare_ranks, rank_diagnoses, summarise_ranks
+
+diagnoses = pd.DataFrame(
+    {
+        "phenopacket": ["p1.json", "p2.json", "p3.json"],
+        "sample": ["p1", "p2", "p3"],
+        "disease_identifier": ["OMIM:231670", "OMIM:209900", "OMIM:113620"],
+        "disease_name": ["Glutaricaciduria, type I", "Bardet-Biedl syndrome 1", "Branchiooculofacial syndrome"],
+    }
+)
+disease_results = pd.DataFrame(
+    {
+        "sample": ["p1", "p1", "p2", "p2", "p3"],
+        "rank": [1.0, 2.0, 1.0, 4.0, 1.0],
+        "disease_identifier": ["OMIM:231670", "OMIM:209900", "ORPHA:110", "ORPHA:111", "OMIM:231670"],
+        "disease_name": ["Glutaricaciduria, type I", "x", "y", "Bardet-Biedl syndrome 1", "z"],
+    }
+)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_rank_diagnoses(self):
+        self.assertEqual(rank_diagnoses(diagnoses, disease_results).tolist(), [1, 4, 0])
+
+    def test_rank_diagnoses_no_results(self):
+        self.assertEqual(rank_diagnoses(diagnoses, disease_results.head(0)).tolist(), [0, 0, 0])
+
+    def test_summarise_ranks(self):
+        ranks = np.array([[1, 2], [4, 0], [0, 11]])
+        summary = summarise_ranks(ranks, [Path("exomiser_results"), Path("elder_results")])
+        self.assertEqual(summary["top"].tolist(), [1, 0])
+        self.assertEqual(summary["top3"].tolist(), [1, 1])
+        self.assertEqual(summary["top5"].tolist(), [2, 1])
+        self.assertEqual(summary["top10"].tolist(), [2, 1])
+        self.assertEqual(summary["found"].tolist(), [2, 2])
+        self.assertEqual(summary["total"].tolist(), [3, 3])
+        self.assertAlmostEqual(summary["mean_reciprocal_rank"][0], (1 + 1 / 4) / 3)
+        self.assertAlmostEqual(summary["mean_reciprocal_rank"][1], (1 / 2 + 1 / 11) / 3)
+        self.assertAlmostEqual(summary["percentage_found"][0], 200 / 3)
+
+    def test_compare_ranks(self):
+        ranks = np.array([[1, 2], [4, 0], [0, 11]])
+        comparison = compare_ranks(
+            diagnoses, ranks, [Path("/data/exomiser_results"), Path("/data/elder_results")], 0, 1
+        )
+        self.assertEqual(
+            list(comparison.columns),
+            [
+                "Phenopacket",
+                "Disease",
+                "/data/exomiser_results/pheval_disease_results",
+                "/data/elder_results/pheval_disease_results",
+                "rank_decrease",
+            ],
+        )
+        self.assertEqual(comparison["rank_decrease"].tolist(), [1, -4, 11])
+        self.assertEqual(comparison.index.tolist(), [1, 2, 3])
@@ -0,0 +1,67 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import networkx as nx
+
+from pheval_exomiser.prepare.core.closure_index import ClosureIndex
+
+#   HP:0000001
+#       |
+#   HP:0000118
+#    /      \
+# HP:0000478  HP:0000152
+#    \      /     |
+#   HP:0001098  HP:0000234
+hpo_graph = nx.DiGraph(
+    [
+        ("HP:0000001", "HP:0000118"),
+        ("HP:0000118", "HP:0000478"),
+        ("HP:0000118", "HP:0000152"),
+        ("HP:0000478", "HP:0001098"),
+        ("HP:0000152", "HP:0001098"),
+        ("HP:0000152", "HP:0000234"),
+    ]
+)
+
+
+class TestClosureIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.closure_index = ClosureIndex.from_graph(hpo_graph)
+
+    def test_ancestors(self):
+        self.assertEqual(
+            self.closure_index.ancestors("HP:0001098"), ["HP:0000001", "HP:0000118", "HP:0000152", "HP:0000478"]
+        )
+        self.assertEqual(self.closure_index.ancestors("HP:0000001"), [])
+        self.assertEqual(self.closure_index.ancestors("HP:9999999"), [])
+
+    def test_ancestors_match_networkx(self):
+        for node in hpo_graph.nodes():
+            self.assertEqual(set(self.closure_index.ancestors(node)), nx.ancestors(hpo_graph, node))
+
+    def test_include_self(self):
+        closure_index = ClosureIndex.from_graph(hpo_graph, include_self=True)
+        self.assertEqual(closure_index.ancestors("HP:0000118"), ["HP:0000001", "HP:0000118"])
+        self.assertEqual(len(closure_index), len(self.closure_index) + hpo_graph.number_of_nodes())
+
+    def test_is_descendant(self):
+        self.assertTrue(self.closure_index.is_descendant("HP:0001098", "HP:0000152"))
+        self.assertFalse(self.closure_index.is_descendant("HP:0000234", "HP:0000478"))
+        self.assertFalse(self.closure_index.is_descendant("HP:0000152", "HP:0000152"))
+        self.assertFalse(self.closure_index.is_descendant("HP:0000152", "HP:9999999"))
+
+    def test_common_ancestors(self):
+        self.assertEqual(
+            self.closure_index.common_ancestors("HP:0001098", "HP:0000234"),
+            ["HP:0000001", "HP:0000118", "HP:0000152"],
+        )
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir).joinpath("closure_index.npz")
+            self.closure_index.save(path)
+            loaded = ClosureIndex.load(path)
+        self.assertIn("HP:0000234", loaded)
+        self.assertEqual(loaded.ancestors("HP:0000234"), self.closure_index.ancestors("HP:0000234"))
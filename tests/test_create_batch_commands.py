@@ -1,6 +1,8 @@
+import tempfile
 import unittest
 from pathlib import Path
 
+from google.protobuf.json_format import MessageToJson
 from phenopackets import (
     Diagnosis,
     File,
@@ -19,8 +21,11 @@ from phenopackets import (
 )
 
 from pheval_exomiser.prepare.create_batch_commands import (
+    BatchFileWriter,
     CommandCreator,
     ExomiserCommandLineArguments,
+    create_command_arguments,
+    iter_command_arguments,
 )
 
 interpretations = [
@@ -288,3 +293,108 @@ class TestCommandCreator(unittest.TestCase):
                 variant_analysis=False,
             ),
         )
+
+
+class TestBatchFileWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.tmp_dir.name)
+        self.vcf_dir = self.output_dir.joinpath("vcf")
+        self.vcf_dir.mkdir()
+        self.command_arguments_list = []
+        for sample, vcf_size in [("a", 1), ("b", 6), ("c", 2), ("d", 3), ("e", 4)]:
+            self.vcf_dir.joinpath(f"{sample}.vcf").write_bytes(b"0" * vcf_size * 2**20)
+            self.command_arguments_list.append(
+                ExomiserCommandLineArguments(
+                    sample=Path(f"/path/to/{sample}.json"),
+                    vcf_file=Path(f"/exomiser-testdata-vcf/{sample}.vcf"),
+                    vcf_assembly="GRCh37",
+                    analysis_yaml=Path("/path/to/exomiser_analysis.yaml"),
+                    variant_analysis=True,
+                )
+            )
+        self.batch_file_writer = BatchFileWriter(
+            self.command_arguments_list, True, self.output_dir, "RUN", vcf_dir=self.vcf_dir
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def read_batch(self, batch_number: int) -> [str]:
+        return [
+            Path(line.split(" --sample ")[1].split(" ")[0]).stem
+            for line in self.batch_file_writer.split_batch_file_path(batch_number)
+            .read_text()
+            .splitlines()
+        ]
+
+    def test_estimate_costs(self):
+        self.assertEqual(self.batch_file_writer.estimate_costs(), [2.0, 7.0, 3.0, 4.0, 5.0])
+
+    def test_estimate_costs_known_sample(self):
+        self.batch_file_writer.sample_costs = {"b": 0.5}
+        self.assertEqual(self.batch_file_writer.estimate_costs()[1], 0.5)
+
+    def test_estimate_costs_scales_heuristic_to_known_run_times(self):
+        self.batch_file_writer.sample_costs = {"b": 14.0}
+        self.assertEqual(self.batch_file_writer.estimate_costs(), [4.0, 14.0, 6.0, 8.0, 10.0])
+
+    def test_create_balanced_batch_files_from_sample_costs(self):
+        self.batch_file_writer.sample_costs = {"a": 20.0, "b": 1.0, "c": 1.0, "d": 1.0, "e": 1.0}
+        self.assertEqual(self.batch_file_writer.create_balanced_batch_files(2), [20.0, 4.0])
+        self.assertEqual([self.read_batch(i) for i in [1, 2]], [["a"], ["b", "c", "d", "e"]])
+
+    def test_create_split_batch_files(self):
+        self.batch_file_writer.create_split_batch_files(2)
+        self.assertEqual([self.read_batch(i) for i in [1, 2, 3]], [["a", "b"], ["c", "d"], ["e"]])
+
+    def test_create_balanced_batch_files(self):
+        self.assertEqual(self.batch_file_writer.create_balanced_batch_files(2), [10.0, 11.0])
+        self.assertEqual([self.read_batch(i) for i in [1, 2]], [["b", "c"], ["a", "d", "e"]])
+
+    def test_create_balanced_batch_files_more_batches_than_commands(self):
+        self.assertEqual(len(self.batch_file_writer.create_balanced_batch_files(10)), 5)
+        self.assertFalse(self.batch_file_writer.split_batch_file_path(6).exists())
+
+
+class TestIterCommandArguments(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.phenopacket_dir = Path(self.tmp_dir.name)
+        for i in range(5):
+            self.phenopacket_dir.joinpath(f"phenopacket_{i}.json").write_text(
+                MessageToJson(phenopacket)
+            )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_iter_command_arguments(self):
+        command_arguments = list(
+            iter_command_arguments(
+                "local", self.phenopacket_dir, False, None, Path("/path/to/results_dir")
+            )
+        )
+        self.assertEqual(
+            [arguments.sample.name for arguments in command_arguments],
+            [f"phenopacket_{i}.json" for i in range(5)],
+        )
+        self.assertEqual(command_arguments[0].raw_results_dir, Path("/path/to/results_dir"))
+
+    def test_iter_command_arguments_workers(self):
+        self.assertEqual(
+            list(
+                iter_command_arguments(
+                    "local",
+                    self.phenopacket_dir,
+                    False,
+                    None,
+                    Path("/path/to/results_dir"),
+                    n_workers=2,
+                    chunksize=1,
+                )
+            ),
+            create_command_arguments(
+                "local", self.phenopacket_dir, False, None, Path("/path/to/results_dir")
+            ),
+        )
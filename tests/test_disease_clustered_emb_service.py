@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.disease_clustered_emb_service import DiseaseClusteredEmbeddingService
+
+hp_index = {"HP:0000001": 0, "HP:0000002": 1, "HP:0000003": 2}
+hp_matrix = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], dtype=np.float32)
+
+
+class DummyHPOClustering:
+    all_clusters = ["HP:0000152", "HP:0000707", "HP:0000478"]
+    organ_system_map = {
+        "HP:0000001": ("HP:0000707",),
+        "HP:0000002": ("HP:0000707",),
+        "HP:0000003": ("HP:0000478",),
+        "HP:0000004": ("HP:0000152",),
+    }
+
+    def get_organ_system(self, term_id):
+        organ_systems = self.organ_system_map.get(term_id)
+        return organ_systems[0] if organ_systems else None
+
+
+class DummyDataProcessor:
+    hp_embedding_matrix = (hp_index, hp_matrix)
+
+
+class DummyService(DiseaseClusteredEmbeddingService):
+    def __init__(self, disease_to_hps_from_omim):
+        self.data_processor = DummyDataProcessor()
+        self.hpo_clustering = DummyHPOClustering()
+        self.disease_to_hps_from_omim = disease_to_hps_from_omim
+        self.upserted = []
+
+    def upsert_batch(self, batch):
+        self.upserted.extend(batch)
+
+
+class TestDiseaseClusteredEmbeddingService(unittest.TestCase):
+    def setUp(self) -> None:
+        self.service = DummyService(
+            {
+                "OMIM:1": ["HP:0000001", "HP:0000002", "HP:0000003"],
+                "OMIM:2": ["HP:0000003", "HP:0000005"],
+                "OMIM:3": ["HP:0000004", "HP:0000006"],
+            }
+        )
+
+    def test_compute_organ_embedding_matrix(self):
+        embeddings, terms_without_cluster = self.service.compute_organ_embedding_matrix(
+            [self.service.disease_to_hps_from_omim[disease] for disease in ["OMIM:1", "OMIM:2", "OMIM:3"]]
+        )
+        # organ systems in sorted order: HP:0000152, HP:0000478, HP:0000707
+        np.testing.assert_allclose(
+            embeddings,
+            [
+                [-1, -1, 5, 6, 2, 3],
+                [-1, -1, 5, 6, -1, -1],
+                [-1, -1, -1, -1, -1, -1],
+            ],
+        )
+        self.assertEqual(terms_without_cluster, {"HP:0000005", "HP:0000006"})
+
+    def test_compute_organ_embeddings(self):
+        np.testing.assert_allclose(
+            self.service.compute_organ_embeddings(["HP:0000002"]), [-1, -1, -1, -1, 3, 4]
+        )
+
+    def test_upsert_diseases_in_blocks(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                self.service.upsert_diseases(["OMIM:1", "OMIM:2", "OMIM:3"], block_size=2)
+                with open(DiseaseClusteredEmbeddingService.TERMS_WITHOUT_CLUSTER_FILE) as log_file:
+                    self.assertEqual(log_file.read().split(), ["HP:0000005", "HP:0000006"])
+            finally:
+                os.chdir(cwd)
+        self.assertEqual([disease for disease, _ in self.service.upserted], ["OMIM:1", "OMIM:2", "OMIM:3"])
+        self.assertEqual(self.service.upserted[1][1], [-1, -1, 5, 6, -1, -1])
+
+    def test_patient_organ_embeddings(self):
+        organ_embeddings = self.service.patient_organ_embeddings(["HP:0000001", "HP:0000003", "HP:0000005"])
+        self.assertEqual(list(organ_embeddings), ["HP:0000478", "HP:0000707"])
+        np.testing.assert_allclose(organ_embeddings["HP:0000707"], [1, 2])
+
+    def test_build_organ_system_scorer(self):
+        scorer = self.service.build_organ_system_scorer(block_size=2)
+        # OMIM:3 only has HP:0000004, which has no embedding
+        self.assertEqual(scorer.stored_vectors, 3)
+        ranking = scorer.rank(self.service.patient_organ_embeddings(["HP:0000001", "HP:0000002"]))
+        self.assertEqual(ranking[0][0], "OMIM:1")
@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.embedding_store import EmbeddingStore
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.store = EmbeddingStore.build(
+            cls.tmp_dir.name, "ont_hp", ["HP:0000001", "HP:0000118"], [[1.0, 2.0], [3.0, 4.0]]
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp_dir.cleanup()
+
+    def test_exists(self):
+        self.assertTrue(EmbeddingStore.exists(self.tmp_dir.name, "ont_hp"))
+        self.assertFalse(EmbeddingStore.exists(self.tmp_dir.name, "average"))
+
+    def test_load_is_memory_mapped(self):
+        store = EmbeddingStore.load(self.tmp_dir.name, "ont_hp")
+        self.assertIsInstance(store.matrix, np.memmap)
+        self.assertEqual(store.matrix.dtype, np.float32)
+        self.assertEqual(store.dimension, 2)
+
+    def test_mapping_interface(self):
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(list(self.store), ["HP:0000001", "HP:0000118"])
+        self.assertIn("HP:0000118", self.store)
+        self.assertNotIn("HP:0000002", self.store)
+        self.assertEqual(self.store["HP:0000118"]["embeddings"].tolist(), [3.0, 4.0])
+        self.assertIsNone(self.store.get("HP:0000002"))
+
+    def test_rows(self):
+        self.assertEqual(
+            self.store.rows(["HP:0000118", "HP:0000002", "HP:0000001"]).tolist(), [[3.0, 4.0], [1.0, 2.0]]
+        )
+
+    def test_build_mismatched_ids(self):
+        with self.assertRaises(ValueError):
+            EmbeddingStore.build(self.tmp_dir.name, "broken", ["HP:0000001"], [[1.0], [2.0]])
@@ -0,0 +1,68 @@
+import unittest
+
+import networkx as nx
+
+from pheval_exomiser.prepare.core.hpo_clustering import HPOClustering
+
+#          HP:0000001
+#        /     |      \
+#  HP:0000118 HP:0000005 HP:9000000
+#   /    |   \      |        |
+# 152   478  707   006       |
+#  |  \  |  /  \            /
+#  |   1098    1250 -------'   (HP:0000707 is also a subclass of HP:9000000)
+# 271
+edges = [
+    ("HP:0000001", "HP:0000118"),
+    ("HP:0000001", "HP:0000005"),
+    ("HP:0000001", "HP:9000000"),
+    ("HP:0000005", "HP:0000006"),
+    ("HP:0000118", "HP:0000152"),
+    ("HP:0000118", "HP:0000478"),
+    ("HP:0000118", "HP:0000707"),
+    ("HP:9000000", "HP:0000707"),
+    ("HP:0000152", "HP:0000271"),
+    ("HP:0000152", "HP:0001098"),
+    ("HP:0000478", "HP:0001098"),
+    ("HP:0000707", "HP:0001098"),
+    ("HP:0000707", "HP:0001250"),
+]
+
+
+class TestComputeOrganSystemMap(unittest.TestCase):
+    def setUp(self) -> None:
+        self.organ_system_map = HPOClustering.compute_organ_system_map(nx.DiGraph(edges), "HP:0000118")
+
+    def test_descendant_of_one_organ_system(self):
+        self.assertEqual(self.organ_system_map["HP:0000271"], ("HP:0000152",))
+        self.assertEqual(self.organ_system_map["HP:0001250"], ("HP:0000707",))
+
+    def test_root_terms_have_no_organ_system(self):
+        for term in ["HP:0000118", "HP:0000152", "HP:0000478", "HP:0000707"]:
+            self.assertNotIn(term, self.organ_system_map)
+
+    def test_multi_parent_term_primary_ordering(self):
+        # fewest ancestors first, ties broken by ID
+        self.assertEqual(self.organ_system_map["HP:0001098"], ("HP:0000152", "HP:0000478", "HP:0000707"))
+
+    def test_terms_outside_phenotypic_abnormality(self):
+        for term in ["HP:0000001", "HP:0000005", "HP:0000006", "HP:9000000"]:
+            self.assertNotIn(term, self.organ_system_map)
+
+
+class TestHPOClusteringLookup(unittest.TestCase):
+    def setUp(self) -> None:
+        self.hpo_clustering = HPOClustering.__new__(HPOClustering)
+        self.hpo_clustering.organ_system_map = HPOClustering.compute_organ_system_map(
+            nx.DiGraph(edges), "HP:0000118"
+        )
+
+    def test_get_organ_system(self):
+        self.assertEqual(self.hpo_clustering.get_organ_system("HP:0001098"), "HP:0000152")
+        self.assertIsNone(self.hpo_clustering.get_organ_system("HP:0000478"))
+        self.assertIsNone(self.hpo_clustering.get_organ_system("HP:0000006"))
+        self.assertIsNone(self.hpo_clustering.get_organ_system("HP:9999999"))
+
+    def test_get_term_organ_systems(self):
+        self.assertEqual(self.hpo_clustering.get_term_organ_systems("HP:0001250"), ("HP:0000707",))
+        self.assertEqual(self.hpo_clustering.get_term_organ_systems("HP:0000118"), ())
@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import networkx as nx
+
+from pheval_exomiser.prepare.core.closure_index import ClosureIndex
+from pheval_exomiser.prepare.core.ontology_cache import OntologyCache
+
+edges = [("HP:0000001", "HP:0000118"), ("HP:0000118", "HP:0000478"), ("HP:0000478", "HP:0001098")]
+
+
+class TestOntologyCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = OntologyCache(self.tmp_dir.name, url="https://example.org/hp_kgx_tsv.tar.gz")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_source_and_options(self):
+        same = OntologyCache(self.tmp_dir.name, url="https://example.org/hp_kgx_tsv.tar.gz")
+        other_url = OntologyCache(self.tmp_dir.name, url="https://example.org/other.tar.gz")
+        other_options = OntologyCache(
+            self.tmp_dir.name, url="https://example.org/hp_kgx_tsv.tar.gz", options={"include_self": True}
+        )
+        self.assertEqual(self.cache.key, same.key)
+        self.assertNotEqual(self.cache.key, other_url.key)
+        self.assertNotEqual(self.cache.key, other_options.key)
+
+    def test_key_of_local_file_depends_on_content(self):
+        local_file = Path(self.tmp_dir.name).joinpath("edges.tsv")
+        local_file.write_text("subject\tpredicate\tobject\n")
+        first_key = OntologyCache(self.tmp_dir.name, local_path=str(local_file)).key
+        local_file.write_text("subject\tpredicate\tobject\nHP:1\tbiolink:subclass_of\tHP:2\n")
+        self.assertNotEqual(first_key, OntologyCache(self.tmp_dir.name, local_path=str(local_file)).key)
+
+    def test_graph_round_trip(self):
+        self.assertFalse(self.cache.has_graph())
+        self.cache.save_graph(edges)
+        self.assertTrue(self.cache.has_graph())
+        self.assertEqual(self.cache.load_graph(), edges)
+
+    def test_closures_round_trip(self):
+        self.assertFalse(self.cache.has_closures())
+        self.cache.save_closures(ClosureIndex.from_graph(nx.DiGraph(edges)))
+        self.assertTrue(self.cache.has_closures())
+        self.assertEqual(
+            self.cache.load_closures().ancestors("HP:0001098"), ["HP:0000001", "HP:0000118", "HP:0000478"]
+        )
+
+    def test_organ_systems_round_trip(self):
+        self.assertIsNone(self.cache.load_organ_systems())
+        self.cache.save_organ_systems({"HP:0001098": ("HP:0000478",)})
+        self.assertEqual(self.cache.load_organ_systems(), {"HP:0001098": ("HP:0000478",)})
+
+    def test_requires_source(self):
+        with self.assertRaises(ValueError):
+            OntologyCache(self.tmp_dir.name)
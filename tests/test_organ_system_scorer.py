@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.organ_system_scorer import OrganSystemScorer
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+# diseases OMIM:2, OMIM:1, OMIM:3; organ A on OMIM:2 and OMIM:3, organ B on OMIM:1 only
+disease_ids = ["OMIM:2", "OMIM:1", "OMIM:3"]
+organ_tables = {
+    "A": (np.array([0, 2]), np.array([[1.0, 0.0], [0.0, 1.0]])),
+    "B": (np.array([1]), np.array([[1.0, 1.0]])),
+}
+
+
+class TestOrganSystemScorer(unittest.TestCase):
+    def test_cosine_distances(self):
+        scorer = OrganSystemScorer(disease_ids, organ_tables)
+        self.assertEqual(scorer.disease_ids.tolist(), ["OMIM:1", "OMIM:2", "OMIM:3"])
+        distances = scorer.distances({"A": np.array([2.0, 0.0]), "B": np.array([0.0, 3.0])})
+        # OMIM:1 lacks A (distance 1), B cosine similarity 1/sqrt(2); OMIM:2 A similarity 1, lacks B
+        np.testing.assert_allclose(distances, [(1 + 1 - 1 / np.sqrt(2)) / 2, 0.5, 1.0], rtol=1e-6)
+
+    def test_leaves_organ_tables_unchanged(self):
+        matrix = np.array([[3.0, 4.0]], dtype=np.float32)
+        OrganSystemScorer(["OMIM:1"], {"A": (np.array([0]), matrix)})
+        np.testing.assert_array_equal(matrix, [[3.0, 4.0]])
+
+    def test_weights(self):
+        scorer = OrganSystemScorer(disease_ids, organ_tables, weights={"B": 3.0})
+        distances = scorer.distances({"A": np.array([2.0, 0.0]), "B": np.array([0.0, 3.0])})
+        np.testing.assert_allclose(distances, [(1 + 3 * (1 - 1 / np.sqrt(2))) / 4, 0.75, 1.0], rtol=1e-6)
+
+    def test_l2_distances_treat_absent_organ_as_zero_vector(self):
+        scorer = OrganSystemScorer(disease_ids, organ_tables, SimilarityMeasures.L2)
+        distances = scorer.distances({"A": np.array([2.0, 0.0])})
+        np.testing.assert_allclose(distances, [4.0, 1.0, 5.0])
+
+    def test_rank_only_scores_patient_organ_systems(self):
+        scorer = OrganSystemScorer(disease_ids, organ_tables)
+        self.assertEqual(
+            [disease for disease, _ in scorer.rank({"B": np.array([1.0, 0.0])})], ["OMIM:1", "OMIM:2", "OMIM:3"]
+        )
+        self.assertEqual(len(scorer.rank({"A": np.array([0.0, 1.0])}, n_results=1)), 1)
+
+    def test_from_blocks(self):
+        means = np.full((3, 2, 2), np.nan, dtype=np.float32)
+        means[0, 0], means[1, 1], means[2, 0] = [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]
+        present = ~np.isnan(means[:, :, 0])
+        scorer = OrganSystemScorer.from_blocks(
+            disease_ids, ["A", "B"], [(means[:2], present[:2]), (means[2:], present[2:])]
+        )
+        self.assertEqual(scorer.stored_vectors, 3)
+        np.testing.assert_allclose(
+            scorer.distances({"A": np.array([1.0, 0.0])}),
+            OrganSystemScorer(disease_ids, organ_tables).distances({"A": np.array([1.0, 0.0])}),
+        )
+
+    def test_requires_patient_organ_systems(self):
+        with self.assertRaises(ValueError):
+            OrganSystemScorer(disease_ids, organ_tables).distances({})
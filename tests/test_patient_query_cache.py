@@ -0,0 +1,112 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.data_processor import DataProcessor
+from pheval_exomiser.prepare.core.elder import ElderRunner
+from pheval_exomiser.prepare.core.patient_query_cache import PatientQueryCache
+from pheval_exomiser.prepare.core.query_service import QueryService
+from pheval_exomiser.prepare.core.ranking_engine import RankingEngine
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+
+class TestPatientQueryCache(unittest.TestCase):
+    def test_key_is_canonical(self):
+        self.assertEqual(
+            PatientQueryCache.key(["HP:2", "HP:1", "HP:2"], "average", SimilarityMeasures.COSINE),
+            PatientQueryCache.key(["HP:1", "HP:2"], "average", SimilarityMeasures.COSINE),
+        )
+        self.assertNotEqual(
+            PatientQueryCache.key(["HP:1"], "average", SimilarityMeasures.COSINE),
+            PatientQueryCache.key(["HP:1"], "average", SimilarityMeasures.L2),
+        )
+
+    def test_hits_misses_and_eviction(self):
+        cache = PatientQueryCache(max_size=2)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", [1.0], [("OMIM:1", 0.0)])
+        cache.put("b", [2.0], [("OMIM:2", 0.0)])
+        self.assertEqual(cache.get("a").ranking, [("OMIM:1", 0.0)])
+        cache.put("c", [3.0], [])
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 1, "size": 2, "max_size": 2})
+
+    def test_disabled(self):
+        cache = PatientQueryCache(max_size=0)
+        cache.put("a", [1.0], [])
+        self.assertEqual(len(cache), 0)
+
+
+class TestElderRunnerConstructor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.hpoa_path = Path(self.tmp_dir.name).joinpath("phenotype.hpoa")
+        self.hpoa_path.write_text(
+            "database_id\tdisease_name\tqualifier\thpo_id\treference\tevidence\tonset\tfrequency\tsex\tmodifier"
+            "\taspect\tbiocuration\n"
+            "OMIM:1\tDisease\t\tHP:1\tOMIM:1\tIEA\t\t\t\t\tP\tHPO:iea\n"
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def build_runner(self, config: dict) -> ElderRunner:
+        db_manager = MagicMock()
+        db_manager.config = {"hpoa_path": str(self.hpoa_path), **config}
+        db_manager.ont_hp.get.return_value = {
+            "metadatas": [{"_json": json.dumps({"original_id": "HP:1"})}],
+            "embeddings": [[1.0, 0.0]],
+        }
+        with patch("pheval_exomiser.prepare.core.elder.ChromaDBManager", return_value=db_manager), patch(
+            "pheval_exomiser.prepare.core.elder.HPOClustering"
+        ):
+            return ElderRunner()
+
+    def test_constructor_builds_query_cache(self):
+        runner = self.build_runner({"query_cache_size": 8})
+        self.assertEqual(runner.query_cache.max_size, 8)
+        self.assertEqual(len(runner.query_cache), 0)
+
+    def test_constructor_default_query_cache_size(self):
+        self.assertEqual(self.build_runner({}).query_cache.max_size, 64)
+
+
+class TestElderRunnerQueryCache(unittest.TestCase):
+    def setUp(self) -> None:
+        data_processor = DataProcessor.__new__(DataProcessor)
+        data_processor._hp_embeddings = {
+            "HP:1": {"embeddings": np.array([1.0, 0.0])},
+            "HP:2": {"embeddings": np.array([0.0, 1.0])},
+        }
+        engine = RankingEngine(["OMIM:1", "OMIM:2"], [[1.0, 0.0], [0.0, 1.0]])
+        self.runner = ElderRunner.__new__(ElderRunner)
+        self.runner.similarity_measure = SimilarityMeasures.COSINE
+        self.runner.use_ranking_engine = True
+        self.runner.data_processor = data_processor
+        self.runner.query_cache = PatientQueryCache(max_size=1)
+        self.runner._query_service = lambda: QueryService(data_processor, None, None, None, ranking_engine=engine)
+
+    def test_run_analysis_is_cached(self):
+        ranking = self.runner.run_analysis(["HP:1", "HP:1"])
+        self.assertEqual(ranking[0][0], "OMIM:1")
+        self.assertIs(self.runner.run_analysis(["HP:1"]), ranking)
+        self.assertEqual((self.runner.query_cache.hits, self.runner.query_cache.misses), (1, 1))
+
+    def test_duplicate_terms_are_embedded_once(self):
+        self.runner.query_cache = PatientQueryCache(max_size=0)
+        single = self.runner.run_analysis(["HP:1", "HP:1", "HP:2"])
+        batch = next(self.runner.run_analysis_batch([["HP:1", "HP:1", "HP:2"]]))
+        for ranking in (single, batch):
+            self.assertAlmostEqual(ranking[0][1], ranking[1][1], places=6)
+            self.assertEqual(sorted(ranking), sorted(self.runner.run_analysis(["HP:2", "HP:1"])))
+
+    def test_run_analysis_batch_scores_each_term_set_once(self):
+        expected = [self.runner.run_analysis(hpos) for hpos in [["HP:1"], ["HP:2"]]]
+        self.runner.query_cache = PatientQueryCache(max_size=1)
+        rankings = list(self.runner.run_analysis_batch([["HP:1"], ["HP:2"], ["HP:1"], ["HP:9"], ["HP:9"]]))
+        self.assertEqual(rankings, [expected[0], expected[1], expected[0], [], []])
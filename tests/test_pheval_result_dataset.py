@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from pheval_exomiser.post_process.pheval_result_dataset import (
+    PART_FILE_NAME,
+    STAGING_DIR_NAME,
+    compact_pheval_result_dataset,
+    dataset_path,
+    pyarrow,
+    read_pheval_result_dataset,
+    to_dataset_frame,
+    write_pheval_result_partition,
+)
+
+ranked_gene_result = pd.DataFrame(
+    {
+        "gene_symbol": ["PLXNA1", "GCDH"],
+        "gene_identifier": ["ENSG00000114554", "ENSG00000105607"],
+        "score": [0.9, 0.5],
+        "rank": [1.0, 2.0],
+    }
+)
+ranked_variant_result = pd.DataFrame(
+    {
+        "chromosome": ["3"],
+        "start": [126730873],
+        "end": [126730873],
+        "ref": ["G"],
+        "alt": ["A"],
+        "score": [0.0484],
+        "rank": [1.0],
+    }
+)
+
+
+class TestToDatasetFrame(unittest.TestCase):
+    def test_to_dataset_frame_gene(self):
+        self.assertEqual(
+            to_dataset_frame(ranked_gene_result, "gene", "sample1").to_dict("records"),
+            [
+                {"sample": "sample1", "identifier": "ENSG00000114554", "name": "PLXNA1", "score": 0.9, "rank": 1},
+                {"sample": "sample1", "identifier": "ENSG00000105607", "name": "GCDH", "score": 0.5, "rank": 2},
+            ],
+        )
+
+    def test_to_dataset_frame_variant(self):
+        self.assertEqual(
+            to_dataset_frame(ranked_variant_result, "variant", "sample1")["identifier"].tolist(),
+            ["3-126730873-G-A"],
+        )
+
+    def test_to_dataset_frame_unknown_entity(self):
+        with self.assertRaises(ValueError):
+            to_dataset_frame(ranked_gene_result, "protein", "sample1")
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestPhEvalResultDataset(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_write_and_read_partitions(self):
+        write_pheval_result_partition(ranked_gene_result, self.output_dir, "gene", "sample1")
+        write_pheval_result_partition(ranked_gene_result, self.output_dir, "gene", "sample2")
+        write_pheval_result_partition(ranked_variant_result, self.output_dir, "variant", "sample1")
+        compact_pheval_result_dataset(self.output_dir)
+        gene_partition = dataset_path(self.output_dir).joinpath("entity=gene")
+        self.assertEqual(sorted(path.name for path in gene_partition.glob("*.parquet")), [PART_FILE_NAME])
+        self.assertEqual(pyarrow.parquet.ParquetFile(gene_partition.joinpath(PART_FILE_NAME)).num_row_groups, 2)
+        self.assertEqual(list(gene_partition.joinpath(STAGING_DIR_NAME).iterdir()), [])
+        self.assertEqual(len(read_pheval_result_dataset(self.output_dir)), 5)
+        genes = read_pheval_result_dataset(self.output_dir, entity="gene", samples=["sample2"])
+        self.assertEqual(genes["identifier"].tolist(), ["ENSG00000114554", "ENSG00000105607"])
+        self.assertEqual(set(genes["sample"]), {"sample2"})
+
+    def test_staged_samples_are_not_read_before_compaction(self):
+        write_pheval_result_partition(ranked_gene_result, self.output_dir, "gene", "sample1")
+        compact_pheval_result_dataset(self.output_dir)
+        write_pheval_result_partition(ranked_gene_result, self.output_dir, "gene", "sample2")
+        self.assertEqual(set(read_pheval_result_dataset(self.output_dir)["sample"]), {"sample1"})
+        compact_pheval_result_dataset(self.output_dir)
+        self.assertEqual(set(read_pheval_result_dataset(self.output_dir)["sample"]), {"sample1", "sample2"})
+
+    def test_rewrite_partition_replaces_sample(self):
+        write_pheval_result_partition(ranked_gene_result, self.output_dir, "gene", "sample1")
+        write_pheval_result_partition(ranked_gene_result, self.output_dir, "gene", "sample2")
+        compact_pheval_result_dataset(self.output_dir)
+        write_pheval_result_partition(ranked_gene_result.head(1), self.output_dir, "gene", "sample1")
+        compact_pheval_result_dataset(self.output_dir)
+        genes = read_pheval_result_dataset(self.output_dir, entity="gene")
+        self.assertEqual(genes["sample"].value_counts().to_dict(), {"sample2": 2, "sample1": 1})
+
+    def test_compact_without_dataset(self):
+        self.assertEqual(compact_pheval_result_dataset(self.output_dir), [])
@@ -1,16 +1,28 @@
+import json
+import tempfile
 import unittest
 from copy import copy
+from pathlib import Path
+from unittest.mock import patch
 
+import pandas as pd
 from pheval.post_processing.post_processing import (
     PhEvalDiseaseResult,
     PhEvalGeneResult,
     PhEvalVariantResult,
 )
 
+from pheval_exomiser.post_process.pheval_result_dataset import dataset_path, pyarrow, read_pheval_result_dataset
 from pheval_exomiser.post_process.post_process_results_format import (
     PhEvalDiseaseResultFromExomiserJsonCreator,
     PhEvalGeneResultFromExomiserJsonCreator,
     PhEvalVariantResultFromExomiserJsonCreator,
+    StandardisedResultsManifest,
+    create_standardised_results,
+    extract_pheval_requirements,
+    iter_exomiser_json_result,
+    rank_pheval_result_frame,
+    standardise_exomiser_result,
 )
 
 example_exomiser_result = [
@@ -2483,6 +2495,37 @@ class TestPhEvalVariantFromExomiserJsonCreator(unittest.TestCase):
         )
 
 
+    def test_extract_pheval_variant_frame(self):
+        self.assertEqual(
+            self.json_result.extract_pheval_variant_frame().to_dict("records"),
+            [
+                dict(variant.__dict__)
+                for variant in self.json_result.extract_pheval_variant_requirements()
+            ],
+        )
+
+
+class TestRankPhEvalResultFrame(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pheval_result = pd.DataFrame(
+            {"chromosome": ["1", "2", "3", "4"], "score": [0.2, 0.5, 0.2, 0.1]}
+        )
+
+    def test_rank_pheval_result_frame_descending(self):
+        ranked = rank_pheval_result_frame(self.pheval_result, "descending")
+        self.assertEqual(list(ranked["chromosome"]), ["2", "1", "3", "4"])
+        self.assertEqual(list(ranked["rank"]), [1.0, 3.0, 3.0, 4.0])
+
+    def test_rank_pheval_result_frame_ascending(self):
+        ranked = rank_pheval_result_frame(self.pheval_result, "ascending")
+        self.assertEqual(list(ranked["chromosome"]), ["4", "1", "3", "2"])
+        self.assertEqual(list(ranked["rank"]), [1.0, 3.0, 3.0, 4.0])
+
+    def test_rank_pheval_result_frame_unknown_order(self):
+        with self.assertRaises(ValueError):
+            rank_pheval_result_frame(self.pheval_result, "sideways")
+
+
 class TestPhEvalDiseaseResultFromExomiserJsonCreator(unittest.TestCase):
     @classmethod
     def setUpClass(cls) -> None:
@@ -2536,3 +2579,226 @@ class TestPhEvalDiseaseResultFromExomiserJsonCreator(unittest.TestCase):
                 ),
             ],
         )
+
+
+class TestIterExomiserJsonResult(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.result_path = Path(self.tmp_dir.name).joinpath("sample-exomiser.json")
+        self.exomiser_result = example_exomiser_result + example_exomiser_result_with_disease
+        self.result_path.write_text(json.dumps(self.exomiser_result, indent=2))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_iter_exomiser_json_result(self):
+        self.assertEqual(list(iter_exomiser_json_result(self.result_path)), self.exomiser_result)
+
+    def test_iter_exomiser_json_result_small_chunks(self):
+        self.assertEqual(
+            list(iter_exomiser_json_result(self.result_path, chunk_size=7)), self.exomiser_result
+        )
+
+    def test_iter_exomiser_json_result_empty(self):
+        self.result_path.write_text(" [ ]\n")
+        self.assertEqual(list(iter_exomiser_json_result(self.result_path)), [])
+
+    def test_iter_exomiser_json_result_not_array(self):
+        self.result_path.write_text('{"geneSymbol": "PLXNA1"}')
+        with self.assertRaises(ValueError):
+            list(iter_exomiser_json_result(self.result_path))
+
+    def test_extract_pheval_requirements(self):
+        gene, variant, disease = extract_pheval_requirements(
+            iter_exomiser_json_result(self.result_path, chunk_size=64),
+            "combinedScore",
+            variant_analysis=False,
+            gene_analysis=True,
+            disease_analysis=True,
+        )
+        self.assertEqual(
+            gene,
+            PhEvalGeneResultFromExomiserJsonCreator(
+                self.exomiser_result, "combinedScore"
+            ).extract_pheval_gene_requirements(),
+        )
+        self.assertEqual(variant, [])
+        self.assertEqual(
+            disease,
+            PhEvalDiseaseResultFromExomiserJsonCreator(
+                self.exomiser_result
+            ).extract_pheval_disease_requirements(),
+        )
+
+    def test_extract_pheval_variant_requirements(self):
+        _, variant, _ = extract_pheval_requirements(
+            iter(example_exomiser_result),
+            "combinedScore",
+            variant_analysis=True,
+            gene_analysis=False,
+            disease_analysis=False,
+        )
+        self.assertEqual(
+            variant,
+            PhEvalVariantResultFromExomiserJsonCreator(
+                example_exomiser_result, "combinedScore"
+            ).extract_pheval_variant_requirements(),
+        )
+
+
+class TestCreateStandardisedResults(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = Path(self.tmp_dir.name).joinpath("results")
+        self.output_dir = Path(self.tmp_dir.name).joinpath("output")
+        self.results_dir.mkdir()
+        self.output_dir.joinpath("pheval_gene_results").mkdir(parents=True)
+        for sample in ["sample1", "sample2", "sample3"]:
+            self.results_dir.joinpath(f"{sample}-exomiser.json").write_text(json.dumps(example_exomiser_result))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def standardise(self, workers: int, force: bool = False):
+        create_standardised_results(
+            self.results_dir,
+            self.output_dir,
+            "combinedScore",
+            "descending",
+            variant_analysis=False,
+            gene_analysis=True,
+            disease_analysis=False,
+            workers=workers,
+            force=force,
+        )
+
+    def test_create_standardised_results_parallel(self):
+        self.standardise(workers=2)
+        self.assertEqual(
+            sorted(path.name for path in self.output_dir.joinpath("pheval_gene_results").iterdir()),
+            [f"sample{i}-pheval_gene_result.tsv" for i in range(1, 4)],
+        )
+
+    def test_create_standardised_results_parallel_continues_past_errors(self):
+        self.results_dir.joinpath("broken-exomiser.json").write_text("[{")
+        with self.assertRaises(RuntimeError):
+            self.standardise(workers=2)
+        self.assertEqual(len(list(self.output_dir.joinpath("pheval_gene_results").iterdir())), 3)
+
+    def test_create_standardised_results_skips_unchanged(self):
+        self.standardise(workers=1)
+        gene_result = self.output_dir.joinpath("pheval_gene_results", "sample1-pheval_gene_result.tsv")
+        gene_result.write_text("kept")
+        self.standardise(workers=1)
+        self.assertEqual(gene_result.read_text(), "kept")
+        self.standardise(workers=1, force=True)
+        self.assertNotEqual(gene_result.read_text(), "kept")
+
+    def test_create_standardised_results_reprocesses_missing_output(self):
+        self.standardise(workers=1)
+        gene_result = self.output_dir.joinpath("pheval_gene_results", "sample1-pheval_gene_result.tsv")
+        gene_result.unlink()
+        self.standardise(workers=1)
+        self.assertTrue(gene_result.exists())
+
+    def test_create_standardised_results_skips_unchanged_empty_result(self):
+        empty_result = self.results_dir.joinpath("empty-exomiser.json")
+        empty_result.write_text("[]")
+        for entity in ["variant", "disease"]:
+            self.output_dir.joinpath(f"pheval_{entity}_results").mkdir()
+        for output_format in ["tsv", "parquet"]:
+            if output_format == "parquet" and pyarrow is None:
+                continue
+            with self.subTest(output_format=output_format), patch(
+                "pheval_exomiser.post_process.post_process_results_format.standardise_exomiser_result",
+                wraps=standardise_exomiser_result,
+            ) as standardise:
+                for _ in range(2):
+                    create_standardised_results(
+                        self.results_dir,
+                        self.output_dir,
+                        "combinedScore",
+                        "descending",
+                        variant_analysis=True,
+                        gene_analysis=True,
+                        disease_analysis=True,
+                        output_format=output_format,
+                    )
+                self.assertEqual(
+                    [call.args[0].name for call in standardise.call_args_list].count(empty_result.name), 1
+                )
+
+    def test_manifest_requires_parquet_outputs(self):
+        if pyarrow is None:
+            self.skipTest("pyarrow is not installed")
+        params = dict(
+            score_name="combinedScore",
+            sort_order="descending",
+            variant_analysis=False,
+            gene_analysis=True,
+            disease_analysis=False,
+            output_format="parquet",
+        )
+        manifest = StandardisedResultsManifest(self.output_dir, params=params)
+        manifest.record(self.results_dir.joinpath("sample1-exomiser.json"))
+        self.assertFalse(manifest.is_up_to_date(self.results_dir.joinpath("sample1-exomiser.json")))
+        create_standardised_results(
+            self.results_dir,
+            self.output_dir,
+            "combinedScore",
+            "descending",
+            variant_analysis=False,
+            gene_analysis=True,
+            disease_analysis=False,
+            output_format="parquet",
+        )
+        manifest = StandardisedResultsManifest(self.output_dir, params=params)
+        self.assertTrue(manifest.is_up_to_date(self.results_dir.joinpath("sample1-exomiser.json")))
+
+    def test_create_standardised_results_reprocesses_changed(self):
+        self.standardise(workers=2)
+        gene_result = self.output_dir.joinpath("pheval_gene_results", "sample1-pheval_gene_result.tsv")
+        gene_result.unlink()
+        self.results_dir.joinpath("sample1-exomiser.json").write_text(json.dumps(example_exomiser_result * 2))
+        self.standardise(workers=2)
+        self.assertTrue(gene_result.exists())
+
+    def test_manifest_skips_failed_results(self):
+        self.results_dir.joinpath("broken-exomiser.json").write_text("[{")
+        with self.assertRaises(RuntimeError):
+            self.standardise(workers=2)
+        manifest = StandardisedResultsManifest(
+            self.output_dir,
+            params=dict(
+                score_name="combinedScore",
+                sort_order="descending",
+                variant_analysis=False,
+                gene_analysis=True,
+                disease_analysis=False,
+                output_format="tsv",
+            ),
+        )
+        self.assertTrue(manifest.is_up_to_date(self.results_dir.joinpath("sample1-exomiser.json")))
+        self.assertFalse(manifest.is_up_to_date(self.results_dir.joinpath("broken-exomiser.json")))
+
+    def test_create_standardised_results_parquet(self):
+        if pyarrow is None:
+            self.skipTest("pyarrow is not installed")
+        create_standardised_results(
+            self.results_dir,
+            self.output_dir,
+            "combinedScore",
+            "descending",
+            variant_analysis=True,
+            gene_analysis=True,
+            disease_analysis=False,
+            workers=2,
+            output_format="parquet",
+        )
+        dataset = read_pheval_result_dataset(self.output_dir)
+        self.assertEqual(sorted(dataset["entity"].astype(str).unique()), ["gene", "variant"])
+        self.assertEqual(sorted(dataset["sample"].unique()), ["sample1", "sample2", "sample3"])
+        self.assertEqual(
+            [path.name for path in dataset_path(self.output_dir).joinpath("entity=gene").glob("*.parquet")],
+            ["part-0.parquet"],
+        )
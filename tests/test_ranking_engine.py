@@ -0,0 +1,165 @@
+import os
+import time
+import unittest
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.ranking_engine import RankingEngine
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+disease_ids = ["OMIM:3", "OMIM:1", "OMIM:2", "OMIM:4"]
+disease_embeddings = [[1.0, 0.0], [0.0, 2.0], [1.0, 1.0], [1.0, 0.0]]
+
+
+class TestRankingEngine(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cosine_engine = RankingEngine(disease_ids, disease_embeddings, SimilarityMeasures.COSINE)
+        self.l2_engine = RankingEngine(disease_ids, disease_embeddings, SimilarityMeasures.L2)
+        self.ip_engine = RankingEngine(disease_ids, disease_embeddings, SimilarityMeasures.IP)
+
+    def test_matrix_is_contiguous_float32(self):
+        self.assertEqual(self.cosine_engine.matrix.dtype, np.float32)
+        self.assertTrue(self.cosine_engine.matrix.flags["C_CONTIGUOUS"])
+        self.assertEqual(len(self.cosine_engine), 4)
+
+    def test_matrix_is_an_ordered_copy(self):
+        embeddings = np.array(disease_embeddings, dtype=np.float32)
+        engine = RankingEngine(disease_ids, embeddings, SimilarityMeasures.IP)
+        self.assertFalse(np.shares_memory(engine.matrix, embeddings))
+        np.testing.assert_array_equal(engine.matrix, embeddings[[1, 2, 0, 3]])
+        np.testing.assert_array_equal(embeddings, disease_embeddings)
+
+    def test_rank_cosine(self):
+        ranking = self.cosine_engine.rank([2.0, 0.0])
+        self.assertEqual([disease for disease, _ in ranking], ["OMIM:3", "OMIM:4", "OMIM:2", "OMIM:1"])
+        self.assertAlmostEqual(ranking[0][1], 0.0, places=6)
+        self.assertAlmostEqual(ranking[2][1], 1 - np.sqrt(0.5), places=6)
+        self.assertAlmostEqual(ranking[3][1], 1.0, places=6)
+
+    def test_rank_l2(self):
+        ranking = self.l2_engine.rank([0.0, 2.0])
+        self.assertEqual(ranking[0], ("OMIM:1", 0.0))
+        self.assertAlmostEqual(ranking[1][1], 2.0, places=5)
+        self.assertEqual([disease for disease, _ in ranking[2:]], ["OMIM:3", "OMIM:4"])
+        self.assertAlmostEqual(ranking[2][1], 5.0, places=5)
+
+    def test_rank_ip(self):
+        ranking = self.ip_engine.rank([1.0, 1.0])
+        self.assertEqual(ranking[0], ("OMIM:1", -1.0))
+        self.assertEqual(ranking[1], ("OMIM:2", -1.0))
+
+    def test_rank_n_results(self):
+        self.assertEqual(self.cosine_engine.rank([2.0, 0.0], n_results=2), self.cosine_engine.rank([2.0, 0.0])[:2])
+        self.assertEqual(self.cosine_engine.rank([2.0, 0.0], n_results=0), [])
+
+    def test_rank_wrong_dimension(self):
+        with self.assertRaises(ValueError):
+            self.cosine_engine.rank([1.0, 0.0, 0.0])
+
+    def test_empty_engine(self):
+        with self.assertRaises(ValueError):
+            RankingEngine([], [])
+
+    def test_distances_batch(self):
+        queries = np.array([[2.0, 0.0], [0.0, 2.0], [1.0, 1.0]])
+        for engine in [self.cosine_engine, self.l2_engine, self.ip_engine]:
+            expected = np.array([engine.distances(query) for query in queries])
+            np.testing.assert_allclose(engine.distances_batch(queries), expected, rtol=1e-6, atol=1e-6)
+
+    def test_rank_batch(self):
+        queries = np.array([[2.0, 0.0], [0.0, 2.0], [1.0, 1.0]])
+        rankings = list(self.l2_engine.rank_batch(queries, block_size=2))
+        self.assertEqual(rankings, [self.l2_engine.rank(query) for query in queries])
+
+
+class TestQuantizedRankingEngine(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.ids = [f"OMIM:{i}" for i in range(200)]
+        self.embeddings = rng.normal(size=(200, 16)).astype(np.float32)
+        self.queries = rng.normal(size=(5, 16)).astype(np.float32)
+
+    def test_quantization_needs_an_array(self):
+        with self.assertRaises(ValueError):
+            RankingEngine(self.ids, self.embeddings.tolist(), quantization="int8")
+
+    def test_quantized_matrix_dtypes(self):
+        self.assertEqual(RankingEngine(self.ids, self.embeddings, quantization="fp16").matrix.dtype, np.float16)
+        self.assertEqual(RankingEngine(self.ids, self.embeddings, quantization="int8").matrix.dtype, np.int8)
+        with self.assertRaises(ValueError):
+            RankingEngine(self.ids, self.embeddings, quantization="int4")
+
+    def test_approximate_distances_are_close(self):
+        for measure in SimilarityMeasures:
+            exact = RankingEngine(self.ids, self.embeddings, measure)
+            for quantization in ["fp16", "int8"]:
+                engine = RankingEngine(self.ids, self.embeddings, measure, quantization, block_size=64)
+                np.testing.assert_allclose(
+                    engine.distances_batch(self.queries), exact.distances_batch(self.queries), rtol=0.05, atol=0.1
+                )
+
+    def test_top_results_are_reranked_exactly(self):
+        for measure in SimilarityMeasures:
+            exact = RankingEngine(self.ids, self.embeddings, measure)
+            engine = RankingEngine(self.ids, self.embeddings, measure, "int8", rerank_k=20)
+            for query in self.queries:
+                ranking = engine.rank(query, n_results=10)
+                expected = exact.rank(query, n_results=10)
+                self.assertEqual([disease for disease, _ in ranking], [disease for disease, _ in expected])
+                np.testing.assert_allclose(
+                    [distance for _, distance in ranking], [distance for _, distance in expected], rtol=1e-5, atol=1e-5
+                )
+
+    def test_rank_all_appends_approximate_tail(self):
+        engine = RankingEngine(self.ids, self.embeddings, quantization="fp16", rerank_k=10)
+        ranking = engine.rank(self.queries[0])
+        self.assertEqual(sorted(disease for disease, _ in ranking), sorted(self.ids))
+        self.assertEqual(ranking[:10], engine.rank(self.queries[0], n_results=10))
+        self.assertEqual(len(engine.rank(self.queries[0], n_results=15)), 15)
+
+    def test_rank_batch(self):
+        engine = RankingEngine(self.ids, self.embeddings, SimilarityMeasures.L2, "int8", rerank_k=5)
+        self.assertEqual(
+            list(engine.rank_batch(self.queries, n_results=5, block_size=2)),
+            [engine.rank(query, n_results=5) for query in self.queries],
+        )
+
+
+@unittest.skipUnless(os.environ.get("PHEVAL_EXOMISER_BENCHMARK"), "set PHEVAL_EXOMISER_BENCHMARK to run benchmarks")
+class TestQuantizedScanBenchmark(unittest.TestCase):
+    """Scan time of 12000 OMIM sized disease vectors, best of 5 runs, per number of queries scored together."""
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(12000, 1536)).astype(np.float32)
+        ids = [f"OMIM:{i}" for i in range(len(embeddings))]
+        self.engines = {
+            quantization: RankingEngine(ids, embeddings, quantization=quantization)
+            for quantization in [None, "fp16", "int8"]
+        }
+        self.queries = rng.normal(size=(256, 1536)).astype(np.float32)
+
+    @staticmethod
+    def best_time(function, repeats: int = 5) -> float:
+        function()
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def test_int8_scan_speedup(self):
+        speedups = {}
+        for n_queries in [1, 8, 32, 256]:
+            queries = self.queries[:n_queries]
+            times = {
+                quantization: self.best_time(lambda: engine.distances_batch(queries))
+                for quantization, engine in self.engines.items()
+            }
+            speedups[n_queries] = times[None] / times["int8"]
+            print(
+                f"{n_queries} queries: float32 {times[None]:.4f}s, fp16 {times['fp16']:.4f}s, "
+                f"int8 {times['int8']:.4f}s ({speedups[n_queries]:.2f}x)"
+            )
+        self.assertGreater(speedups[8], 1)
@@ -0,0 +1,97 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from google.protobuf.json_format import MessageToJson
+from phenopackets import Individual, OntologyClass, Phenopacket, PhenotypicFeature
+
+from pheval_exomiser.prepare.tool_specific_configuration_options import (
+    ElderPostProcessingConfig,
+    PostProcessing,
+)
+from pheval_exomiser.runner import ElderPhEvalRunner
+
+phenotypic_features = {
+    "patient_1": [
+        PhenotypicFeature(type=OntologyClass(id="HP:0000256", label="Macrocephaly")),
+        PhenotypicFeature(type=OntologyClass(id="HP:0001332", label="Dystonia")),
+        PhenotypicFeature(type=OntologyClass(id="HP:0008494", label="Inferior lens subluxation"), excluded=True),
+    ],
+    "patient_2": [PhenotypicFeature(type=OntologyClass(id="HP:0002059", label="Cerebral atrophy"))],
+    "patient_3": [
+        PhenotypicFeature(type=OntologyClass(id="HP:0100309", label="Subdural hemorrhage")),
+        PhenotypicFeature(type=OntologyClass(id="HP:0003150", label="Glutaric aciduria")),
+    ],
+}
+
+
+class TestRunParallel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_list = []
+        for name, features in phenotypic_features.items():
+            phenopacket = Phenopacket(id=name, subject=Individual(id=name), phenotypic_features=features)
+            path = Path(self.tmp_dir.name).joinpath(f"{name}.json")
+            path.write_text(MessageToJson(phenopacket))
+            self.file_list.append(path)
+        self.file_names = [path.stem for path in self.file_list]
+        self.consumed = []
+        self.blocks = []
+        self.written = []
+        self.lock = threading.Lock()
+        self.runner = ElderPhEvalRunner.__new__(ElderPhEvalRunner)
+        self.runner.config = ElderPostProcessingConfig(
+            post_process=PostProcessing(score_name="score", sort_order="ascending"), n_workers=2
+        )
+        self.runner.simple_runner = MagicMock()
+        self.runner.simple_runner.run_analysis_batch.side_effect = self.run_analysis_batch
+        self.runner.write_disease_results = self.write_disease_results
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def run_analysis_batch(self, hpo_lists, block_size=256):
+        self.blocks.append(len(hpo_lists))
+        for hpo_list in hpo_lists:
+            self.consumed.append(hpo_list)
+            yield [(f"OMIM:{hpo_id}", 0.0) for hpo_id in hpo_list]
+
+    def write_disease_results(self, file_name, results):
+        with self.lock:
+            self.written.append((file_name, results))
+
+    def test_parses_phenopackets_in_worker_processes_in_input_order(self):
+        self.runner.run_parallel(self.file_list, self.file_names)
+        self.assertEqual(
+            self.consumed,
+            [["HP:0000256", "HP:0001332"], ["HP:0002059"], ["HP:0100309", "HP:0003150"]],
+        )
+
+    def test_ranks_parsed_phenopackets_block_wise(self):
+        self.runner.run_parallel(self.file_list, self.file_names, block_size=2)
+        self.assertEqual(self.blocks, [2, 1])
+        self.assertEqual([file_name for file_name, _ in sorted(self.written)], self.file_names)
+
+    def test_writes_every_phenopacket_once(self):
+        self.runner.run_parallel(self.file_list, self.file_names)
+        self.assertEqual(
+            sorted(self.written),
+            [
+                ("patient_1", [("OMIM:HP:0000256", 0.0), ("OMIM:HP:0001332", 0.0)]),
+                ("patient_2", [("OMIM:HP:0002059", 0.0)]),
+                ("patient_3", [("OMIM:HP:0100309", 0.0), ("OMIM:HP:0003150", 0.0)]),
+            ],
+        )
+
+    def test_failed_write_propagates(self):
+        def write_disease_results(file_name, results):
+            if file_name == "patient_2":
+                raise OSError("disk full")
+            self.write_disease_results(file_name, results)
+
+        self.runner.write_disease_results = write_disease_results
+        with self.assertRaises(OSError):
+            self.runner.run_parallel(self.file_list, self.file_names)
+        self.assertNotIn("patient_2", [file_name for file_name, _ in self.written])
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from pheval_exomiser.prepare.core.similarity_service import (
+    CosineSimilarity,
+    InnerProduct,
+    L2Distance,
+    similarity_service,
+)
+from pheval_exomiser.prepare.utils.similarity_measures import SimilarityMeasures
+
+
+class TestSimilarityService(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.diseases = rng.normal(size=(20, 8))
+        self.queries = rng.normal(size=(5, 8))
+
+    def pairwise(self, service):
+        return np.array(
+            [[service.calculate_similarity(query, disease) for disease in self.diseases] for query in self.queries]
+        )
+
+    def test_cosine_matrix_is_normalised(self):
+        service = CosineSimilarity(self.diseases)
+        self.assertEqual(service.disease_matrix.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(service.disease_matrix, axis=1), 1, rtol=1e-6)
+
+    def test_fit_leaves_input_unchanged(self):
+        disease_matrix = np.array([[3.0, 4.0]], dtype=np.float32)
+        service = CosineSimilarity(disease_matrix)
+        np.testing.assert_array_equal(disease_matrix, [[3.0, 4.0]])
+        np.testing.assert_allclose(service.disease_matrix, [[0.6, 0.8]])
+
+    def test_fit_read_only_matrix(self):
+        disease_matrix = np.array(self.diseases, dtype=np.float32)
+        disease_matrix.setflags(write=False)
+        service = CosineSimilarity(disease_matrix)
+        np.testing.assert_allclose(np.linalg.norm(service.disease_matrix, axis=1), 1, rtol=1e-6)
+
+    def test_fit_without_copy(self):
+        disease_matrix = np.array([[3.0, 4.0]], dtype=np.float32)
+        service = CosineSimilarity().fit(disease_matrix, copy=False)
+        self.assertIs(service.disease_matrix, disease_matrix)
+        np.testing.assert_allclose(disease_matrix, [[0.6, 0.8]])
+
+    def test_score_many_matches_pairwise(self):
+        for service in [CosineSimilarity(self.diseases), L2Distance(self.diseases), InnerProduct(self.diseases)]:
+            with self.subTest(service=type(service).__name__):
+                scores = service.score_many(self.queries)
+                self.assertEqual(scores.shape, (5, 20))
+                np.testing.assert_allclose(scores, self.pairwise(service), rtol=1e-4, atol=1e-4)
+                np.testing.assert_allclose(service.score(self.queries[0]), scores[0], rtol=1e-5, atol=1e-5)
+
+    def test_l2_distance(self):
+        self.assertEqual(L2Distance().calculate_similarity([1.0, 2.0], [4.0, 6.0]), 25.0)
+        np.testing.assert_allclose(L2Distance([[1.0, 2.0]]).score_many([[1.0, 2.0], [4.0, 6.0]]), [[0.0], [25.0]])
+
+    def test_distances_follow_chroma_conventions(self):
+        cosine = CosineSimilarity(self.diseases)
+        np.testing.assert_allclose(cosine.distances_many(self.queries), 1 - cosine.score_many(self.queries))
+        l2 = L2Distance(self.diseases)
+        np.testing.assert_allclose(l2.distances_many(self.queries), l2.score_many(self.queries))
+        ip = InnerProduct(self.diseases)
+        np.testing.assert_allclose(ip.distances_many(self.queries), 1 - ip.score_many(self.queries))
+
+    def test_zero_query_cosine(self):
+        np.testing.assert_array_equal(CosineSimilarity(self.diseases).score(np.zeros(8)), np.zeros(20))
+
+    def test_factory(self):
+        self.assertIsInstance(similarity_service(SimilarityMeasures.L2), L2Distance)
+        self.assertIsInstance(similarity_service(SimilarityMeasures.IP, self.diseases), InnerProduct)
+
+    def test_unfitted_or_wrong_dimension(self):
+        with self.assertRaises(ValueError):
+            CosineSimilarity().score_many(self.queries)
+        with self.assertRaises(ValueError):
+            CosineSimilarity(self.diseases).score_many(np.ones((2, 3)))
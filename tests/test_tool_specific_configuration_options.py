@@ -0,0 +1,33 @@
+import unittest
+
+from pheval_exomiser.prepare.tool_specific_configuration_options import (
+    ApplicationProperties,
+    ExomiserConfigurations,
+    PostProcessing,
+)
+
+
+def exomiser_configurations(**options) -> ExomiserConfigurations:
+    return ExomiserConfigurations(
+        environment="local",
+        exomiser_software_directory="exomiser-cli-13.2.0",
+        analysis_configuration_file="preset_exome_analysis.py",
+        max_jobs=50,
+        application_properties=ApplicationProperties(),
+        post_process=PostProcessing(score_name="combinedScore", sort_order="descending"),
+        **options,
+    )
+
+
+class TestExomiserConfigurations(unittest.TestCase):
+    def test_java_heap_default(self):
+        self.assertEqual(exomiser_configurations().java_heap, "4g")
+
+    def test_valid_java_heap(self):
+        for java_heap in ["512m", "8G", "1024"]:
+            self.assertEqual(exomiser_configurations(java_heap=java_heap).java_heap, java_heap)
+
+    def test_invalid_java_heap(self):
+        for java_heap in ["lots", "4 g", "4g -Dfoo=bar", ""]:
+            with self.assertRaises(ValueError):
+                exomiser_configurations(java_heap=java_heap)
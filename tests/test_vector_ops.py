@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+
+from pheval_exomiser.prepare.utils.vector_ops import build_incidence, segment_means
+
+hp_index = {"HP:0000001": 0, "HP:0000002": 1, "HP:0000003": 2}
+hp_matrix = np.array([[1.0, 0.0], [0.0, 1.0], [2.0, 2.0]], dtype=np.float32)
+
+
+class TestBuildIncidence(unittest.TestCase):
+    def test_build_incidence(self):
+        indptr, indices = build_incidence(
+            [["HP:0000003", "HP:0000001", "HP:0000001"], ["HP:9999999"], ["HP:0000002"]], hp_index
+        )
+        self.assertEqual(indptr.tolist(), [0, 2, 2, 3])
+        self.assertEqual(indices.tolist(), [0, 2, 1])
+
+
+class TestSegmentMeans(unittest.TestCase):
+    def test_segment_means(self):
+        indptr, indices = build_incidence(
+            [["HP:0000001", "HP:0000003"], [], ["HP:0000002"], ["HP:0000001", "HP:0000002", "HP:0000003"]],
+            hp_index,
+        )
+        for block_size in [1, 2, 1024]:
+            means = segment_means(hp_matrix, indptr, indices, fill_value=-1, block_size=block_size)
+            self.assertEqual(means.dtype, np.float32)
+            np.testing.assert_allclose(means, [[1.5, 1.0], [-1.0, -1.0], [0.0, 1.0], [1.0, 1.0]])